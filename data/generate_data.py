@@ -5,6 +5,8 @@ Generates realistic airline operational data for demo purposes.
 Seed: 42 for reproducibility
 """
 import csv
+import json
+import math
 import random
 import uuid
 from datetime import datetime, timedelta
@@ -360,13 +362,37 @@ def generate_crew_assignments(flights, duties):
     
     return assignments
 
-def generate_pnr(flights, num_pnr=2000):
+def connection_misconnect_prob(inbound, outbound, airports):
+    """Chance a connection breaks: expected connect time against the station MCT, delays ~ Normal(d, 12 + 0.5d)."""
+    fmt = '%Y-%m-%d %H:%M:%S'
+    eta = datetime.strptime(inbound['sched_arr_utc'], fmt) + timedelta(minutes=inbound['current_delay_arrival'])
+    etd = datetime.strptime(outbound['sched_dep_utc'], fmt) + timedelta(minutes=outbound['current_delay_departure'])
+    connect = (etd - eta).total_seconds() / 60
+    
+    station = airports[inbound['arrival_station']]
+    in_intl = inbound['departure_station'] in INTL_DESTINATIONS
+    out_intl = outbound['arrival_station'] in INTL_DESTINATIONS
+    if in_intl and out_intl:
+        mct = max(station['mct_intl_dom_minutes'], station['mct_dom_intl_minutes'])
+    elif in_intl:
+        mct = station['mct_intl_dom_minutes']
+    elif out_intl:
+        mct = station['mct_dom_intl_minutes']
+    else:
+        mct = station['mct_dom_dom_minutes']
+    
+    variance = sum(12 ** 2 + (0.5 * d) ** 2 for d in (inbound['current_delay_arrival'], outbound['current_delay_departure']))
+    return 0.5 * math.erfc((connect - mct) / math.sqrt(2 * variance))
+
+def generate_pnr(flights, airports, num_pnr=2000):
     """Generate PNR trip data."""
     pnrs = []
+    airports_by_code = {a['station_code']: a for a in airports}
     
     connecting_flights = [f for f in flights if f['arrival_station'] in HUBS]
     
     for i in range(num_pnr):
+        misconnect_prob = 0.0
         if random.random() < 0.4 and len(connecting_flights) > 1:
             first_leg = random.choice(connecting_flights)
             hub = first_leg['arrival_station']
@@ -380,6 +406,7 @@ def generate_pnr(flights, num_pnr=2000):
                 destination = second_leg['arrival_station']
                 itinerary = [first_leg['flight_key'], second_leg['flight_key']]
                 is_intl = destination in INTL_DESTINATIONS or origin in INTL_DESTINATIONS
+                misconnect_prob = round(connection_misconnect_prob(first_leg, second_leg, airports_by_code), 2)
             else:
                 single = random.choice(flights)
                 origin = single['departure_station']
@@ -397,17 +424,13 @@ def generate_pnr(flights, num_pnr=2000):
         elite = random.choices(ELITE_LEVELS, weights=[60, 15, 12, 8, 5])[0]
         fare = random.choice(FARE_CLASSES)
         
-        misconnect_prob = 0.0
-        if len(itinerary) > 1:
-            misconnect_prob = round(random.uniform(0.05, 0.45), 2)
-        
         pnrs.append({
             'pnr_id': f"PNR{gen_uuid()}",
             'trip_id': f"TRIP_{gen_uuid()}",
             'primary_customer_id': f"CUST{random.randint(100000, 999999)}",
             'origin': origin,
             'destination': destination,
-            'itinerary_flight_keys': str(itinerary),
+            'itinerary_flight_keys': json.dumps(itinerary),
             'intl_flag': is_intl,
             'group_size': group_size,
             'elite_status_level': elite,
@@ -421,6 +444,24 @@ def generate_pnr(flights, num_pnr=2000):
     
     return pnrs
 
+def generate_pnr_legs(pnrs):
+    """Generate one PNR_LEG row per itinerary leg, linked to its inbound and outbound connections."""
+    legs = []
+    
+    for pnr in pnrs:
+        itinerary = json.loads(pnr['itinerary_flight_keys'])
+        for seq, flight_key in enumerate(itinerary):
+            legs.append({
+                'pnr_id': pnr['pnr_id'],
+                'trip_id': pnr['trip_id'],
+                'leg_sequence': seq + 1,
+                'flight_key': flight_key,
+                'inbound_flight_key': itinerary[seq - 1] if seq > 0 else None,
+                'outbound_flight_key': itinerary[seq + 1] if seq + 1 < len(itinerary) else None,
+            })
+    
+    return legs
+
 def generate_weather(num_records=500):
     """Generate weather and ATC data."""
     weather = []
@@ -453,9 +494,108 @@ def generate_weather(num_records=500):
     
     return weather
 
-def generate_flight_risk(flights):
+def connection_slack(flights, rotations, assignments, pnrs):
+    """Tightest slack in minutes per (from, to) flight pair over tail, crew and pax connections."""
+    fmt = '%Y-%m-%d %H:%M:%S'
+    by_key = {f['flight_key']: f for f in flights}
+    dep = {k: datetime.strptime(f['sched_dep_utc'], fmt) for k, f in by_key.items()}
+    arr = {k: datetime.strptime(f['sched_arr_utc'], fmt) for k, f in by_key.items()}
+    
+    pairs = [(r['prev_flight_key'], r['flight_key'], 40) for r in rotations if r['prev_flight_key']]
+    duties = {}
+    for a in sorted(assignments, key=lambda a: (a['duty_id'], a['leg_sequence_in_duty'])):
+        duties.setdefault(a['duty_id'], []).append(a['flight_key'])
+    pairs += [(legs[i - 1], legs[i], 30) for legs in duties.values() for i in range(1, len(legs))]
+    for pnr in pnrs:
+        itinerary = json.loads(pnr['itinerary_flight_keys'])
+        pairs += [(itinerary[i - 1], itinerary[i], 45) for i in range(1, len(itinerary))]
+    
+    slack = {}
+    for u, v, min_ground in pairs:
+        if u in by_key and v in by_key and dep[v] > dep[u]:
+            s = max(0, (dep[v] - arr[u]).total_seconds() / 60 - min_ground)
+            slack[(u, v)] = min(s, slack.get((u, v), s))
+    return slack
+
+def downline_counts(flights, slack, shock=60, cutoff=15):
+    """Distinct legs each flight's `shock`-minute delay spills onto via tail, crew and pax connections, down to `cutoff`."""
+    by_key = {f['flight_key']: f for f in flights}
+    successors = {}
+    for (u, v), s in slack.items():
+        successors.setdefault(u, []).append((v, s))
+    
+    memo = {}
+    def reach(u, delay):
+        if (u, delay) not in memo:
+            memo[(u, delay)] = set().union(*({v} | reach(v, delay - s)
+                                             for v, s in successors.get(u, []) if delay - s >= cutoff))
+        return memo[(u, delay)]
+    
+    return {k: len(reach(k, max(shock, by_key[k]['current_delay_departure']))) for k in by_key}
+
+def baseline_criticality(flights, slack, damping=0.85):
+    """Mean percentile rank (0-100) of PageRank on the reversed graph, betweenness and reach."""
+    keys = [f['flight_key'] for f in flights]
+    successors = {k: [] for k in keys}
+    predecessors = {k: [] for k in keys}
+    for u, v in slack:
+        successors[u].append(v)
+        predecessors[v].append(u)
+    
+    n = len(keys)
+    rank = {k: 1 / n for k in keys}
+    for _ in range(100):
+        dangling = sum(rank[k] for k in keys if not predecessors[k])
+        rank = {k: damping * sum(rank[v] / len(predecessors[v]) for v in successors[k])
+                   + (damping * dangling + 1 - damping) / n for k in keys}
+    
+    betweenness = dict.fromkeys(keys, 0.0)
+    for s in keys:
+        order, sigma, dist, queue = [], {s: 1}, {s: 0}, [s]
+        while queue:
+            order += queue
+            nxt = []
+            for u in queue:
+                for v in successors[u]:
+                    if v not in dist:
+                        dist[v] = dist[u] + 1
+                        nxt.append(v)
+                    if dist[v] == dist[u] + 1:
+                        sigma[v] = sigma.get(v, 0) + sigma[u]
+            queue = nxt
+        delta = dict.fromkeys(order, 0.0)
+        for w in reversed(order):
+            for v in successors[w]:
+                if dist[v] == dist[w] + 1:
+                    delta[w] += sigma[w] / sigma[v] * (1 + delta[v])
+            if w != s:
+                betweenness[w] += delta[w]
+    
+    dep = {f['flight_key']: f['sched_dep_utc'] for f in flights}
+    reachable = {}
+    for k in sorted(keys, key=dep.get, reverse=True):
+        reachable[k] = set(successors[k]).union(*(reachable[v] for v in successors[k]))
+    
+    def percentile(values):
+        ordered = sorted(values.values())
+        return {k: (sum(1 for x in ordered if x < v) + (ordered.count(v) + 1) / 2) / n for k, v in values.items()}
+    
+    scores = [percentile(rank), percentile(betweenness), percentile({k: len(r) for k, r in reachable.items()})]
+    return {k: round(sum(p[k] for p in scores) / 3 * 100, 1) for k in keys}
+
+def generate_flight_risk(flights, pnrs, rotations, assignments):
     """Generate IROP mart flight risk data."""
     risks = []
+    slack = connection_slack(flights, rotations, assignments, pnrs)
+    downline = downline_counts(flights, slack)
+    baseline = baseline_criticality(flights, slack)
+    
+    # Pax connecting off each inbound flight, weighted by their connection's misconnect probability.
+    pax_at_risk = {}
+    for pnr in pnrs:
+        itinerary = json.loads(pnr['itinerary_flight_keys'])
+        if len(itinerary) > 1:
+            pax_at_risk[itinerary[0]] = pax_at_risk.get(itinerary[0], 0) + pnr['pnr_misconnect_prob'] * pnr['group_size']
     
     for flight in flights:
         risk_score = float(flight['delay_risk_score']) * 0.3 + \
@@ -505,9 +645,10 @@ def generate_flight_risk(flights):
             'pax_component': round(float(flight['misconnect_prob']) * 100 * 0.5, 1),
             'maintenance_component': round(random.uniform(0, 20), 1),
             'gnn_network_criticality': round(network_impact * random.uniform(0.8, 1.2), 1),
+            'baseline_network_criticality': baseline[flight['flight_key']],
             'gnn_embedding': None,
-            'downline_legs_affected_count': random.randint(0, 8),
-            'misconnect_pax_at_risk': int(flight['pax_count'] * flight['connecting_pax_pct'] * flight['misconnect_prob']),
+            'downline_legs_affected_count': downline[flight['flight_key']],
+            'misconnect_pax_at_risk': round(pax_at_risk.get(flight['flight_key'], 0)),
             'revenue_at_risk_usd': round(flight['revenue_at_risk_usd'], 2),
             'risk_band': risk_band,
             'network_impact_band': impact_band,
@@ -778,15 +919,19 @@ def main():
     write_csv('crew_assignments.csv', assignments, list(assignments[0].keys()))
     
     print("Generating PNR trips...")
-    pnrs = generate_pnr(flights, 2000)
+    pnrs = generate_pnr(flights, airports, 2000)
     write_csv('pnr.csv', pnrs, list(pnrs[0].keys()))
     
+    print("Generating PNR legs...")
+    pnr_legs = generate_pnr_legs(pnrs)
+    write_csv('pnr_leg.csv', pnr_legs, list(pnr_legs[0].keys()))
+    
     print("Generating weather/ATC data...")
     weather = generate_weather(500)
     write_csv('weather.csv', weather, list(weather[0].keys()))
     
     print("Generating flight risk scores...")
-    risks = generate_flight_risk(flights)
+    risks = generate_flight_risk(flights, pnrs, rotations, assignments)
     write_csv('flight_risk.csv', risks, list(risks[0].keys()))
     
     print("Generating policy documents...")
@@ -804,6 +949,7 @@ def main():
     print(f"  - Crew Duty Periods: {len(duties)}")
     print(f"  - Crew Assignments: {len(assignments)}")
     print(f"  - PNR Trips: {len(pnrs)}")
+    print(f"  - PNR Legs: {len(pnr_legs)}")
     print(f"  - Weather Records: {len(weather)}")
     print(f"  - Flight Risk Records: {len(risks)}")
     print(f"  - Policy Documents: {len(docs)}")
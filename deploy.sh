@@ -174,6 +174,8 @@ if should_run_step "data"; then
             elif [[ "$table_name" == "PNR" ]]; then
                 schema="ATOMIC"
                 table_name="PNR_TRIP"
+            elif [[ "$table_name" == "PNR_LEG" ]]; then
+                schema="ATOMIC"
             elif [[ "$table_name" == "AIRPORTS" ]]; then
                 schema="ATOMIC"
                 table_name="AIRPORT_CAPABILITY"
@@ -240,6 +242,12 @@ if should_run_step "notebooks"; then
                 snow sql $SNOW_CONN -q "PUT file://${notebook} @${DATABASE}.RAW.${STAGE}/notebooks/ AUTO_COMPRESS=FALSE OVERWRITE=TRUE;" 2>/dev/null || true
             fi
         done
+        for module in pipeline/*.py; do
+            if [ -f "$module" ]; then
+                info "Uploading $module..."
+                snow sql $SNOW_CONN -q "PUT file://${module} @${DATABASE}.RAW.${STAGE}/pipeline/ AUTO_COMPRESS=FALSE OVERWRITE=TRUE;" 2>/dev/null || true
+            fi
+        done
         success "Notebooks uploaded"
     else
         warn "Notebooks directory not found"
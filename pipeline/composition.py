@@ -0,0 +1,428 @@
+"""
+FLIGHT_RISK composition engine.
+
+Joins the five model prediction frames, the connect-time misconnect engine
+and the GNN criticality onto FLIGHT_INSTANCE and derives every FLIGHT_RISK
+column (score, components, bands, risk drivers, flags) in one columnar pass
+over the network; there is no per-flight Python.
+
+Every signal is put on a 0-1 scale, passed through its calibration curve
+(piecewise linear, identity by default) and weighted:
+
+    FLIGHT_RISK_SCORE_0_100 = 100 * sum(weight[s] * calibrated[s])
+
+Weights, curves, component scales, band thresholds and flag cut-offs are a
+CompositionConfig, loadable from JSON. compose() + write() are the only
+path that writes FLIGHT_RISK rows: batch scoring, incremental re-scoring and
+`run.sh compose` (recompose from the stored predictions) all go through it.
+
+Usage:
+    python -m pipeline.composition --connection demo [--config risk.json]
+    python -m pipeline.composition --benchmark [--flights 1000000]
+"""
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pipeline import history, misconnect
+from pipeline.features import Tables, load_tables
+
+DATABASE = 'IROP_GNN_RISK'
+HEX_DIGITS = np.frombuffer(b'0123456789ABCDEF', dtype='S1')
+SIGNALS = ['DELAY', 'TURN', 'PAX', 'NETWORK', 'CREW', 'MAINTENANCE']
+SOURCES = ['FLIGHT_INSTANCE', 'AIRPORT_CAPABILITY', 'AIRCRAFT_ROTATION', 'CREW_ASSIGNMENT', 'PNR_TRIP', 'PNR_LEG']
+
+FLIGHT_RISK_UPDATE_COLUMNS = [
+    'SNAPSHOT_TS', 'TAIL_NUMBER', 'FLEET_TYPE', 'HUB_FLAG', 'ROUTE_TYPE', 'FLIGHT_RISK_SCORE_0_100',
+    'NETWORK_IMPACT_SCORE_0_100', 'CREW_LEGALITY_COMPONENT', 'AIRPORT_ENV_COMPONENT', 'PAX_COMPONENT',
+    'MAINTENANCE_COMPONENT', 'GNN_NETWORK_CRITICALITY', 'BASELINE_NETWORK_CRITICALITY',
+    'DOWNLINE_LEGS_AFFECTED_COUNT', 'MISCONNECT_PAX_AT_RISK', 'REVENUE_AT_RISK_USD', 'RISK_BAND',
+    'NETWORK_IMPACT_BAND', 'RISK_DRIVERS', 'FDP_TIMEOUT_RISK_FLAG', 'CURFEW_RISK_FLAG', 'MEL_RISK_FLAG',
+    'TURN_RISK_FLAG',
+]
+
+
+@dataclass(frozen=True)
+class Calibration:
+    """Piecewise-linear curve on [0, 1]; values outside the knots are clamped to the end points."""
+    x: Tuple[float, ...] = (0.0, 1.0)
+    y: Tuple[float, ...] = (0.0, 1.0)
+
+    def __call__(self, values) -> np.ndarray:
+        return np.interp(np.asarray(values, dtype=np.float64), self.x, self.y)
+
+
+@dataclass(frozen=True)
+class CompositionConfig:
+    # Defaults keep the weights of the synthetic FLIGHT_RISK data; CREW and MAINTENANCE only feed components.
+    weights: Mapping[str, float] = field(default_factory=lambda: {
+        'DELAY': 0.3, 'TURN': 0.25, 'PAX': 0.25, 'NETWORK': 0.2, 'CREW': 0.0, 'MAINTENANCE': 0.0})
+    calibration: Mapping[str, Calibration] = field(default_factory=dict)
+    component_scales: Mapping[str, float] = field(default_factory=lambda: {
+        'CREW': 30.0, 'AIRPORT': 25.0, 'PAX': 50.0, 'MAINTENANCE': 20.0})
+    bands: Tuple[Tuple[str, float], ...] = (('High', 70.0), ('Medium', 40.0))
+    default_band: str = 'Low'
+    driver_threshold: float = 10.0
+    airport_index_max: float = 1.2
+    fdp_flag_prob: float = 0.5
+    turn_flag_prob: float = 0.7
+    curfew_window_minutes: int = 60
+
+    def __post_init__(self):
+        unknown = (set(self.weights) | set(self.calibration)) - set(SIGNALS)
+        if unknown:
+            raise ValueError(f"Unknown risk signals {sorted(unknown)}; expected a subset of {SIGNALS}")
+
+    def calibrate(self, signal: str, values) -> np.ndarray:
+        curve = self.calibration.get(signal)
+        values = np.clip(np.asarray(values, dtype=np.float64), 0.0, 1.0)
+        return curve(values) if curve is not None else values
+
+    def band(self, score) -> np.ndarray:
+        score = np.asarray(score, dtype=np.float64)
+        ordered = sorted(self.bands, key=lambda b: -b[1])
+        return np.select([score >= threshold for _, threshold in ordered], [name for name, _ in ordered],
+                         self.default_band)
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> 'CompositionConfig':
+        """Config from JSON-style settings; omitted keys keep their defaults."""
+        spec = dict(spec)
+        defaults = cls()
+        if 'weights' in spec:
+            spec['weights'] = {**defaults.weights, **spec['weights']}
+        if 'component_scales' in spec:
+            spec['component_scales'] = {**defaults.component_scales, **spec['component_scales']}
+        if 'calibration' in spec:
+            spec['calibration'] = {name: Calibration(tuple(c['x']), tuple(c['y']))
+                                   for name, c in spec['calibration'].items()}
+        if 'bands' in spec:
+            spec['bands'] = tuple(sorted(((name, float(t)) for name, t in spec['bands'].items()),
+                                         key=lambda band: -band[1]))
+        return cls(**spec)
+
+    @classmethod
+    def load(cls, path: str) -> 'CompositionConfig':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+DEFAULT_CONFIG = CompositionConfig()
+
+
+def _risk_ids(n: int) -> np.ndarray:
+    """Random 8-hex-digit ids, the same shape as the uuid4 prefixes used for prediction ids."""
+    words = np.frombuffer(os.urandom(4 * n), dtype='>u4')
+    nibbles = (words[:, None] >> np.arange(28, -4, -4, dtype=np.uint32)) & 0xF
+    return HEX_DIGITS[nibbles].view('S8').ravel().astype(str).astype(object)
+
+
+def _minute_of_day(values: pd.Series) -> np.ndarray:
+    """'HH:MM[:SS]' strings or TIME values as minutes after midnight; NaN when missing."""
+    text = values.astype(str)
+    text = text.where(text.str.count(':') != 1, text + ':00')
+    return pd.to_timedelta(text, errors='coerce').dt.total_seconds().to_numpy() / 60
+
+
+def curfew_exposure(flights: pd.DataFrame, airports: pd.DataFrame, window_minutes: int = 60) -> np.ndarray:
+    """True when the local scheduled arrival falls inside the curfew or within `window_minutes` before it."""
+    apt = airports.set_index('STATION_CODE').reindex(flights['ARRIVAL_STATION'])
+    end = _minute_of_day(apt['CURFEW_END_LOCAL'])
+    start = (_minute_of_day(apt['CURFEW_START_LOCAL']) - window_minutes) % 1440
+    arrival = pd.to_datetime(flights['SCHED_ARR_UTC'])
+    utc_minutes = (arrival.dt.hour * 60 + arrival.dt.minute).to_numpy()
+    local = (utc_minutes + apt['TIMEZONE_OFFSET_UTC'].fillna(0).to_numpy() * 60) % 1440
+    # A window that wraps midnight (e.g. 22:00-06:00) is "after start or before end", otherwise "between".
+    exposed = np.where(start > end, (local >= start) | (local < end), (local >= start) & (local < end))
+    return np.where(np.isnan(start) | np.isnan(end), False, exposed)
+
+
+def risk_drivers(contributions: pd.DataFrame, threshold: float) -> np.ndarray:
+    """JSON array of the contributions at or above `threshold`, per row, via a bitmask lookup."""
+    names = list(contributions.columns)
+    codes = np.zeros(len(contributions), dtype=np.int64)
+    for i, name in enumerate(names):
+        codes |= (contributions[name].to_numpy() >= threshold).astype(np.int64) << i
+    lookup = np.array([json.dumps([n for i, n in enumerate(names) if code >> i & 1])
+                       for code in range(1 << len(names))], dtype=object)
+    return lookup[codes]
+
+
+def _latest(frame: Optional[pd.DataFrame], key: str, column: str) -> pd.Series:
+    if frame is None or frame.empty or column not in frame:
+        return pd.Series(dtype=np.float64)
+    if 'SNAPSHOT_TS' in frame:
+        frame = frame.sort_values('SNAPSHOT_TS')
+    return frame.drop_duplicates(key, keep='last').set_index(key)[column]
+
+
+def _place(positions: np.ndarray, values, n: int) -> np.ndarray:
+    """Array of `n` flights holding `values` at `positions` (-1 skipped; a repeated position keeps its last value)."""
+    out = np.full(n, np.nan)
+    keep = positions >= 0
+    out[positions[keep]] = np.asarray(values, dtype=np.float64)[keep]
+    return out
+
+
+def _scatter_max(positions: np.ndarray, values, n: int) -> np.ndarray:
+    """Per-flight max of `values` at flight `positions` (-1 skipped); NaN where a flight has none."""
+    values = np.asarray(values, dtype=np.float64)
+    keep = (positions >= 0) & ~np.isnan(values)
+    out = np.full(n, -np.inf)
+    np.maximum.at(out, positions[keep], values[keep])
+    return np.where(np.isneginf(out), np.nan, out)
+
+
+def compose(tables: Tables, predictions: Dict[str, pd.DataFrame], criticality: Optional[pd.DataFrame],
+            snapshot_ts: datetime, config: CompositionConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    """Per-flight FLIGHT_RISK rows from the five prediction frames and the GNN criticality."""
+    fi = tables['FLIGHT_INSTANCE'].reset_index(drop=True)
+    airports = tables['AIRPORT_CAPABILITY']
+    keys = pd.Index(fi['FLIGHT_KEY'])
+    n = len(keys)
+
+    def column(name: str) -> np.ndarray:
+        return pd.to_numeric(fi[name], errors='coerce').to_numpy(dtype=np.float64)
+
+    def fallback(primary: np.ndarray, secondary: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(primary), secondary, primary)
+
+    # Every prediction is mapped onto flights by position (one get_indexer per frame), never merged.
+    delay_pred = predictions['DELAY_PREDICTION_MODEL']
+    delay_pos = keys.get_indexer(delay_pred['FLIGHT_KEY'])
+    delay = np.nan_to_num(fallback(_place(delay_pos, delay_pred['DELAY_RISK_SCORE'].clip(0, 100), n),
+                                   column('DELAY_RISK_SCORE')))
+    turn_pred = predictions['TURN_SUCCESS_MODEL']
+    turn_success = np.nan_to_num(fallback(_place(keys.get_indexer(turn_pred['FLIGHT_KEY']),
+                                                 turn_pred['TURN_SUCCESS_PROB'], n),
+                                          column('TURN_SUCCESS_PROB')), nan=1.0)
+
+    assignments = tables['CREW_ASSIGNMENT']
+    timeout = _latest(predictions['CREW_TIMEOUT_MODEL'], 'DUTY_ID', 'TIMEOUT_PROB')
+    crew_prob = np.nan_to_num(_scatter_max(keys.get_indexer(assignments['FLIGHT_KEY']),
+                                           timeout.reindex(assignments['DUTY_ID']).to_numpy(), n))
+    aog = predictions['AOG_RISK_MODEL']
+    aog_prob = np.nan_to_num(_scatter_max(keys.get_indexer(aog['FLIGHT_KEY']), aog['AOG_RISK_SCORE'], n))
+    rotations = tables['AIRCRAFT_ROTATION']
+    rotation_flight = keys.get_indexer(rotations['FLIGHT_KEY'])
+    mel = np.zeros(n, dtype=bool)
+    mel[rotation_flight[rotations['MEL_ITEM_CODE'].notna().to_numpy() & (rotation_flight >= 0)]] = True
+
+    legs, trips = tables['PNR_LEG'], tables['PNR_TRIP']
+    leg_flight = keys.get_indexer(legs['FLIGHT_KEY'])
+    leg_trip = pd.Index(trips['TRIP_ID']).get_indexer(legs['TRIP_ID'])
+    leg_prob = _latest(predictions['PNR_MISCONNECT_MODEL'], 'TRIP_ID', 'PNR_MISCONNECT_PROB') \
+        .reindex(legs['TRIP_ID']).to_numpy(dtype=np.float64)
+    group_size = np.nan_to_num(trips['GROUP_SIZE'].to_numpy(dtype=np.float64))[leg_trip]
+    scored = (leg_flight >= 0) & (leg_trip >= 0) & ~np.isnan(leg_prob)
+    trip_count = np.bincount(leg_flight[scored], minlength=n)
+    has_trips = trip_count > 0
+    trip_prob = np.where(has_trips, np.bincount(leg_flight[scored], weights=leg_prob[scored], minlength=n)
+                         / np.maximum(trip_count, 1), np.nan)
+    trip_pax = np.where(has_trips, np.bincount(leg_flight[scored], weights=(leg_prob * group_size)[scored],
+                                               minlength=n), np.nan)
+
+    # Flights with passengers connecting off them use the connect-time/MCT engine; the PNR
+    # model's trip-level probability only fills in for flights without onward connections.
+    delays = misconnect.expected_delays(fi, delay_pred)
+    connections = misconnect.MisconnectEngine(fi, airports, legs, trips, delays).per_flight()
+    connecting = connections['CONNECTING_PAX'].to_numpy() > 0
+    misconnect_prob = np.nan_to_num(fallback(
+        np.where(connecting, connections['MISCONNECT_PROB'].to_numpy(), trip_prob), column('MISCONNECT_PROB')))
+    pax_at_risk = np.nan_to_num(np.where(connecting, connections['MISCONNECT_PAX_AT_RISK'].to_numpy(), trip_pax))
+    revenue_at_risk = np.nan_to_num(column('REVENUE_AT_RISK_USD')) \
+        + np.where(connecting, connections['MISCONNECT_REVENUE_AT_RISK_USD'].to_numpy(), 0.0)
+
+    if criticality is not None and not criticality.empty:
+        latest = criticality.sort_values('SNAPSHOT_TS') if 'SNAPSHOT_TS' in criticality else criticality
+        critical_pos = keys.get_indexer(latest['FLIGHT_KEY'])
+    else:
+        latest, critical_pos = pd.DataFrame(), np.empty(0, dtype=np.int64)
+
+    def critical(name: str, fill) -> np.ndarray:
+        if name not in latest:
+            return np.full(n, fill, dtype=np.float64) if np.isscalar(fill) else fill
+        return fallback(_place(critical_pos, latest[name], n), fill)
+
+    network = np.nan_to_num(critical('GNN_NETWORK_CRITICALITY', column('NETWORK_CRITICALITY_SCORE')))
+    downline = np.nan_to_num(critical('DOWNLINE_LEGS_AFFECTED_COUNT', 0.0))
+    baseline = np.nan_to_num(critical('BASELINE_NETWORK_CRITICALITY', 0.0))
+
+    signals = {
+        'DELAY': delay / 100,
+        'TURN': 1 - turn_success,
+        'PAX': misconnect_prob,
+        'NETWORK': network / 100,
+        'CREW': crew_prob,
+        'MAINTENANCE': aog_prob,
+    }
+    calibrated = {name: config.calibrate(name, values) for name, values in signals.items()}
+    contributions = pd.DataFrame({name: calibrated[name] * weight * 100
+                                  for name, weight in config.weights.items() if weight})
+    score = np.clip(contributions.sum(axis=1).to_numpy(), 0, 100)
+
+    station = airports.set_index('STATION_CODE')
+    dep_apt = station.reindex(fi['DEPARTURE_STATION'])
+    dep_country = dep_apt['COUNTRY'].to_numpy()
+    arr_country = station['COUNTRY'].reindex(fi['ARRIVAL_STATION']).to_numpy()
+    airport_env = (dep_apt['ATC_CONGESTION_INDEX'].fillna(0).to_numpy()
+                   + dep_apt['AIRPORT_DISRUPTION_INDEX'].fillna(0).to_numpy()) / config.airport_index_max
+    scales = config.component_scales
+
+    return pd.DataFrame({
+        'RISK_ID': _risk_ids(len(fi)),
+        'FLIGHT_KEY': fi['FLIGHT_KEY'],
+        'FLIGHT_NUMBER': fi['FLIGHT_NUMBER'],
+        'DEPARTURE_STATION': fi['DEPARTURE_STATION'],
+        'ARRIVAL_STATION': fi['ARRIVAL_STATION'],
+        'FLIGHT_DATE': fi['FLIGHT_DATE'],
+        'SCHED_DEP_UTC': fi['SCHED_DEP_UTC'],
+        'SCHED_ARR_UTC': fi['SCHED_ARR_UTC'],
+        'SNAPSHOT_TS': snapshot_ts,
+        'TAIL_NUMBER': fi['TAIL_NUMBER'],
+        'FLEET_TYPE': fi['AIRCRAFT_FLEET_TYPE'],
+        'HUB_FLAG': dep_apt['HUB_FLAG'].fillna(False).astype(bool).to_numpy(),
+        'ROUTE_TYPE': np.select([arr_country != 'USA', dep_country != 'USA'], ['DOM-INTL', 'INTL-DOM'], 'DOM-DOM'),
+        'FLIGHT_RISK_SCORE_0_100': score.round(1),
+        'NETWORK_IMPACT_SCORE_0_100': network.round(1),
+        'CREW_LEGALITY_COMPONENT': (calibrated['CREW'] * scales['CREW']).round(1),
+        'AIRPORT_ENV_COMPONENT': (airport_env * scales['AIRPORT']).round(1),
+        'PAX_COMPONENT': (calibrated['PAX'] * scales['PAX']).round(1),
+        'MAINTENANCE_COMPONENT': (calibrated['MAINTENANCE'] * scales['MAINTENANCE']).round(1),
+        'GNN_NETWORK_CRITICALITY': network.round(1),
+        'BASELINE_NETWORK_CRITICALITY': baseline.round(1),
+        'DOWNLINE_LEGS_AFFECTED_COUNT': downline.astype(int),
+        'MISCONNECT_PAX_AT_RISK': pax_at_risk.round().astype(int),
+        'REVENUE_AT_RISK_USD': revenue_at_risk.round(2),
+        'RISK_BAND': config.band(score),
+        'NETWORK_IMPACT_BAND': config.band(network),
+        'RISK_DRIVERS': risk_drivers(contributions, config.driver_threshold),
+        'FDP_TIMEOUT_RISK_FLAG': crew_prob >= config.fdp_flag_prob,
+        'CURFEW_RISK_FLAG': curfew_exposure(fi, airports, config.curfew_window_minutes),
+        'MEL_RISK_FLAG': mel,
+        'TURN_RISK_FLAG': turn_success < config.turn_flag_prob,
+    })
+
+
+def write(session, frame: pd.DataFrame):
+    """MERGE composed rows into IROP_MART.FLIGHT_RISK by FLIGHT_KEY and append their change points to history."""
+    # Imported here because pipeline.scoring imports this module.
+    from pipeline.scoring import merge_frame
+    merge_frame(session, frame, 'IROP_MART.FLIGHT_RISK', 'FLIGHT_KEY', FLIGHT_RISK_UPDATE_COLUMNS)
+    history.record(session, frame)
+
+
+def criticality_frame(session):
+    """Snowpark frame of the GNN criticality outputs, with the latest centrality baseline, that feed FLIGHT_RISK."""
+    return session.sql(f"""
+        SELECT e.FLIGHT_KEY, e.SNAPSHOT_TS, e.GNN_NETWORK_CRITICALITY, e.DOWNLINE_LEGS_AFFECTED_COUNT,
+               c.BASELINE_NETWORK_CRITICALITY
+        FROM {DATABASE}.ML_PROCESSING.GNN_FLIGHT_EMBEDDINGS e
+        LEFT JOIN (
+            SELECT FLIGHT_KEY, BASELINE_NETWORK_CRITICALITY
+            FROM {DATABASE}.ML_PROCESSING.FLIGHT_CENTRALITY
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY FLIGHT_KEY ORDER BY SNAPSHOT_TS DESC) = 1
+        ) c ON c.FLIGHT_KEY = e.FLIGHT_KEY
+    """)
+
+
+def run(session, config: CompositionConfig = DEFAULT_CONFIG, write_rows: bool = True) -> pd.DataFrame:
+    """Recompose FLIGHT_RISK from the stored prediction tables without re-scoring any model."""
+    from pipeline.scoring import MODEL_SPECS
+    jobs = {spec.name: session.table(f'{DATABASE}.ML_PROCESSING.{spec.output_table}').to_pandas(block=False)
+            for spec in MODEL_SPECS}
+    criticality_job = criticality_frame(session).to_pandas(block=False)
+    tables = load_tables(session, SOURCES)
+    predictions = {name: job.result() for name, job in jobs.items()}
+    flight_risk = compose(tables, predictions, criticality_job.result(), datetime.utcnow(), config)
+    if write_rows:
+        write(session, flight_risk)
+    return flight_risk
+
+
+def _synthetic(n_flights: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    flights, airports, legs, trips = misconnect._synthetic(n_flights, 2 * n_flights, seed=seed)
+    n = len(flights)
+    flights = flights.assign(
+        FLIGHT_NUMBER=[f'DL{i % 9000 + 1000}' for i in range(n)],
+        FLIGHT_DATE=pd.to_datetime(flights['SCHED_DEP_UTC']).dt.date,
+        TAIL_NUMBER=[f'N{i % (n // 6 + 1)}' for i in range(n)],
+        AIRCRAFT_FLEET_TYPE=rng.choice(['B737-900', 'A321neo', 'A350-900'], n),
+        DELAY_RISK_SCORE=rng.uniform(5, 90, n), TURN_SUCCESS_PROB=rng.uniform(0.3, 1, n),
+        MISCONNECT_PROB=rng.uniform(0, 0.5, n), REVENUE_AT_RISK_USD=rng.uniform(0, 50_000, n),
+        NETWORK_CRITICALITY_SCORE=rng.uniform(20, 95, n),
+    )
+    m = len(airports)
+    airports = airports.assign(
+        HUB_FLAG=rng.random(m) < 0.1, ATC_CONGESTION_INDEX=rng.uniform(0.2, 0.8, m),
+        AIRPORT_DISRUPTION_INDEX=rng.uniform(0.1, 0.4, m), TIMEZONE_OFFSET_UTC=rng.integers(-8, 10, m),
+        CURFEW_START_LOCAL=np.where(rng.random(m) < 0.1, '23:00:00', None),
+        CURFEW_END_LOCAL=np.where(rng.random(m) < 0.1, '06:00:00', None),
+    )
+    keys = flights['FLIGHT_KEY']
+    duties = np.arange(n) // 4
+    tables = {
+        'FLIGHT_INSTANCE': flights, 'AIRPORT_CAPABILITY': airports, 'PNR_LEG': legs, 'PNR_TRIP': trips,
+        'CREW_ASSIGNMENT': pd.DataFrame({'FLIGHT_KEY': keys, 'DUTY_ID': duties}),
+        'AIRCRAFT_ROTATION': pd.DataFrame({'FLIGHT_KEY': keys,
+                                           'MEL_ITEM_CODE': np.where(rng.random(n) < 0.1, 'APU', None)}),
+    }
+    predictions = {
+        'DELAY_PREDICTION_MODEL': pd.DataFrame({'FLIGHT_KEY': keys, 'PREDICTED_DELAY_MINUTES': rng.uniform(0, 90, n),
+                                                'DELAY_RISK_SCORE': rng.uniform(0, 100, n)}),
+        'TURN_SUCCESS_MODEL': pd.DataFrame({'FLIGHT_KEY': keys, 'TURN_SUCCESS_PROB': rng.random(n)}),
+        'CREW_TIMEOUT_MODEL': pd.DataFrame({'DUTY_ID': np.unique(duties), 'TIMEOUT_PROB': rng.random(duties[-1] + 1)}),
+        'PNR_MISCONNECT_MODEL': pd.DataFrame({'TRIP_ID': trips['TRIP_ID'], 'PNR_MISCONNECT_PROB': rng.random(len(trips))}),
+        'AOG_RISK_MODEL': pd.DataFrame({'FLIGHT_KEY': keys, 'AOG_RISK_SCORE': rng.random(n)}),
+    }
+    criticality = pd.DataFrame({'FLIGHT_KEY': keys, 'SNAPSHOT_TS': datetime(2026, 1, 1),
+                                'GNN_NETWORK_CRITICALITY': rng.uniform(0, 100, n),
+                                'DOWNLINE_LEGS_AFFECTED_COUNT': rng.integers(0, 12, n),
+                                'BASELINE_NETWORK_CRITICALITY': rng.uniform(0, 100, n)})
+    return tables, predictions, criticality
+
+
+def benchmark(n_flights: int = 1_000_000, config: CompositionConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    """Wall-clock for one full composition at growing network sizes."""
+    rows = []
+    for scale in (0.01, 0.1, 1.0):
+        n = max(int(n_flights * scale), 10)
+        tables, predictions, criticality = _synthetic(n)
+        start = time.perf_counter()
+        frame = compose(tables, predictions, criticality, datetime.utcnow(), config)
+        elapsed = time.perf_counter() - start
+        rows.append({'FLIGHTS': n, 'COMPOSE_S': round(elapsed, 3),
+                     'HIGH_BAND': int((frame['RISK_BAND'] == 'High').sum())})
+    return pd.DataFrame(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Recompose IROP_MART.FLIGHT_RISK from the stored predictions")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--config', help="JSON file with weights, calibration curves and band thresholds")
+    parser.add_argument('--benchmark', action='store_true', help="Time composition on a synthetic network")
+    parser.add_argument('--flights', type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    config = CompositionConfig.load(args.config) if args.config else DEFAULT_CONFIG
+
+    if args.benchmark:
+        print(benchmark(args.flights, config).to_string(index=False))
+        return
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    flight_risk = run(session, config)
+    print(f"FLIGHT_RISK recomposed for {len(flight_risk)} flights")
+    print(flight_risk['RISK_BAND'].value_counts().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Downline reach: how many later legs a delay on each flight spills onto.
+
+Flights are nodes of a time-ordered DAG with an edge u -> v whenever a
+delay on u can push v: the next leg of the same tail (AIRCRAFT_ROTATION),
+the next leg of the same crew duty (CREW_ASSIGNMENT) and the outbound leg of
+a passenger connection (PNR_LEG). Each edge has a slack, the scheduled
+ground time minus the minimum turn / crew connect / MCT, and a delay d on u
+arrives at v as d - slack. A leg counts as affected when the delay reaching
+it is at least `cutoff_minutes`; below that it is absorbed and propagation
+stops.
+
+Delays are discretized into `bin_minutes` steps, and one reverse
+topological sweep fills a sketch for every (u, k) pair, covering the legs
+affected when u is k bins late, from its successors' sketches. Every edge
+departs later than its source, so sources are swept in departure-time
+buckets narrower than the shortest edge gap, latest first, each bucket as
+one vectorized step. The work is O(edges x bins x sketch_size).
+
+A leg reachable from u along several routes counts once. Each sketch is a
+bottom-k min-rank sketch: the `sketch_size` smallest ranks (a random
+permutation of the flights) among the affected legs. Merging sketches
+never double-counts a leg. The count is exact while fewer than
+`sketch_size` legs are affected. Above that it is estimated as
+(k - 1) * flights / (k-th smallest rank), as centrality.py does for reach.
+
+Usage:
+    python -m pipeline.downline --connection demo
+    python -m pipeline.downline --benchmark [--flights 200000]
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.features import Tables, load_tables
+from pipeline.misconnect import expected_delays
+
+DATABASE = 'IROP_GNN_RISK'
+SOURCES = ['FLIGHT_INSTANCE', 'AIRCRAFT_ROTATION', 'CREW_ASSIGNMENT', 'PNR_LEG', 'AIRPORT_CAPABILITY']
+PERSIST_TABLES = ['ML_PROCESSING.GNN_FLIGHT_EMBEDDINGS', 'IROP_MART.FLIGHT_RISK']
+
+
+@dataclass(frozen=True)
+class DownlineConfig:
+    shock_minutes: float = 60.0
+    cutoff_minutes: float = 15.0
+    bin_minutes: float = 10.0
+    max_delay_minutes: float = 240.0
+    min_turn_minutes: float = 40.0
+    min_crew_connect_minutes: float = 30.0
+    default_mct_minutes: float = 45.0
+    sketch_size: int = 16
+    seed: int = 42
+
+
+DEFAULT_CONFIG = DownlineConfig()
+
+
+def _minutes(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[s]').astype(np.int64) / 60.0
+
+
+def propagation_edges(t: Tables, config: DownlineConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    """SRC/DST flight positions and SLACK minutes, one row per flight pair (tightest of tail, crew, pax)."""
+    fi = t['FLIGHT_INSTANCE']
+    keys = pd.Index(fi['FLIGHT_KEY'])
+    dep, arr = _minutes(fi['SCHED_DEP_UTC']), _minutes(fi['SCHED_ARR_UTC'])
+
+    r = t['AIRCRAFT_ROTATION']
+    tail = (r['PREV_FLIGHT_KEY'], r['FLIGHT_KEY'], np.full(len(r), config.min_turn_minutes))
+
+    a = t['CREW_ASSIGNMENT'].assign(DEP=lambda x: dep[np.maximum(keys.get_indexer(x['FLIGHT_KEY']), 0)])
+    order = ['DUTY_ID', 'LEG_SEQUENCE_IN_DUTY', 'DEP'] if 'LEG_SEQUENCE_IN_DUTY' in a else ['DUTY_ID', 'DEP']
+    a = a.sort_values(order)
+    prev = a.groupby('DUTY_ID')['FLIGHT_KEY'].shift(1)
+    crew = (prev, a['FLIGHT_KEY'], np.full(len(a), config.min_crew_connect_minutes))
+
+    legs = t['PNR_LEG']
+    legs = legs[legs['OUTBOUND_FLIGHT_KEY'].notna()]
+    mct = t['AIRPORT_CAPABILITY'].set_index('STATION_CODE').reindex(columns=['MCT_DOM_DOM_MINUTES'])
+    station = fi['ARRIVAL_STATION'].to_numpy()[np.maximum(keys.get_indexer(legs['FLIGHT_KEY']), 0)]
+    pax = (legs['FLIGHT_KEY'], legs['OUTBOUND_FLIGHT_KEY'],
+           mct['MCT_DOM_DOM_MINUTES'].reindex(station).fillna(config.default_mct_minutes).to_numpy(dtype=np.float64))
+
+    src = np.concatenate([keys.get_indexer(pd.Index(e[0]).astype(object)) for e in (tail, crew, pax)])
+    dst = np.concatenate([keys.get_indexer(pd.Index(e[1]).astype(object)) for e in (tail, crew, pax)])
+    min_ground = np.concatenate([e[2] for e in (tail, crew, pax)])
+    known = (src >= 0) & (dst >= 0)
+    src, dst, min_ground = src[known], dst[known], min_ground[known]
+    # Only edges forward in time can carry a delay; this also keeps the graph acyclic.
+    forward = dep[dst] > dep[src]
+    src, dst, min_ground = src[forward], dst[forward], min_ground[forward]
+    slack = np.maximum(dep[dst] - arr[src] - min_ground, 0.0)
+    # Tightest slack per pair: sort by (pair, slack) and keep the first of each pair.
+    pair = src.astype(np.int64) * len(keys) + dst
+    order = np.lexsort((slack, pair))
+    _, first = np.unique(pair[order], return_index=True)
+    keep = order[first]
+    return pd.DataFrame({'SRC': src[keep], 'DST': dst[keep], 'SLACK': slack[keep]})
+
+
+def sweep_order(dep: np.ndarray, src: np.ndarray, dst: np.ndarray):
+    """Edge order and slice bounds for a reverse topological sweep of a time-ordered DAG.
+
+    Sources are bucketed by departure time in steps of the shortest edge gap, so no edge
+    stays inside a bucket; buckets come latest first, and every destination is final
+    before any edge into it is read.
+    """
+    gap = float((dep[dst] - dep[src]).min())
+    bucket = np.floor((dep - dep.min()) / gap).astype(np.int64)
+    order = np.argsort(-bucket[src], kind='stable')
+    _, starts = np.unique(-bucket[src][order], return_index=True)
+    return order, list(zip(starts, np.append(starts[1:], len(order))))
+
+
+def _bottom_k(ranks: np.ndarray, k: int, empty: int) -> np.ndarray:
+    """The k smallest distinct values along the last axis, padded with `empty`."""
+    ranks = np.sort(ranks, axis=-1)
+    repeat = np.zeros(ranks.shape, dtype=bool)
+    repeat[..., 1:] = ranks[..., 1:] == ranks[..., :-1]
+    return np.sort(np.where(repeat, empty, ranks), axis=-1)[..., :k]
+
+
+def reach_table(dep: np.ndarray, edges: pd.DataFrame, config: DownlineConfig = DEFAULT_CONFIG) -> np.ndarray:
+    """reach[u, k]: distinct legs affected when flight u departs k * bin_minutes late."""
+    n, size = len(dep), config.sketch_size
+    n_bins = int(config.max_delay_minutes // config.bin_minutes) + 1
+    if edges.empty:
+        return np.zeros((n, n_bins), dtype=np.float32)
+    src, dst, slack = (edges[c].to_numpy() for c in ('SRC', 'DST', 'SLACK'))
+    levels = np.arange(n_bins) * config.bin_minutes
+    rank = np.random.default_rng(config.seed).permutation(n).astype(np.int32)
+    sketch = np.full((n, n_bins, size), n, dtype=np.int32)
+
+    order, slices = sweep_order(dep, src, dst)
+    src, dst, slack = src[order], dst[order], slack[order]
+    for lo, hi in slices:
+        s, d = src[lo:hi], dst[lo:hi]
+        arriving = levels[None, :] - slack[lo:hi, None]
+        k = np.clip(np.floor(arriving / config.bin_minutes), 0, n_bins - 1).astype(np.int64)
+        # Each edge offers its destination leg plus everything that leg reaches at the delay it receives.
+        offered = np.concatenate([np.broadcast_to(rank[d][:, None, None], (len(d), n_bins, 1)),
+                                  sketch[d[:, None], k]], axis=2)
+        offered = np.where((arriving >= config.cutoff_minutes)[:, :, None], offered, n)
+        # Merge in rounds in which every source appears once, so the fancy-indexed writes never collide.
+        by_src = np.argsort(s, kind='stable')
+        first = np.r_[True, s[by_src][1:] != s[by_src][:-1]]
+        nth = np.arange(len(s)) - np.maximum.accumulate(np.where(first, np.arange(len(s)), 0))
+        for r in range(int(nth.max()) + 1):
+            e = by_src[nth == r]
+            sketch[s[e]] = _bottom_k(np.concatenate([sketch[s[e]], offered[e]], axis=2), size, n)
+
+    held = (sketch < n).sum(axis=2)
+    estimate = (size - 1) * n / np.maximum(sketch[:, :, -1], 1).astype(np.float64)
+    return np.where(held < size, held, np.maximum(estimate, size)).astype(np.float32)
+
+
+def downline_reach(t: Tables, delays: Optional[pd.DataFrame] = None,
+                   config: DownlineConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    """Distinct DOWNLINE_LEGS_AFFECTED_COUNT per flight for a delay of max(shock, expected departure delay)."""
+    fi = t['FLIGHT_INSTANCE']
+    dep = _minutes(fi['SCHED_DEP_UTC'])
+    reach = reach_table(dep, propagation_edges(t, config), config)
+    delays = delays if delays is not None else expected_delays(fi)
+    shock = np.maximum(delays['DEP_DELAY'].reindex(fi['FLIGHT_KEY']).fillna(0).to_numpy(), config.shock_minutes)
+    k = np.clip(np.round(shock / config.bin_minutes), 0, reach.shape[1] - 1).astype(np.int64)
+    return pd.DataFrame({
+        'FLIGHT_KEY': fi['FLIGHT_KEY'].to_numpy(),
+        'SHOCK_MINUTES': shock,
+        'DOWNLINE_LEGS_AFFECTED_COUNT': np.round(reach[np.arange(len(fi)), k]).astype(np.int64),
+    })
+
+
+def persist(session, reach: pd.DataFrame):
+    """Write DOWNLINE_LEGS_AFFECTED_COUNT onto GNN_FLIGHT_EMBEDDINGS and FLIGHT_RISK by FLIGHT_KEY."""
+    staged = f'{DATABASE}.ML_PROCESSING.DOWNLINE_REACH_STAGE'
+    session.create_dataframe(reach[['FLIGHT_KEY', 'DOWNLINE_LEGS_AFFECTED_COUNT']]) \
+        .write.mode('overwrite').save_as_table(staged, table_type='temporary')
+    for table in PERSIST_TABLES:
+        session.sql(f"""
+            UPDATE {DATABASE}.{table} tgt
+            SET DOWNLINE_LEGS_AFFECTED_COUNT = src.DOWNLINE_LEGS_AFFECTED_COUNT
+            FROM {staged} src
+            WHERE tgt.FLIGHT_KEY = src.FLIGHT_KEY
+        """).collect()
+
+
+def run(session, config: DownlineConfig = DEFAULT_CONFIG, write: bool = True) -> pd.DataFrame:
+    """Recompute reach for the whole network from ATOMIC and the latest delay predictions."""
+    predictions = session.table(f'{DATABASE}.ML_PROCESSING.DELAY_PREDICTIONS') \
+        .select('FLIGHT_KEY', 'PREDICTED_DELAY_MINUTES', 'SNAPSHOT_TS').to_pandas(block=False)
+    t = load_tables(session, SOURCES)
+    delays = expected_delays(t['FLIGHT_INSTANCE'], predictions.result().sort_values('SNAPSHOT_TS'))
+    reach = downline_reach(t, delays, config)
+    if write:
+        persist(session, reach)
+    return reach
+
+
+def _synthetic(n_flights: int, legs_per_tail: int = 6, seed: int = 0) -> Tables:
+    rng = np.random.default_rng(seed)
+    n_tails = max(n_flights // legs_per_tail, 1)
+    tail = np.arange(n_flights) % n_tails
+    seq = np.arange(n_flights) // n_tails
+    dep = np.datetime64('2026-01-01T05:00:00') + (seq * 150 + rng.integers(0, 60, n_flights)).astype('timedelta64[m]')
+    keys = np.array([f'F{i}' for i in range(n_flights)], dtype=object)
+    fi = pd.DataFrame({
+        'FLIGHT_KEY': keys,
+        'ARRIVAL_STATION': rng.choice(['ATL', 'JFK', 'DTW', 'LAX'], n_flights),
+        'SCHED_DEP_UTC': dep,
+        'SCHED_ARR_UTC': dep + rng.integers(60, 120, n_flights).astype('timedelta64[m]'),
+        'CURRENT_DELAY_DEPARTURE': 0, 'CURRENT_DELAY_ARRIVAL': 0,
+    })
+    prev = np.where(seq > 0, np.arange(n_flights) - n_tails, -1)
+    rotations = pd.DataFrame({'FLIGHT_KEY': keys, 'PREV_FLIGHT_KEY': np.where(prev >= 0, keys[np.maximum(prev, 0)], None)})
+    # Crews swap tails halfway through the day; passengers connect onto a random later bank.
+    duty = np.where(seq < legs_per_tail // 2, tail, (tail + 1) % n_tails)
+    assignments = pd.DataFrame({'FLIGHT_KEY': keys, 'DUTY_ID': duty, 'LEG_SEQUENCE_IN_DUTY': seq})
+    inbound = rng.integers(0, n_flights, n_flights)
+    outbound = np.minimum(inbound + n_tails * rng.integers(1, 3, n_flights), n_flights - 1)
+    legs = pd.DataFrame({'FLIGHT_KEY': keys[inbound], 'OUTBOUND_FLIGHT_KEY': keys[outbound]})
+    airports = pd.DataFrame({'STATION_CODE': ['ATL', 'JFK', 'DTW', 'LAX'], 'MCT_DOM_DOM_MINUTES': 45})
+    return {'FLIGHT_INSTANCE': fi, 'AIRCRAFT_ROTATION': rotations, 'CREW_ASSIGNMENT': assignments,
+            'PNR_LEG': legs, 'AIRPORT_CAPABILITY': airports}
+
+
+def benchmark(n_flights: int = 200_000) -> pd.DataFrame:
+    """Wall-clock for edges + sweep at growing network sizes."""
+    rows = []
+    for scale in (0.01, 0.1, 1.0):
+        n = max(int(n_flights * scale), 10)
+        t = _synthetic(n)
+        start = time.perf_counter()
+        edges = propagation_edges(t)
+        built = time.perf_counter()
+        reach = downline_reach(t)
+        swept = time.perf_counter()
+        rows.append({'FLIGHTS': n, 'EDGES': len(edges), 'EDGES_S': round(built - start, 3),
+                     'TOTAL_S': round(swept - start, 3),
+                     'MEAN_REACH': round(float(reach['DOWNLINE_LEGS_AFFECTED_COUNT'].mean()), 2)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute downline reach for every flight")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--benchmark', action='store_true', help="Time the sweep on a synthetic network")
+    parser.add_argument('--flights', type=int, default=200_000)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark(args.flights).to_string(index=False))
+        return
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    reach = run(session)
+    print(f"Downline reach written for {len(reach)} flights")
+    print(reach.sort_values('DOWNLINE_LEGS_AFFECTED_COUNT', ascending=False).head(10).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Materialized, versioned feature tables shared by training and scoring.
+
+Each FeatureSet is stored in ML_PROCESSING.FS_<NAME>_<VERSION> as an
+append-only log keyed by (entity key, SNAPSHOT_TS). A refresh:
+
+1. fingerprints the set's ATOMIC sources (COUNT + HASH_AGG) and stops if
+   they match the last materialized snapshot;
+2. otherwise rebuilds the set, hashes each row and appends only the rows
+   whose hash changed, plus IS_DELETED tombstones for vanished keys;
+3. records the snapshot in ML_PROCESSING.FEATURE_SNAPSHOTS.
+
+`read(name, as_of)` returns the latest row per key at or before `as_of`,
+so a model trained on a snapshot can be scored on exactly the same features.
+"""
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline.features import FEATURE_SETS, FeatureSet, Tables, load_tables
+
+DATABASE = 'IROP_GNN_RISK'
+SCHEMA = 'ML_PROCESSING'
+SNAPSHOTS_TABLE = 'FEATURE_SNAPSHOTS'
+META_COLUMNS = ['SNAPSHOT_TS', 'ROW_HASH', 'IS_DELETED']
+
+
+@dataclass
+class RefreshStats:
+    feature_set: str
+    version: str
+    snapshot_ts: Optional[datetime]
+    rows_written: int
+    rows_deleted: int
+    rows_total: int
+    skipped: bool
+
+
+def row_hashes(frame: pd.DataFrame) -> np.ndarray:
+    """Stable signed 64-bit hash of each row's values (fits a Snowflake NUMBER)."""
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def fingerprint_query(sources: Iterable[str]) -> str:
+    return "\nUNION ALL\n".join(
+        f"SELECT '{name}' AS TABLE_NAME, COUNT(*) AS ROW_COUNT, HASH_AGG(*) AS CONTENT_HASH "
+        f"FROM {DATABASE}.ATOMIC.{name}"
+        for name in sources
+    )
+
+
+def latest_rows_query(fs: FeatureSet, as_of: Optional[datetime] = None) -> str:
+    """Latest live row per key; bind `as_of` as the only parameter when given."""
+    table = f'{DATABASE}.{SCHEMA}.{fs.table_name}'
+    where = "WHERE SNAPSHOT_TS <= ?" if as_of is not None else ""
+    return f"""
+        SELECT * FROM (
+            SELECT * FROM {table} {where}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY {fs.key_col} ORDER BY SNAPSHOT_TS DESC) = 1
+        ) WHERE NOT IS_DELETED
+    """
+
+
+def diff_snapshot(fs: FeatureSet, current: pd.DataFrame, stored: pd.DataFrame,
+                  snapshot_ts: datetime) -> pd.DataFrame:
+    """Rows to append so the store's latest state equals `current`.
+
+    `stored` holds the key and ROW_HASH of the latest live rows.
+    """
+    current = current.assign(ROW_HASH=row_hashes(current), IS_DELETED=False, SNAPSHOT_TS=snapshot_ts)
+    previous = stored.set_index(fs.key_col)['ROW_HASH']
+    known = previous.reindex(current[fs.key_col]).to_numpy()
+    changed = current[pd.isna(known) | (known != current['ROW_HASH'].to_numpy())]
+
+    gone = previous.index.difference(current[fs.key_col])
+    tombstones = pd.DataFrame({fs.key_col: gone, 'ROW_HASH': 0, 'IS_DELETED': True, 'SNAPSHOT_TS': snapshot_ts})
+    return pd.concat([changed, tombstones], ignore_index=True)[list(current.columns)]
+
+
+class FeatureStore:
+    """Refreshes and reads the FS_* feature tables for one session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def _fingerprint(self, fs: FeatureSet) -> str:
+        rows = self.session.sql(fingerprint_query(fs.sources)).collect()
+        return json.dumps({r['TABLE_NAME']: [r['ROW_COUNT'], r['CONTENT_HASH']] for r in rows}, sort_keys=True)
+
+    def latest_snapshot(self, fs: FeatureSet) -> Optional[dict]:
+        rows = self.session.sql(f"""
+            SELECT SNAPSHOT_TS, SOURCE_FINGERPRINT, ROWS_TOTAL
+            FROM {DATABASE}.{SCHEMA}.{SNAPSHOTS_TABLE}
+            WHERE FEATURE_SET = ? AND VERSION = ?
+            ORDER BY SNAPSHOT_TS DESC LIMIT 1
+        """, params=[fs.name, fs.version]).collect()
+        return rows[0].as_dict() if rows else None
+
+    def refresh(self, names: Optional[Iterable[str]] = None, tables: Optional[Tables] = None,
+                force: bool = False) -> Dict[str, RefreshStats]:
+        """Materialize each named feature set whose sources changed since its last snapshot."""
+        names = list(names or FEATURE_SETS)
+        snapshot_ts = datetime.utcnow()
+        stale = {}
+        stats = {}
+        for name in names:
+            fs = FEATURE_SETS[name]
+            fingerprint = self._fingerprint(fs)
+            latest = self.latest_snapshot(fs)
+            if not force and latest and latest['SOURCE_FINGERPRINT'] == fingerprint:
+                stats[name] = RefreshStats(name, fs.version, latest['SNAPSHOT_TS'], 0, 0, latest['ROWS_TOTAL'], True)
+            else:
+                stale[name] = fingerprint
+
+        if stale:
+            needed = sorted({t for name in stale for t in FEATURE_SETS[name].sources} - set(tables or {}))
+            tables = {**(tables or {}), **(load_tables(self.session, needed) if needed else {})}
+        for name, fingerprint in stale.items():
+            stats[name] = self._materialize(FEATURE_SETS[name], tables, fingerprint, snapshot_ts)
+        return stats
+
+    def _materialize(self, fs: FeatureSet, tables: Tables, fingerprint: str, snapshot_ts: datetime) -> RefreshStats:
+        current = fs.builder(tables)
+        stored = self.session.sql(
+            f"SELECT {fs.key_col}, ROW_HASH FROM ({latest_rows_query(fs)})"
+        ).to_pandas()
+        delta = diff_snapshot(fs, current, stored, snapshot_ts)
+        if not delta.empty:
+            self.session.write_pandas(delta, fs.table_name, database=DATABASE, schema=SCHEMA,
+                                      use_logical_type=True)
+        deleted = int(delta['IS_DELETED'].sum())
+        self.session.sql(f"""
+            INSERT INTO {DATABASE}.{SCHEMA}.{SNAPSHOTS_TABLE}
+                (FEATURE_SET, VERSION, SNAPSHOT_TS, SOURCE_FINGERPRINT, ROWS_WRITTEN, ROWS_DELETED, ROWS_TOTAL)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, params=[fs.name, fs.version, snapshot_ts, fingerprint, len(delta) - deleted, deleted,
+                     len(current)]).collect()
+        return RefreshStats(fs.name, fs.version, snapshot_ts, len(delta) - deleted, deleted, len(current), False)
+
+    def write_rows(self, name: str, rows: pd.DataFrame, deleted_keys: Sequence[str] = (),
+                   snapshot_ts: Optional[datetime] = None) -> int:
+        """Partial refresh for a known set of keys: append the changed rows and tombstone `deleted_keys`.
+
+        No FEATURE_SNAPSHOTS row is written, so the next full refresh re-checks its sources.
+        """
+        from snowflake.snowpark.functions import col
+        fs = FEATURE_SETS[name]
+        keys = list(rows[fs.key_col]) + list(deleted_keys)
+        if not keys:
+            return 0
+        stored = self.session.sql(latest_rows_query(fs)).select(fs.key_col, 'ROW_HASH') \
+            .filter(col(fs.key_col).isin(keys)).to_pandas()
+        delta = diff_snapshot(fs, rows, stored, snapshot_ts or datetime.utcnow())
+        if not delta.empty:
+            self.session.write_pandas(delta, fs.table_name, database=DATABASE, schema=SCHEMA,
+                                      use_logical_type=True)
+        return len(delta)
+
+    def read(self, name: str, as_of: Optional[datetime] = None):
+        """Snowpark DataFrame of the feature set as of `as_of` (default: latest snapshot)."""
+        fs = FEATURE_SETS[name]
+        params = [as_of] if as_of is not None else None
+        return self.session.sql(latest_rows_query(fs, as_of), params=params).drop(*META_COLUMNS)
+
+    def read_pandas(self, name: str, as_of: Optional[datetime] = None) -> pd.DataFrame:
+        return self.read(name, as_of).to_pandas()
+
+    def read_many(self, names: Iterable[str], as_of: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+        """Several feature sets fetched as concurrent async queries."""
+        jobs = {name: self.read(name, as_of).to_pandas(block=False) for name in names}
+        return {name: job.result() for name, job in jobs.items()}
@@ -0,0 +1,192 @@
+"""
+Feature builders shared by the scoring pipeline.
+
+Each builder turns one in-memory copy of the ATOMIC tables into a model's
+feature frame, so the five models no longer reload FLIGHT_INSTANCE and
+friends independently. The notebooks (irco_01..05) read the materialized
+results through pipeline.feature_store.
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline.weather import DEFAULT_WINDOW, WeatherWindow, flight_weather
+
+ATOMIC_TABLES = [
+    'FLIGHT_INSTANCE', 'AIRCRAFT_ROTATION', 'CREW_DUTY_PERIOD', 'CREW_ASSIGNMENT',
+    'PNR_TRIP', 'PNR_LEG', 'AIRPORT_CAPABILITY', 'WEATHER_ATC',
+]
+
+Tables = Dict[str, pd.DataFrame]
+
+
+def _flag(series: pd.Series) -> pd.Series:
+    return series.fillna(False).astype(bool).astype(np.int8)
+
+
+def delay_features(t: Tables, window: WeatherWindow = DEFAULT_WINDOW) -> pd.DataFrame:
+    airports = t['AIRPORT_CAPABILITY'].set_index('STATION_CODE')
+    f = t['FLIGHT_INSTANCE'].join(airports[['HUB_FLAG', 'ATC_CONGESTION_INDEX']], on='DEPARTURE_STATION')
+    weather = flight_weather(f, t['WEATHER_ATC'], window)
+    return pd.concat([pd.DataFrame({
+        'FLIGHT_KEY': f['FLIGHT_KEY'],
+        'TARGET_DELAY_MINUTES': f['CURRENT_DELAY_DEPARTURE'],
+        'BLOCK_TIME_MINUTES': f['BLOCK_TIME_MINUTES'],
+        'TURN_BUFFER_MINUTES': f['TURN_BUFFER_MINUTES'],
+        'PAX_COUNT': f['PAX_COUNT'],
+        'CONNECTING_PAX_PCT': f['CONNECTING_PAX_PCT'],
+        'IS_HUB': _flag(f['HUB_FLAG']),
+        'IS_INTL': _flag(f['INTL_CONNECTOR_FLAG']),
+        'ATC_CONGESTION': f['ATC_CONGESTION_INDEX'],
+    }), weather], axis=1).fillna(0)
+
+
+def turn_features(t: Tables) -> pd.DataFrame:
+    flights = t['FLIGHT_INSTANCE'].set_index('FLIGHT_KEY')
+    airports = t['AIRPORT_CAPABILITY'].set_index('STATION_CODE')
+    r = t['AIRCRAFT_ROTATION']
+    r = r[r['PREV_FLIGHT_KEY'].notna() & r['FLIGHT_KEY'].isin(flights.index) & r['PREV_FLIGHT_KEY'].isin(flights.index)]
+    current = flights.loc[r['FLIGHT_KEY']]
+    prev = flights.loc[r['PREV_FLIGHT_KEY']]
+    apt = airports.reindex(current['DEPARTURE_STATION'])
+    return pd.DataFrame({
+        'FLIGHT_KEY': r['FLIGHT_KEY'].to_numpy(),
+        'TAIL_NUMBER': r['TAIL_NUMBER'].to_numpy(),
+        'TURN_SUCCESS_FLAG': (current['TURN_SUCCESS_PROB'] >= 0.7).astype(np.int8).to_numpy(),
+        'TURN_BUFFER_MINUTES': current['TURN_BUFFER_MINUTES'].to_numpy(),
+        'INBOUND_DELAY': prev['CURRENT_DELAY_ARRIVAL'].to_numpy(),
+        'PAX_COUNT': current['PAX_COUNT'].to_numpy(),
+        'CONNECTING_PAX_PCT': current['CONNECTING_PAX_PCT'].to_numpy(),
+        'IS_HUB': _flag(apt['HUB_FLAG']).to_numpy(),
+        'GATE_COUNT': apt['GATE_COUNT'].to_numpy(),
+        'HAS_MEL': _flag(r['MEL_APU_FLAG']).to_numpy(),
+        'AOG_RISK': r['AOG_RISK_SCORE'].to_numpy(),
+    }).fillna(0)
+
+
+def crew_features(t: Tables) -> pd.DataFrame:
+    from pipeline.legality import LegalityEngine
+
+    delays = t['CREW_ASSIGNMENT'].merge(
+        t['FLIGHT_INSTANCE'][['FLIGHT_KEY', 'CURRENT_DELAY_DEPARTURE']], on='FLIGHT_KEY'
+    ).groupby('DUTY_ID')['CURRENT_DELAY_DEPARTURE'].agg(AVG_DELAY='mean', TOTAL_DELAY='sum')
+    c = t['CREW_DUTY_PERIOD'].join(delays, on='DUTY_ID')
+    legality = LegalityEngine(c, t['CREW_ASSIGNMENT'], t['FLIGHT_INSTANCE'], t['AIRPORT_CAPABILITY']).per_duty()
+    return pd.DataFrame({
+        'DUTY_ID': c['DUTY_ID'],
+        'TIMEOUT_FLAG': (c['CREW_TIMEOUT_RISK_SCORE'] >= 0.5).astype(np.int8),
+        'FDP_LIMIT_MINUTES': c['FDP_LIMIT_MINUTES'],
+        'FDP_TIME_USED_MINUTES': c['FDP_TIME_USED_MINUTES'],
+        'FDP_REMAINING_MINUTES': c['FDP_REMAINING_MINUTES'],
+        'NUM_SEGMENTS': c['NUM_SEGMENTS'],
+        'TIME_ZONE_SPAN_HOURS': c['TIME_ZONE_SPAN_HOURS'],
+        'IS_AUGMENTED': _flag(c['AUGMENTED_CREW_FLAG']),
+        'REST_IN_LAST_168_HOURS_MINUTES': c['REST_IN_LAST_168_HOURS_MINUTES'],
+        'AVG_DELAY': c['AVG_DELAY'].astype(float),
+        'TOTAL_DELAY': c['TOTAL_DELAY'].astype(float),
+        'LEGAL_FDP_LIMIT_MINUTES': legality['LEGAL_FDP_LIMIT_MINUTES'].to_numpy(),
+        'PROJECTED_FDP_REMAINING_MINUTES': legality['PROJECTED_FDP_REMAINING_MINUTES'].to_numpy(),
+    }).fillna(0)
+
+
+def pnr_features(t: Tables) -> pd.DataFrame:
+    p = t['PNR_TRIP']
+    return pd.DataFrame({
+        'TRIP_ID': p['TRIP_ID'],
+        'PNR_ID': p['PNR_ID'],
+        'MISCONNECT_FLAG': (p['PNR_MISCONNECT_PROB'] >= 0.3).astype(np.int8),
+        'GROUP_SIZE': p['GROUP_SIZE'],
+        'IS_INTL': _flag(p['INTL_FLAG']),
+        'REBOOK_FLEXIBILITY_INDEX': p['REBOOK_FLEXIBILITY_INDEX'],
+        'LOYALTY_VALUE_INDEX': p['LOYALTY_VALUE_INDEX'],
+        'PNR_REACCOM_COMPLEXITY_SCORE': p['PNR_REACCOM_COMPLEXITY_SCORE'],
+        'IS_ELITE': p['ELITE_STATUS_LEVEL'].notna().astype(np.int8),
+        'ESTIMATED_VOUCHER_COST_USD': p['ESTIMATED_VOUCHER_COST_USD'],
+    }).fillna(0)
+
+
+MEL_SEVERITY_SCORES = {'CAT-A': 4, 'CAT-B': 3, 'CAT-C': 2, 'CAT-D': 1}
+
+
+def aog_features(t: Tables) -> pd.DataFrame:
+    r = t['AIRCRAFT_ROTATION']
+    return pd.DataFrame({
+        'TAIL_NUMBER': r['TAIL_NUMBER'],
+        'FLIGHT_KEY': r['FLIGHT_KEY'],
+        'AOG_FLAG': (r['AOG_RISK_SCORE'] >= 0.5).astype(np.int8),
+        'AIRCRAFT_AGE_YEARS': r['AIRCRAFT_AGE_YEARS'],
+        'UTILIZATION_HOURS_24H': r['UTILIZATION_HOURS_24H'],
+        'HAS_APU_MEL': _flag(r['MEL_APU_FLAG']),
+        'HAS_MEL': r['MEL_ITEM_CODE'].notna().astype(np.int8),
+        'MEL_SEVERITY_SCORE': r['MEL_SEVERITY'].map(MEL_SEVERITY_SCORES).fillna(0).astype(np.int8),
+        'AT_MX_STATION': _flag(r['MAINTENANCE_STATION_FLAG']),
+        'IS_ETOPS': _flag(r['ETOPS_CAPABLE_FLAG']),
+    }).fillna(0)
+
+
+@dataclass(frozen=True)
+class FeatureSet:
+    name: str
+    builder: Callable[[Tables], pd.DataFrame]
+    key_col: str
+    label_col: str
+    feature_cols: List[str]
+    sources: List[str]
+    # Bump when the builder or feature_cols change; the store keeps one table per version.
+    version: str = 'V1'
+
+    @property
+    def table_name(self) -> str:
+        return f'FS_{self.name.upper()}_{self.version}'
+
+
+FEATURE_SETS = {
+    fs.name: fs for fs in [
+        FeatureSet('delay', delay_features, 'FLIGHT_KEY', 'TARGET_DELAY_MINUTES', [
+            'BLOCK_TIME_MINUTES', 'TURN_BUFFER_MINUTES', 'PAX_COUNT',
+            'CONNECTING_PAX_PCT', 'IS_HUB', 'IS_INTL', 'ATC_CONGESTION',
+            'DEP_WEATHER_CONVECTIVE', 'DEP_WEATHER_EDCT', 'DEP_WEATHER_HOLDING',
+            'ARR_WEATHER_CONVECTIVE', 'ARR_WEATHER_EDCT', 'ARR_WEATHER_HOLDING',
+        ], ['FLIGHT_INSTANCE', 'WEATHER_ATC', 'AIRPORT_CAPABILITY'], version='V2'),
+        FeatureSet('turn', turn_features, 'FLIGHT_KEY', 'TURN_SUCCESS_FLAG', [
+            'TURN_BUFFER_MINUTES', 'INBOUND_DELAY', 'PAX_COUNT',
+            'CONNECTING_PAX_PCT', 'IS_HUB', 'GATE_COUNT', 'HAS_MEL', 'AOG_RISK',
+        ], ['FLIGHT_INSTANCE', 'AIRCRAFT_ROTATION', 'AIRPORT_CAPABILITY']),
+        FeatureSet('crew', crew_features, 'DUTY_ID', 'TIMEOUT_FLAG', [
+            'FDP_LIMIT_MINUTES', 'FDP_TIME_USED_MINUTES', 'FDP_REMAINING_MINUTES',
+            'NUM_SEGMENTS', 'TIME_ZONE_SPAN_HOURS', 'IS_AUGMENTED',
+            'REST_IN_LAST_168_HOURS_MINUTES', 'AVG_DELAY', 'TOTAL_DELAY',
+            'LEGAL_FDP_LIMIT_MINUTES', 'PROJECTED_FDP_REMAINING_MINUTES',
+        ], ['CREW_DUTY_PERIOD', 'CREW_ASSIGNMENT', 'FLIGHT_INSTANCE', 'AIRPORT_CAPABILITY'], version='V2'),
+        FeatureSet('pnr', pnr_features, 'TRIP_ID', 'MISCONNECT_FLAG', [
+            'GROUP_SIZE', 'IS_INTL', 'REBOOK_FLEXIBILITY_INDEX',
+            'LOYALTY_VALUE_INDEX', 'PNR_REACCOM_COMPLEXITY_SCORE',
+            'IS_ELITE', 'ESTIMATED_VOUCHER_COST_USD',
+        ], ['PNR_TRIP']),
+        FeatureSet('aog', aog_features, 'FLIGHT_KEY', 'AOG_FLAG', [
+            'AIRCRAFT_AGE_YEARS', 'UTILIZATION_HOURS_24H', 'HAS_APU_MEL',
+            'HAS_MEL', 'MEL_SEVERITY_SCORE', 'AT_MX_STATION', 'IS_ETOPS',
+        ], ['AIRCRAFT_ROTATION']),
+    ]
+}
+
+
+def load_tables(session, names: Sequence[str] = ATOMIC_TABLES, database: str = 'IROP_GNN_RISK') -> Tables:
+    """Fetch ATOMIC tables concurrently; columns arrive upper-cased as in Snowpark."""
+    jobs = {name: session.table(f'{database}.ATOMIC.{name}').to_pandas(block=False) for name in names}
+    return {name: job.result() for name, job in jobs.items()}
+
+
+class FeatureCache:
+    """Builds each feature set at most once per loaded table snapshot."""
+
+    def __init__(self, tables: Tables):
+        self.tables = tables
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    def get(self, name: str) -> pd.DataFrame:
+        if name not in self._frames:
+            self._frames[name] = FEATURE_SETS[name].builder(self.tables)
+        return self._frames[name]
@@ -0,0 +1,159 @@
+"""
+Delta-encoded FLIGHT_RISK_HISTORY writer.
+
+Every FLIGHT_RISK composition is diffed, inside the warehouse, against the
+last recorded state of each flight, and only change points are appended:
+
+- NEW: the flight has no row since the last keyframe.
+- CHANGED: FLIGHT_RISK_SCORE_0_100 or NETWORK_IMPACT_SCORE_0_100 moved by
+  more than `tolerance` (scores are stored to one decimal).
+- KEYFRAME: every `keyframe_interval` the full state is written once: every
+  flight in the composition, plus carried-forward flights whose FLIGHT_DATE
+  is no older than `keyframe_horizon_days`. Readers never scan further back
+  than the last keyframe before the time they ask for, and flights that have
+  flown and are no longer composed drop out of the state.
+
+A snapshot at time T is the latest row per flight between the last keyframe
+at or before T and T; a timeline is a flight's rows in order. The readers
+live in streamlit/utils/history.py.
+
+Usage:
+    python -m pipeline.history --connection demo --stats [--days 14]
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+import pandas as pd
+
+DATABASE = 'IROP_GNN_RISK'
+HISTORY_TABLE = f'{DATABASE}.IROP_MART.FLIGHT_RISK_HISTORY'
+FLIGHT_RISK_TABLE = f'{DATABASE}.IROP_MART.FLIGHT_RISK'
+SCORE_COLUMNS = ['FLIGHT_RISK_SCORE_0_100', 'NETWORK_IMPACT_SCORE_0_100']
+STATE_COLUMNS = ['RISK_ID', 'FLIGHT_KEY', 'FLIGHT_DATE'] + SCORE_COLUMNS
+
+
+@dataclass(frozen=True)
+class HistoryConfig:
+    tolerance: float = 0.05
+    keyframe_interval: timedelta = timedelta(hours=24)
+    keyframe_horizon_days: int = 1
+
+
+DEFAULT_CONFIG = HistoryConfig()
+
+
+def keyframe_query(as_of: Optional[str] = None) -> str:
+    """Scalar subquery: the last keyframe, or the last at or before `as_of` (a SQL expression)."""
+    bound = f"AND SNAPSHOT_TS <= {as_of}" if as_of else ""
+    return f"""(
+        SELECT COALESCE(MAX(SNAPSHOT_TS), '1970-01-01'::TIMESTAMP_NTZ)
+        FROM {HISTORY_TABLE}
+        WHERE CHANGE_REASON = 'KEYFRAME' {bound}
+    )"""
+
+
+def state_query() -> str:
+    """Latest recorded row per flight, scanning back only to the last keyframe."""
+    return f"""
+        SELECT {', '.join(STATE_COLUMNS)}
+        FROM {HISTORY_TABLE}
+        WHERE SNAPSHOT_TS >= {keyframe_query()}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY FLIGHT_KEY ORDER BY SNAPSHOT_TS DESC) = 1
+    """
+
+
+def last_keyframe(session):
+    rows = session.sql(f"""
+        SELECT MAX(SNAPSHOT_TS) AS TS FROM {HISTORY_TABLE} WHERE CHANGE_REASON = 'KEYFRAME'
+    """).collect()
+    return rows[0]['TS'] if rows else None
+
+
+def _history_id(alias: str) -> str:
+    return f"{alias}.FLIGHT_KEY || '@' || TO_CHAR({alias}.SNAPSHOT_TS, 'YYYYMMDDHH24MISS')"
+
+
+def record(session, flight_risk: pd.DataFrame, config: HistoryConfig = DEFAULT_CONFIG) -> str:
+    """Append the change points of a composed FLIGHT_RISK frame, after it is merged; returns the kind of write."""
+    if flight_risk.empty:
+        return 'EMPTY'
+    snapshot_ts = pd.Timestamp(flight_risk['SNAPSHOT_TS'].iloc[0]).to_pydatetime()
+    staged = f'{DATABASE}.IROP_MART.FLIGHT_RISK_HISTORY_STAGE'
+    session.create_dataframe(flight_risk[STATE_COLUMNS + ['SNAPSHOT_TS']]) \
+        .write.mode('overwrite').save_as_table(staged, table_type='temporary')
+    # Composition draws fresh RISK_IDs each run and the MERGE keeps the originals; record the ones that join back.
+    session.sql(f"""
+        UPDATE {staged} s
+        SET RISK_ID = fr.RISK_ID
+        FROM {FLIGHT_RISK_TABLE} fr
+        WHERE fr.FLIGHT_KEY = s.FLIGHT_KEY
+    """).collect()
+    columns = 'HISTORY_ID, RISK_ID, FLIGHT_KEY, FLIGHT_DATE, SNAPSHOT_TS, ' + ', '.join(SCORE_COLUMNS) + ', CHANGE_REASON'
+
+    previous = last_keyframe(session)
+    if previous is None or snapshot_ts - previous >= config.keyframe_interval:
+        # Staged rows win over the carried-forward state. Only carried-forward flights past the horizon are
+        # dropped: a flight that is still composed stays, or the next delta would re-add it as NEW.
+        session.sql(f"""
+            INSERT INTO {HISTORY_TABLE} ({columns})
+            SELECT {_history_id('s')}, s.RISK_ID, s.FLIGHT_KEY, s.FLIGHT_DATE, s.SNAPSHOT_TS,
+                   {', '.join(f's.{c}' for c in SCORE_COLUMNS)}, 'KEYFRAME'
+            FROM (
+                SELECT {', '.join(STATE_COLUMNS)}, SNAPSHOT_TS, 0 AS PRIORITY FROM {staged}
+                UNION ALL
+                SELECT {', '.join(STATE_COLUMNS)}, (SELECT MAX(SNAPSHOT_TS) FROM {staged}), 1
+                FROM ({state_query()})
+            ) s
+            WHERE s.PRIORITY = 0 OR s.FLIGHT_DATE >= DATEADD(day, -{config.keyframe_horizon_days}, s.SNAPSHOT_TS::DATE)
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY s.FLIGHT_KEY ORDER BY s.PRIORITY) = 1
+        """).collect()
+        return 'KEYFRAME'
+
+    moved = ' OR '.join(f'ABS(s.{c} - p.{c}) > {config.tolerance} OR (s.{c} IS NULL) <> (p.{c} IS NULL)'
+                        for c in SCORE_COLUMNS)
+    session.sql(f"""
+        INSERT INTO {HISTORY_TABLE} ({columns})
+        SELECT {_history_id('s')}, s.RISK_ID, s.FLIGHT_KEY, s.FLIGHT_DATE, s.SNAPSHOT_TS,
+               {', '.join(f's.{c}' for c in SCORE_COLUMNS)},
+               IFF(p.FLIGHT_KEY IS NULL, 'NEW', 'CHANGED')
+        FROM {staged} s
+        LEFT JOIN ({state_query()}) p ON p.FLIGHT_KEY = s.FLIGHT_KEY
+        WHERE p.FLIGHT_KEY IS NULL OR {moved}
+    """).collect()
+    return 'DELTA'
+
+
+def stats(session, days: int = 14) -> pd.DataFrame:
+    """Rows written per day by kind; full snapshots would have cost SNAPSHOTS x FLIGHTS."""
+    return session.sql(f"""
+        SELECT SNAPSHOT_TS::DATE AS DAY,
+               COUNT(DISTINCT SNAPSHOT_TS) AS SNAPSHOTS,
+               COUNT_IF(CHANGE_REASON = 'KEYFRAME') AS KEYFRAME_ROWS,
+               COUNT_IF(CHANGE_REASON <> 'KEYFRAME') AS DELTA_ROWS,
+               COUNT(DISTINCT FLIGHT_KEY) AS FLIGHTS
+        FROM {HISTORY_TABLE}
+        WHERE SNAPSHOT_TS >= DATEADD(day, -{int(days)}, CURRENT_DATE)
+        GROUP BY 1
+        ORDER BY 1
+    """).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FLIGHT_RISK_HISTORY maintenance")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--stats', action='store_true', help="Show rows written per day")
+    parser.add_argument('--days', type=int, default=14)
+    args = parser.parse_args()
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    if args.stats:
+        print(stats(session, args.days).to_string(index=False))
+        return
+    print(f"Last keyframe: {last_keyframe(session)}")
+
+
+if __name__ == '__main__':
+    main()
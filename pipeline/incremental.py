@@ -0,0 +1,427 @@
+"""
+Incremental re-scoring driven by changes to the ATOMIC tables.
+
+Each cycle reads CHANGES(...) on the change-tracked ATOMIC tables between
+the last watermark in ML_PROCESSING.RESCORE_RUNS and now, then:
+
+1. expands the changed rows to every entity whose features depend on them
+   (flights at a station with new weather, duties flying a changed flight
+   or based at a changed station, PNRs with a leg on it, rotations whose
+   inbound leg moved);
+2. loads only the ATOMIC rows those entities need and rebuilds their
+   features with the same builders as the full run;
+3. scores them on the warm ScoringService, appends the feature rows to the
+   store and MERGEs predictions by entity key, deleting removed entities;
+4. recomposes FLIGHT_RISK for just the flights touched.
+
+The first cycle (no watermark yet), or one whose watermark has aged out of
+change-tracking retention, runs the full orchestrator instead.
+
+Usage:
+    python -m pipeline.incremental --connection demo [--interval 900]
+"""
+import argparse
+import json
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+import pandas as pd
+
+from pipeline import composition, scoring
+from pipeline.feature_store import FeatureStore
+from pipeline.features import FEATURE_SETS, Tables
+from pipeline.registry import RegistrySource
+from pipeline.serving import ScoringService
+from pipeline.weather import DEFAULT_WINDOW, WeatherWindow
+
+DATABASE = 'IROP_GNN_RISK'
+RUNS_TABLE = f'{DATABASE}.ML_PROCESSING.RESCORE_RUNS'
+
+TRACKED_KEYS = {
+    'FLIGHT_INSTANCE': ['FLIGHT_KEY'],
+    'AIRCRAFT_ROTATION': ['FLIGHT_KEY'],
+    'CREW_DUTY_PERIOD': ['DUTY_ID'],
+    'CREW_ASSIGNMENT': ['DUTY_ID', 'FLIGHT_KEY'],
+    'PNR_TRIP': ['TRIP_ID'],
+    'PNR_LEG': ['TRIP_ID', 'FLIGHT_KEY'],
+    'AIRPORT_CAPABILITY': ['STATION_CODE'],
+    'WEATHER_ATC': ['STATION_CODE', 'VALID_TIME_UTC'],
+}
+# Time travel data is not available / change tracking missing for the requested range.
+RETENTION_ERROR_CODES = {707}
+RETENTION_ERROR_TEXT = ('time travel data is not available', 'change tracking is not enabled or has been missing')
+
+
+def changes_query(table: str) -> str:
+    """Changed keys of one tracked table; binds the start and end timestamps."""
+    cols = ", ".join(TRACKED_KEYS[table])
+    return f"""
+        SELECT DISTINCT {cols}, METADATA$ACTION AS ACTION, METADATA$ISUPDATE AS IS_UPDATE
+        FROM {DATABASE}.ATOMIC.{table}
+        CHANGES(INFORMATION => DEFAULT)
+        AT(TIMESTAMP => ?::TIMESTAMP_TZ)
+        END(TIMESTAMP => ?::TIMESTAMP_TZ)
+    """
+
+
+def outside_retention(exc: Exception) -> bool:
+    """True for the error CHANGES raises when the watermark is older than change-tracking/time-travel retention."""
+    message = str(getattr(exc, 'message', exc)).lower()
+    return getattr(exc, 'sql_error_code', None) in RETENTION_ERROR_CODES \
+        or any(text in message for text in RETENTION_ERROR_TEXT)
+
+
+@dataclass
+class ChangeSet:
+    rows: Dict[str, pd.DataFrame]
+
+    def changed(self, table: str, column: str) -> Set[str]:
+        frame = self.rows.get(table)
+        return set() if frame is None else set(frame[column].dropna())
+
+    def deleted(self, table: str, column: str) -> Set[str]:
+        """Keys removed outright (not the DELETE half of an update, not re-inserted)."""
+        frame = self.rows.get(table)
+        if frame is None:
+            return set()
+        removed = frame.loc[(frame['ACTION'] == 'DELETE') & ~frame['IS_UPDATE'].astype(bool), column]
+        inserted = frame.loc[frame['ACTION'] == 'INSERT', column]
+        return set(removed) - set(inserted)
+
+    def counts(self) -> Dict[str, int]:
+        return {table: len(frame) for table, frame in self.rows.items()}
+
+
+def read_changes(session, since: datetime, until: datetime) -> ChangeSet:
+    bounds = [since.isoformat(), until.isoformat()]
+    jobs = {table: session.sql(changes_query(table), params=bounds).to_pandas(block=False) for table in TRACKED_KEYS}
+    return ChangeSet({table: job.result() for table, job in jobs.items()})
+
+
+@dataclass
+class Affected:
+    keys: Dict[str, Set[str]] = field(default_factory=dict)
+    deleted: Dict[str, Set[str]] = field(default_factory=dict)
+    flights: Set[str] = field(default_factory=set)
+
+    def counts(self) -> Dict[str, int]:
+        counts = {name: len(keys) for name, keys in self.keys.items()}
+        counts['FLIGHT_RISK'] = len(self.flights)
+        return counts
+
+
+def _isin(column: str, keys: Iterable[str]):
+    from snowflake.snowpark.functions import col, lit
+    keys = list(keys)
+    return col(column).isin(keys) if keys else lit(False)
+
+
+def _key_table(session, name: str, keys: Iterable[str]) -> str:
+    table = f'{DATABASE}.ML_PROCESSING.{name}'
+    session.create_dataframe(pd.DataFrame({'K': sorted(keys) or [None]})) \
+        .write.mode('overwrite').save_as_table(table, table_type='temporary')
+    return table
+
+
+def _column(session, query: str, column: str) -> Set[str]:
+    return {row[column] for row in session.sql(query).collect()}
+
+
+def expand(session, changes: ChangeSet, window: WeatherWindow = DEFAULT_WINDOW) -> Affected:
+    """Entities per feature set whose features read any changed row, plus the flights to recompose."""
+    atomic = f'{DATABASE}.ATOMIC'
+    flights = changes.changed('FLIGHT_INSTANCE', 'FLIGHT_KEY')
+    stations = changes.changed('AIRPORT_CAPABILITY', 'STATION_CODE')
+    weather = changes.rows.get('WEATHER_ATC', pd.DataFrame(columns=TRACKED_KEYS['WEATHER_ATC']))
+    rotations = changes.changed('AIRCRAFT_ROTATION', 'FLIGHT_KEY')
+
+    station_flights = set()
+    if stations:
+        station_tmp = _key_table(session, 'RESCORE_STATIONS', stations)
+        station_flights = _column(session, f"""
+            SELECT DISTINCT f.FLIGHT_KEY FROM {atomic}.FLIGHT_INSTANCE f
+            JOIN {station_tmp} s ON f.DEPARTURE_STATION = s.K
+        """, 'FLIGHT_KEY')
+
+    weather_flights = set()
+    if not weather.empty:
+        weather_tmp = f'{DATABASE}.ML_PROCESSING.RESCORE_WEATHER'
+        session.create_dataframe(weather[TRACKED_KEYS['WEATHER_ATC']].drop_duplicates()) \
+            .write.mode('overwrite').save_as_table(weather_tmp, table_type='temporary')
+        # An observation at v is inside a flight's window when t is in [v - after, v + before],
+        # and can be its as-of fallback when t is in [v, v + tolerance].
+        after = int(window.after.total_seconds())
+        reach = int(max(window.before, window.asof_tolerance).total_seconds())
+        weather_flights = _column(session, f"""
+            SELECT DISTINCT f.FLIGHT_KEY FROM {atomic}.FLIGHT_INSTANCE f
+            JOIN {weather_tmp} w
+              ON (f.DEPARTURE_STATION = w.STATION_CODE
+                  AND f.SCHED_DEP_UTC BETWEEN DATEADD(second, -{after}, w.VALID_TIME_UTC)
+                                          AND DATEADD(second, {reach}, w.VALID_TIME_UTC))
+              OR (f.ARRIVAL_STATION = w.STATION_CODE
+                  AND f.SCHED_ARR_UTC BETWEEN DATEADD(second, -{after}, w.VALID_TIME_UTC)
+                                          AND DATEADD(second, {reach}, w.VALID_TIME_UTC))
+        """, 'FLIGHT_KEY')
+
+    affected = Affected()
+    affected.keys['delay'] = flights | station_flights | weather_flights
+
+    moved = flights | station_flights
+    flight_tmp = _key_table(session, 'RESCORE_FLIGHTS', moved)
+    affected.keys['turn'] = rotations | (_column(session, f"""
+        SELECT DISTINCT r.FLIGHT_KEY FROM {atomic}.AIRCRAFT_ROTATION r
+        JOIN {flight_tmp} t ON r.FLIGHT_KEY = t.K OR r.PREV_FLIGHT_KEY = t.K
+    """, 'FLIGHT_KEY') if moved else set())
+    affected.keys['aog'] = set(rotations)
+
+    changed_flight_tmp = _key_table(session, 'RESCORE_CHANGED_FLIGHTS', flights)
+    affected.keys['crew'] = (
+        changes.changed('CREW_DUTY_PERIOD', 'DUTY_ID')
+        | changes.changed('CREW_ASSIGNMENT', 'DUTY_ID')
+        | (_column(session, f"""
+            SELECT DISTINCT a.DUTY_ID FROM {atomic}.CREW_ASSIGNMENT a
+            JOIN {changed_flight_tmp} t ON a.FLIGHT_KEY = t.K
+        """, 'DUTY_ID') if flights else set())
+        # FDP limits are set in the crew base's local time (pipeline.legality).
+        | (_column(session, f"""
+            SELECT DISTINCT d.DUTY_ID FROM {atomic}.CREW_DUTY_PERIOD d JOIN {station_tmp} s ON d.CREW_BASE = s.K
+        """, 'DUTY_ID') if stations else set())
+    )
+    # PNR features do not read FLIGHT_INSTANCE, but passengers on a changed flight are re-scored
+    # so their misconnect exposure in FLIGHT_RISK is refreshed with the flight.
+    affected.keys['pnr'] = changes.changed('PNR_TRIP', 'TRIP_ID') | (_column(session, f"""
+        SELECT DISTINCT l.TRIP_ID FROM {atomic}.PNR_LEG l JOIN {changed_flight_tmp} t ON l.FLIGHT_KEY = t.K
+    """, 'TRIP_ID') if flights else set())
+
+    affected.deleted = {
+        'delay': changes.deleted('FLIGHT_INSTANCE', 'FLIGHT_KEY'),
+        'turn': changes.deleted('AIRCRAFT_ROTATION', 'FLIGHT_KEY'),
+        'aog': changes.deleted('AIRCRAFT_ROTATION', 'FLIGHT_KEY'),
+        'crew': changes.deleted('CREW_DUTY_PERIOD', 'DUTY_ID'),
+        'pnr': changes.deleted('PNR_TRIP', 'TRIP_ID'),
+    }
+    for name, gone in affected.deleted.items():
+        affected.keys[name] -= gone
+
+    duty_tmp = _key_table(session, 'RESCORE_DUTIES', affected.keys['crew'])
+    trip_tmp = _key_table(session, 'RESCORE_TRIPS', affected.keys['pnr'])
+    affected.flights = (
+        affected.keys['delay'] | affected.keys['turn'] | affected.keys['aog']
+        | (_column(session, f"""
+            SELECT DISTINCT a.FLIGHT_KEY FROM {atomic}.CREW_ASSIGNMENT a JOIN {duty_tmp} d ON a.DUTY_ID = d.K
+        """, 'FLIGHT_KEY') if affected.keys['crew'] else set())
+        | (_column(session, f"""
+            SELECT DISTINCT l.FLIGHT_KEY FROM {atomic}.PNR_LEG l JOIN {trip_tmp} t ON l.TRIP_ID = t.K
+        """, 'FLIGHT_KEY') if affected.keys['pnr'] else set())
+        # Legs added to or dropped from an itinerary move pax exposure on both old and new flights.
+        | changes.changed('PNR_LEG', 'FLIGHT_KEY')
+    )
+    # A new delay prediction moves the ETD of every connection onto the flight, so its feeders'
+    # misconnect exposure is recomposed too.
+    if affected.keys['delay']:
+        delay_tmp = _key_table(session, 'RESCORE_DELAY_FLIGHTS', affected.keys['delay'])
+        affected.flights |= _column(session, f"""
+            SELECT DISTINCT l.FLIGHT_KEY FROM {atomic}.PNR_LEG l JOIN {delay_tmp} t ON l.OUTBOUND_FLIGHT_KEY = t.K
+        """, 'FLIGHT_KEY')
+    affected.flights -= affected.deleted['delay']
+    return affected
+
+
+def load_slices(session, affected: Affected, window: WeatherWindow = DEFAULT_WINDOW) -> Tables:
+    """The ATOMIC rows needed to rebuild the affected features and recompose their flights."""
+    from snowflake.snowpark.functions import col, lit
+
+    def table(name):
+        return session.table(f'{DATABASE}.ATOMIC.{name}')
+
+    flights = affected.flights | affected.keys['delay'] | affected.keys['turn'] | affected.keys['aog']
+    rotations = table('AIRCRAFT_ROTATION').filter(_isin('FLIGHT_KEY', flights)).to_pandas(block=False)
+    assignments = table('CREW_ASSIGNMENT').filter(
+        _isin('DUTY_ID', affected.keys['crew']) | _isin('FLIGHT_KEY', affected.flights)
+    ).to_pandas(block=False)
+    # Every trip on a recomposed flight is needed for its misconnect exposure, not just re-scored ones.
+    flight_tmp = _key_table(session, 'RESCORE_RISK_FLIGHTS', affected.flights)
+    trip_tmp = _key_table(session, 'RESCORE_TRIPS', affected.keys['pnr'])
+    trips = f"""
+        SELECT K AS TRIP_ID FROM {trip_tmp}
+        UNION
+        SELECT l.TRIP_ID FROM {DATABASE}.ATOMIC.PNR_LEG l JOIN {flight_tmp} f ON l.FLIGHT_KEY = f.K
+    """
+    pnrs = session.sql(f"SELECT * FROM {DATABASE}.ATOMIC.PNR_TRIP WHERE TRIP_ID IN ({trips})").to_pandas(block=False)
+    legs = session.sql(f"SELECT * FROM {DATABASE}.ATOMIC.PNR_LEG WHERE TRIP_ID IN ({trips})").to_pandas(block=False)
+    airports = table('AIRPORT_CAPABILITY').to_pandas(block=False)
+
+    t: Tables = {'AIRCRAFT_ROTATION': rotations.result(), 'CREW_ASSIGNMENT': assignments.result(),
+                 'PNR_LEG': legs.result()}
+    flights |= set(t['AIRCRAFT_ROTATION']['PREV_FLIGHT_KEY'].dropna()) | set(t['CREW_ASSIGNMENT']['FLIGHT_KEY'])
+    # Both ends of every connection, for connect times in the misconnect engine.
+    flights |= set(t['PNR_LEG']['FLIGHT_KEY'])
+    duties = affected.keys['crew'] | set(t['CREW_ASSIGNMENT']['DUTY_ID'])
+    fi = table('FLIGHT_INSTANCE').filter(_isin('FLIGHT_KEY', flights)).to_pandas(block=False)
+    crew = table('CREW_DUTY_PERIOD').filter(_isin('DUTY_ID', duties)).to_pandas(block=False)
+    t.update(FLIGHT_INSTANCE=fi.result(), CREW_DUTY_PERIOD=crew.result(), PNR_TRIP=pnrs.result(),
+             AIRPORT_CAPABILITY=airports.result())
+
+    weather = table('WEATHER_ATC').filter(lit(False))
+    if not t['FLIGHT_INSTANCE'].empty:
+        stations = set(t['FLIGHT_INSTANCE']['DEPARTURE_STATION']) | set(t['FLIGHT_INSTANCE']['ARRIVAL_STATION'])
+        start = pd.to_datetime(t['FLIGHT_INSTANCE']['SCHED_DEP_UTC']).min() - max(window.before, window.asof_tolerance)
+        end = pd.to_datetime(t['FLIGHT_INSTANCE']['SCHED_ARR_UTC']).max() + window.after
+        weather = table('WEATHER_ATC').filter(
+            _isin('STATION_CODE', stations)
+            & (col('VALID_TIME_UTC') >= lit(start.to_pydatetime()))
+            & (col('VALID_TIME_UTC') <= lit(end.to_pydatetime()))
+        )
+    t['WEATHER_ATC'] = weather.to_pandas()
+    return t
+
+
+def _stored_predictions(session, spec: scoring.ModelSpec, column: str, keys: Iterable[str]) -> pd.DataFrame:
+    return session.table(f'{DATABASE}.ML_PROCESSING.{spec.output_table}').filter(_isin(column, keys)).to_pandas()
+
+
+def _delete(session, table: str, column: str, keys: Set[str]):
+    if keys:
+        deleted = _key_table(session, 'RESCORE_DELETED', keys)
+        session.sql(f"DELETE FROM {table} WHERE {column} IN (SELECT K FROM {deleted})").collect()
+
+
+@dataclass
+class RescoreReport:
+    mode: str
+    watermark: datetime
+    changed: Dict[str, int] = field(default_factory=dict)
+    rescored: Dict[str, int] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+
+def last_watermark(session) -> Optional[datetime]:
+    rows = session.sql(f"SELECT MAX(WATERMARK_TS) AS TS FROM {RUNS_TABLE}").collect()
+    return rows[0]['TS'] if rows else None
+
+
+def record_run(session, report: RescoreReport):
+    session.sql(f"""
+        INSERT INTO {RUNS_TABLE} (RUN_ID, MODE, WATERMARK_TS, CHANGED_ENTITIES, RESCORED_ENTITIES, ELAPSED_MS)
+        SELECT ?, ?, ?::TIMESTAMP_TZ, PARSE_JSON(?), PARSE_JSON(?), ?
+    """, params=[str(uuid.uuid4()), report.mode, report.watermark.isoformat(), json.dumps(report.changed),
+                 json.dumps(report.rescored), report.elapsed_ms]).collect()
+
+
+def rescore(session, service: ScoringService, since: datetime, until: datetime) -> RescoreReport:
+    """Re-score only what changed between `since` and `until`."""
+    start = time.perf_counter()
+    snapshot_ts = datetime.utcnow()
+    report = RescoreReport('INCREMENTAL', until)
+    changes = read_changes(session, since, until)
+    report.changed = changes.counts()
+    affected = expand(session, changes)
+    report.rescored = affected.counts()
+    if not any(affected.keys.values()) and not any(affected.deleted.values()):
+        report.elapsed_ms = (time.perf_counter() - start) * 1000
+        return report
+
+    tables = load_slices(session, affected)
+    store = FeatureStore(session)
+    fresh = {}
+    for spec in scoring.MODEL_SPECS:
+        fs = FEATURE_SETS[spec.feature_set]
+        keys, gone = affected.keys[spec.feature_set], affected.deleted[spec.feature_set]
+        rows = fs.builder(tables)
+        rows = rows[rows[fs.key_col].isin(keys)].reset_index(drop=True)
+        store.write_rows(spec.feature_set, rows, sorted(gone), snapshot_ts)
+        scored = service.score(spec.name, rows, with_shap=True)
+        drivers = scored[[fs.key_col, 'FEATURE_IMPORTANCE']] if 'FEATURE_IMPORTANCE' in scored else None
+        fresh[spec.name] = scoring.prediction_frame(spec, rows, scored['SCORE'].to_numpy(), snapshot_ts, drivers)
+        if not fresh[spec.name].empty:
+            scoring.merge_predictions(session, spec, fresh[spec.name])
+        _delete(session, f'{DATABASE}.ML_PROCESSING.{spec.output_table}', fs.key_col, gone)
+
+    # FLIGHT_RISK for the touched flights reads every model's current prediction for them, plus
+    # the delay prediction of each flight they connect with.
+    loaded = set(tables['FLIGHT_INSTANCE']['FLIGHT_KEY'])
+    lookups = {
+        'delay': ('FLIGHT_KEY', loaded), 'turn': ('FLIGHT_KEY', affected.flights),
+        'aog': ('FLIGHT_KEY', affected.flights),
+        'crew': ('DUTY_ID', set(tables['CREW_ASSIGNMENT']['DUTY_ID'])),
+        'pnr': ('TRIP_ID', set(tables['PNR_TRIP']['TRIP_ID'])),
+    }
+    predictions = {}
+    for spec in scoring.MODEL_SPECS:
+        column, keys = lookups[spec.feature_set]
+        stored = _stored_predictions(session, spec, column, keys)
+        current = fresh[spec.name]
+        predictions[spec.name] = pd.concat(
+            [current, stored[~stored[column].isin(current[column])]], ignore_index=True
+        )
+    criticality = composition.criticality_frame(session).filter(_isin('FLIGHT_KEY', affected.flights)).to_pandas()
+    flight_risk = composition.compose(tables, predictions, criticality, snapshot_ts)
+    flight_risk = flight_risk[flight_risk['FLIGHT_KEY'].isin(affected.flights)].reset_index(drop=True)
+    if not flight_risk.empty:
+        composition.write(session, flight_risk)
+    _delete(session, f'{DATABASE}.IROP_MART.FLIGHT_RISK', 'FLIGHT_KEY', affected.deleted['delay'])
+
+    report.elapsed_ms = (time.perf_counter() - start) * 1000
+    return report
+
+
+def cycle(session, service: Optional[ScoringService] = None, full: bool = False) -> RescoreReport:
+    """One refresh: incremental from the last watermark, or a full run when there is none."""
+    until = session.sql("SELECT CURRENT_TIMESTAMP() AS TS").collect()[0]['TS']
+    since = None if full else last_watermark(session)
+    report = None
+    if since is not None:
+        service = service or ScoringService(RegistrySource(session)).warm()
+        from snowflake.snowpark.exceptions import SnowparkSQLException
+        try:
+            report = rescore(session, service, since, until)
+        except SnowparkSQLException as exc:
+            if not outside_retention(exc):
+                raise
+            print(f"Watermark {since} is outside change-tracking retention; running full scoring")
+    if report is None:
+        start = time.perf_counter()
+        full_report = scoring.run(session)
+        report = RescoreReport('FULL', until, rescored=full_report.rows,
+                               elapsed_ms=(time.perf_counter() - start) * 1000)
+    record_run(session, report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score entities changed since the last run")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--full', action='store_true', help="Ignore the watermark and re-score everything")
+    parser.add_argument('--interval', type=int, default=0, help="Repeat every N seconds (0 = run once)")
+    args = parser.parse_args()
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    session.use_database(DATABASE)
+    service = ScoringService(RegistrySource(session)).warm()
+    full = args.full
+    while True:
+        try:
+            report = cycle(session, service, full=full)
+        except Exception:
+            if not args.interval:
+                raise
+            # Keep the refresh loop alive; the next cycle retries from the same watermark.
+            traceback.print_exc()
+            time.sleep(args.interval)
+            continue
+        print(f"{report.mode} up to {report.watermark}: {report.elapsed_ms:.0f} ms "
+              f"changed={json.dumps(report.changed)} rescored={json.dumps(report.rescored)}")
+        if not args.interval:
+            break
+        full = False
+        service.refresh()
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+"""
+FAR Part 117 crew legality projected from expected delays.
+
+For every duty in CREW_DUTY_PERIOD the engine walks its legs in
+CREW_ASSIGNMENT.LEG_SEQUENCE_IN_DUTY order. A leg leaves at the later of its
+own expected departure and the previous leg's arrival plus the crew connect
+time:
+
+    x[k] = max(a[k], x[k-1] + c[k])
+
+where a[k] is the scheduled departure plus the expected delay and c[k] is
+the previous leg's block time plus the connect time. With C the running
+sum of c inside the duty, that is x[k] = C[k] + cummax(a - C)[k]. It is
+evaluated for every duty at once as one segmented cumulative max. The
+projected FDP ends at the last leg's block-in. From that:
+
+- LEGAL_FDP_LIMIT_MINUTES: Table B (unaugmented) or Table C (augmented) by
+  the report hour in crew-base local time and the number of segments.
+  Unacclimated crews (TIME_ZONE_SPAN_HOURS over `acclimation_span_hours`)
+  lose 30 minutes (117.13(b)).
+- PROJECTED_FDP_REMAINING_MINUTES: the limit minus the projected FDP.
+  Between -`extension_minutes` and 0 the duty needs a 117.19 extension.
+- AUGMENTED_FDP_LIMIT_MINUTES: the Table C limit. For an unaugmented duty
+  this shows whether adding a relief pilot would absorb the overrun.
+- Rest: 30 consecutive hours in the last 168 (117.25(b)), and at least
+  `min_rest_minutes` between the projected release and the next report in
+  the same pairing (117.25(e)).
+
+LegalityEngine keeps the leg arrays in memory. update() re-projects only the
+duties flying flights whose ETD or ETA moved.
+
+Usage:
+    python -m pipeline.legality --connection demo
+    python -m pipeline.legality --benchmark [--duties 100000]
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.downline import DEFAULT_CONFIG as DOWNLINE_CONFIG
+from pipeline.features import Tables, load_tables
+from pipeline.misconnect import _minutes, expected_delays
+
+DATABASE = 'IROP_GNN_RISK'
+SOURCES = ['FLIGHT_INSTANCE', 'CREW_DUTY_PERIOD', 'CREW_ASSIGNMENT', 'AIRPORT_CAPABILITY']
+RESULT_TABLE = 'ML_PROCESSING.CREW_LEGALITY'
+
+# 14 CFR 117 Table B: unaugmented FDP hours by report hour (acclimated) and 1..7+ segments.
+TABLE_B = [
+    (0, [9, 9, 9, 9, 9, 9, 9]),
+    (4, [10, 10, 10, 10, 9, 9, 9]),
+    (5, [12, 12, 12, 12, 11.5, 11, 10.5]),
+    (6, [13, 13, 12, 12, 11.5, 11, 10.5]),
+    (7, [14, 14, 13, 13, 12.5, 12, 11.5]),
+    (12, [13, 13, 13, 13, 12.5, 12, 11.5]),
+    (13, [12, 12, 12, 12, 11.5, 11, 10.5]),
+    (17, [12, 12, 11, 11, 10, 9, 9]),
+    (22, [11, 11, 10, 10, 9, 9, 9]),
+    (23, [10, 10, 10, 9, 9, 9, 9]),
+]
+# Table C: augmented FDP hours by report hour for rest facility class 1..3, with 3 and with 4 pilots.
+TABLE_C = [
+    (0, [15, 14, 13], [17, 16, 15]),
+    (6, [16, 15, 14], [18.5, 17.5, 16]),
+    (7, [17, 16.5, 15], [19, 18, 16.5]),
+    (13, [16, 15, 14], [18.5, 17.5, 16]),
+    (17, [15, 14, 13], [17, 16, 15]),
+]
+
+
+def _by_hour(bands) -> np.ndarray:
+    """Expand (start hour, values) bands into a 24-row lookup in minutes."""
+    starts = np.array([band[0] for band in bands])
+    values = np.array([np.concatenate(band[1:]) for band in bands], dtype=np.float64) * 60
+    return values[np.searchsorted(starts, np.arange(24), side='right') - 1]
+
+
+UNAUGMENTED_MINUTES = _by_hour(TABLE_B)
+AUGMENTED_MINUTES = _by_hour(TABLE_C)
+
+
+@dataclass(frozen=True)
+class LegalityConfig:
+    crew_connect_minutes: float = DOWNLINE_CONFIG.min_crew_connect_minutes
+    post_flight_minutes: float = 30.0
+    min_rest_minutes: float = 600.0
+    weekly_rest_minutes: float = 1800.0
+    extension_minutes: float = 120.0
+    unacclimated_reduction_minutes: float = 30.0
+    acclimation_span_hours: float = 3.0
+    rest_facility_class: int = 1
+    augmented_pilots: int = 3
+    timeout_buffer_minutes: float = 60.0
+
+
+DEFAULT_CONFIG = LegalityConfig()
+
+
+def fdp_limits(duties: pd.DataFrame, airports: pd.DataFrame, segments: Optional[np.ndarray] = None,
+               config: LegalityConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    """LEGAL_ and AUGMENTED_FDP_LIMIT_MINUTES per duty from Tables B and C."""
+    offset = airports.set_index('STATION_CODE')['TIMEZONE_OFFSET_UTC'].reindex(duties['CREW_BASE']).fillna(0)
+    local = _minutes(duties['REPORT_TIME_UTC']) + offset.to_numpy(dtype=np.float64) * 60
+    hour = (np.floor(local / 60) % 24).astype(np.int64)
+    if segments is None:
+        segments = duties['NUM_SEGMENTS'].fillna(1).to_numpy()
+    column = np.clip(np.asarray(segments, dtype=np.int64), 1, 7) - 1
+    unaugmented = UNAUGMENTED_MINUTES[hour, column]
+    augmented = AUGMENTED_MINUTES[hour, 3 * (config.augmented_pilots - 3) + config.rest_facility_class - 1]
+    reduction = np.where(duties['TIME_ZONE_SPAN_HOURS'].fillna(0).to_numpy() > config.acclimation_span_hours,
+                         config.unacclimated_reduction_minutes, 0.0)
+    is_augmented = duties['AUGMENTED_CREW_FLAG'].fillna(False).astype(bool).to_numpy()
+    return pd.DataFrame({
+        'LEGAL_FDP_LIMIT_MINUTES': np.where(is_augmented, augmented, unaugmented) - reduction,
+        'AUGMENTED_FDP_LIMIT_MINUTES': augmented - reduction,
+    }, index=pd.Index(duties['DUTY_ID']))
+
+
+class LegalityEngine:
+    """Leg arrays grouped by duty plus projected FDP state per duty."""
+
+    def __init__(self, duties: pd.DataFrame, assignments: pd.DataFrame, flights: pd.DataFrame,
+                 airports: pd.DataFrame, delays: Optional[pd.DataFrame] = None,
+                 config: LegalityConfig = DEFAULT_CONFIG):
+        self.config = config
+        self.duties = pd.Index(duties['DUTY_ID'])
+        self.keys = pd.Index(flights['FLIGHT_KEY'])
+        delays = (delays if delays is not None else expected_delays(flights)).reindex(self.keys).fillna(0)
+        self.dep_delay = delays['DEP_DELAY'].to_numpy(dtype=np.float64).copy()
+        self.arr_delay = delays['ARR_DELAY'].to_numpy(dtype=np.float64).copy()
+        sched_dep, sched_arr = _minutes(flights['SCHED_DEP_UTC']), _minutes(flights['SCHED_ARR_UTC'])
+
+        # One leg per (duty, flight), whatever the number of roles, contiguous by duty in sequence order.
+        a = assignments.drop_duplicates(['DUTY_ID', 'FLIGHT_KEY'])
+        duty, flight = self.duties.get_indexer(a['DUTY_ID']), self.keys.get_indexer(a['FLIGHT_KEY'])
+        known = (duty >= 0) & (flight >= 0)
+        duty, flight = duty[known], flight[known]
+        sequence = a['LEG_SEQUENCE_IN_DUTY'].to_numpy()[known] if 'LEG_SEQUENCE_IN_DUTY' in a else np.zeros(len(duty))
+        order = np.lexsort((sched_dep[flight], sequence, duty))
+        self.leg_duty, self.leg_flight = duty[order], flight[order]
+        self.sched_dep = sched_dep[self.leg_flight]
+        self.block = sched_arr[self.leg_flight] - self.sched_dep
+        counts = np.bincount(self.leg_duty, minlength=len(self.duties))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        # Legs grouped by flight, so update() finds the duties a flight is on without a scan.
+        self._touching = np.argsort(self.leg_flight, kind='stable')
+        self._flight_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.leg_flight, minlength=len(self.keys)))])
+
+        # Table B is by scheduled segments; a partial leg list (one hub bank) must not loosen it.
+        segments = np.maximum(counts, duties['NUM_SEGMENTS'].fillna(1).to_numpy())
+        limits = fdp_limits(duties, airports, segments, config)
+        self.limit = limits['LEGAL_FDP_LIMIT_MINUTES'].to_numpy()
+        self.augmented_limit = limits['AUGMENTED_FDP_LIMIT_MINUTES'].to_numpy()
+        self.is_augmented = duties['AUGMENTED_CREW_FLAG'].fillna(False).astype(bool).to_numpy()
+        self.report = _minutes(duties['REPORT_TIME_UTC'])
+        # A duty with no known legs keeps its scheduled FDP end.
+        self.scheduled_end = _minutes(duties['SCHEDULED_RELEASE_TIME_UTC']) - config.post_flight_minutes
+        self.weekly_rest_ok = ~(duties['REST_IN_LAST_168_HOURS_MINUTES'].to_numpy(dtype=np.float64)
+                                < config.weekly_rest_minutes)
+
+        # Next report in the same pairing bounds the rest after this duty.
+        by_pairing = duties.assign(_POS=np.arange(len(duties)), _REPORT=self.report) \
+            .sort_values(['PAIRING_ID', '_REPORT'])
+        following = by_pairing.groupby('PAIRING_ID')['_REPORT'].shift(-1)
+        self.next_report = np.full(len(duties), np.nan)
+        self.next_report[by_pairing['_POS'].to_numpy()] = following.to_numpy(dtype=np.float64)
+
+        self.fdp_end = self.scheduled_end.copy()
+        self._project(np.arange(len(self.duties)))
+
+    def _project(self, duty_pos: np.ndarray):
+        """Re-project FDP end for the given duties: one segmented max-plus scan over their legs."""
+        duty_pos = duty_pos[self._offsets[duty_pos + 1] > self._offsets[duty_pos]]
+        if not len(duty_pos):
+            return
+        if len(duty_pos) == len(self.duties):
+            legs = np.arange(len(self.leg_duty))
+        else:
+            legs = np.concatenate([np.arange(self._offsets[d], self._offsets[d + 1]) for d in duty_pos])
+        duty, flight = self.leg_duty[legs], self.leg_flight[legs]
+        first = np.r_[True, duty[1:] != duty[:-1]]
+        starts = np.flatnonzero(first)
+        group = np.cumsum(first) - 1
+
+        ready = self.sched_dep[legs] + self.dep_delay[flight]
+        block = np.maximum(self.block[legs] + self.arr_delay[flight] - self.dep_delay[flight], 0)
+        step = np.where(first, 0.0, np.r_[0.0, block[:-1]] + self.config.crew_connect_minutes)
+        total = np.cumsum(step)
+        total -= total[starts][group]
+        # Segmented cumulative max: lift each duty above the previous one so the running max resets.
+        value = ready - total
+        base = value.min()
+        lift = group * (value.max() - base + 1.0)
+        departure = total + base + np.maximum.accumulate(value - base + lift) - lift
+        arrival = departure + block
+        self.fdp_end[duty[starts]] = np.maximum.reduceat(arrival, starts)
+
+    def update(self, dep_delay: Optional[Mapping[str, float]] = None,
+               arr_delay: Optional[Mapping[str, float]] = None) -> pd.DataFrame:
+        """Apply new expected delays (minutes, keyed by FLIGHT_KEY); returns per_duty() rows for duties on them."""
+        moved = []
+        for values, target in ((dep_delay, self.dep_delay), (arr_delay, self.arr_delay)):
+            if values is None:
+                continue
+            values = pd.Series(values, dtype=np.float64)
+            pos = self.keys.get_indexer(values.index)
+            target[pos[pos >= 0]] = values.to_numpy()[pos >= 0]
+            moved.append(pos[pos >= 0])
+        flights = np.unique(np.concatenate(moved)) if moved else np.empty(0, dtype=np.int64)
+        legs = np.concatenate([self._touching[self._flight_offsets[f]:self._flight_offsets[f + 1]] for f in flights]
+                              or [np.empty(0, dtype=np.int64)])
+        duty_pos = np.unique(self.leg_duty[legs])
+        self._project(duty_pos)
+        return self.per_duty(duty_pos)
+
+    def per_duty(self, positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Projected FDP, limits, margin and rest compliance for each duty."""
+        positions = np.arange(len(self.duties)) if positions is None else positions
+        config = self.config
+        fdp = self.fdp_end[positions] - self.report[positions]
+        limit = self.limit[positions]
+        remaining = limit - fdp
+        rest_after = self.next_report[positions] - (self.fdp_end[positions] + config.post_flight_minutes)
+        rest_ok = self.weekly_rest_ok[positions] & ~(rest_after < config.min_rest_minutes)
+        augmentable = ~self.is_augmented[positions] & (fdp <= self.augmented_limit[positions])
+        return pd.DataFrame({
+            'DUTY_ID': self.duties[positions],
+            'PROJECTED_FDP_END_UTC': (self.fdp_end[positions] * 60).astype('datetime64[s]'),
+            'PROJECTED_FDP_MINUTES': fdp.round(1),
+            'LEGAL_FDP_LIMIT_MINUTES': limit,
+            'AUGMENTED_FDP_LIMIT_MINUTES': self.augmented_limit[positions],
+            'PROJECTED_FDP_REMAINING_MINUTES': remaining.round(1),
+            'REST_AFTER_MINUTES': rest_after.round(1),
+            'REST_COMPLIANT_FLAG': rest_ok,
+            'EXTENSION_REQUIRED_FLAG': (remaining < 0) & (remaining >= -config.extension_minutes),
+            'AUGMENTATION_RESOLVES_FLAG': (remaining < 0) & augmentable,
+            'TIMEOUT_RISK_FLAG': (remaining < config.timeout_buffer_minutes) | ~rest_ok,
+            'LEGAL_FLAG': (remaining >= 0) & rest_ok,
+        })
+
+
+def evaluate(t: Tables, delays: Optional[pd.DataFrame] = None, config: LegalityConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    return LegalityEngine(t['CREW_DUTY_PERIOD'], t['CREW_ASSIGNMENT'], t['FLIGHT_INSTANCE'],
+                          t['AIRPORT_CAPABILITY'], delays, config).per_duty()
+
+
+def persist(session, legality: pd.DataFrame, snapshot_ts: datetime):
+    """MERGE the projection into ML_PROCESSING.CREW_LEGALITY by DUTY_ID."""
+    staged = f'{DATABASE}.ML_PROCESSING.CREW_LEGALITY_STAGE'
+    session.create_dataframe(legality.assign(SNAPSHOT_TS=snapshot_ts)) \
+        .write.mode('overwrite').save_as_table(staged, table_type='temporary')
+    columns = list(legality.columns) + ['SNAPSHOT_TS']
+    session.sql(f"""
+        MERGE INTO {DATABASE}.{RESULT_TABLE} tgt
+        USING {staged} src ON tgt.DUTY_ID = src.DUTY_ID
+        WHEN MATCHED THEN UPDATE SET {', '.join(f'{c} = src.{c}' for c in columns if c != 'DUTY_ID')}
+        WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f'src.{c}' for c in columns)})
+    """).collect()
+
+
+def run(session, config: LegalityConfig = DEFAULT_CONFIG, write: bool = True) -> pd.DataFrame:
+    """Project every duty from ATOMIC and the latest delay predictions."""
+    predictions = session.table(f'{DATABASE}.ML_PROCESSING.DELAY_PREDICTIONS') \
+        .select('FLIGHT_KEY', 'PREDICTED_DELAY_MINUTES', 'SNAPSHOT_TS').to_pandas(block=False)
+    t = load_tables(session, SOURCES)
+    delays = expected_delays(t['FLIGHT_INSTANCE'], predictions.result().sort_values('SNAPSHOT_TS'))
+    legality = evaluate(t, delays, config)
+    if write:
+        persist(session, legality, datetime.utcnow())
+    return legality
+
+
+def _synthetic(n_duties: int, legs_per_duty: int = 4, seed: int = 0) -> Tables:
+    """Duties of `legs_per_duty` legs out of four bases, two duties per pairing."""
+    rng = np.random.default_rng(seed)
+    bases = np.array(['ATL', 'JFK', 'DTW', 'LAX'])
+    report = np.datetime64('2026-01-01T11:00:00') \
+        + (np.arange(n_duties) % 2 * 1440 + rng.integers(0, 180, n_duties)).astype('timedelta64[m]')
+    n = n_duties * legs_per_duty
+    duty = np.repeat(np.arange(n_duties), legs_per_duty)
+    block = rng.integers(45, 120, n)
+    ground = rng.integers(35, 60, n)
+    # Legs chain from the report time: first departure an hour later, then block + ground each.
+    cycle = (block + ground).reshape(n_duties, legs_per_duty)
+    offset = np.cumsum(cycle, axis=1) - cycle + 60
+    dep = np.repeat(report, legs_per_duty) + offset.ravel().astype('timedelta64[m]')
+    keys = np.array([f'F{i}' for i in range(n)], dtype=object)
+    flights = pd.DataFrame({
+        'FLIGHT_KEY': keys, 'SCHED_DEP_UTC': dep, 'SCHED_ARR_UTC': dep + block.astype('timedelta64[m]'),
+        'CURRENT_DELAY_DEPARTURE': rng.choice([0, 0, 0, 15, 45, 90], n), 'CURRENT_DELAY_ARRIVAL': 0,
+    })
+    assignments = pd.DataFrame({'FLIGHT_KEY': keys, 'DUTY_ID': duty,
+                                'LEG_SEQUENCE_IN_DUTY': np.tile(np.arange(1, legs_per_duty + 1), n_duties)})
+    duties = pd.DataFrame({
+        'DUTY_ID': np.arange(n_duties), 'PAIRING_ID': np.arange(n_duties) // 2,
+        'CREW_BASE': rng.choice(bases, n_duties), 'REPORT_TIME_UTC': report,
+        'SCHEDULED_RELEASE_TIME_UTC': report + np.timedelta64(600, 'm'), 'NUM_SEGMENTS': legs_per_duty,
+        'AUGMENTED_CREW_FLAG': rng.random(n_duties) < 0.1, 'TIME_ZONE_SPAN_HOURS': rng.choice([0, 0, 0, 4], n_duties),
+        'REST_IN_LAST_168_HOURS_MINUTES': rng.integers(1700, 4200, n_duties),
+    })
+    airports = pd.DataFrame({'STATION_CODE': bases, 'TIMEZONE_OFFSET_UTC': [-5, -5, -5, -8]})
+    return {'FLIGHT_INSTANCE': flights, 'CREW_ASSIGNMENT': assignments, 'CREW_DUTY_PERIOD': duties,
+            'AIRPORT_CAPABILITY': airports}
+
+
+def benchmark(n_duties: int = 100_000, updates: int = 200) -> pd.DataFrame:
+    """Full projection time at growing sizes and the median latency of a one-leg ETA update."""
+    rows = []
+    for scale in (0.01, 0.1, 1.0):
+        n = max(int(n_duties * scale), 10)
+        t = _synthetic(n)
+        start = time.perf_counter()
+        engine = LegalityEngine(t['CREW_DUTY_PERIOD'], t['CREW_ASSIGNMENT'], t['FLIGHT_INSTANCE'],
+                                t['AIRPORT_CAPABILITY'])
+        result = engine.per_duty()
+        built = time.perf_counter() - start
+
+        rng = np.random.default_rng(1)
+        timings = []
+        for pos in rng.integers(0, len(engine.keys), updates):
+            start = time.perf_counter()
+            engine.update(dep_delay={engine.keys[pos]: float(rng.integers(0, 180))})
+            timings.append((time.perf_counter() - start) * 1000)
+        rows.append({'DUTIES': n, 'LEGS': len(engine.leg_duty), 'FULL_S': round(built, 3),
+                     'UPDATE_P50_MS': round(float(np.median(timings)), 3),
+                     'ILLEGAL_PCT': round(100 * float((~result['LEGAL_FLAG']).mean()), 1)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Project FAR 117 crew legality for every duty")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--benchmark', action='store_true', help="Time the engine on synthetic duties")
+    parser.add_argument('--duties', type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark(args.duties).to_string(index=False))
+        return
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    legality = run(session)
+    print(f"Crew legality written for {len(legality)} duties "
+          f"({int((~legality['LEGAL_FLAG']).sum())} projected illegal)")
+    print(legality.sort_values('PROJECTED_FDP_REMAINING_MINUTES').head(10).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Per-connection misconnect risk from real connect times and station MCT.
+
+Every PNR_LEG row with an outbound flight is one connection at the inbound
+flight's arrival station. Its expected connect time is the outbound ETD
+minus the inbound ETA (schedule plus expected delay). Both delays are
+treated as normal with a spread that grows with the expected delay, so a
+connection misconnects with probability
+
+    Phi((MCT - expected connect) / sqrt(sd_in^2 + sd_out^2))
+
+where MCT is the station's dom/intl minimum connect time for the pair.
+All connections are evaluated as arrays in one pass and summed per inbound
+flight ("pax connecting off this flight"). MisconnectEngine keeps those
+arrays in memory, so update() re-evaluates only the connections touching
+flights whose ETA or ETD moved.
+
+Benchmark:
+    python -m pipeline.misconnect [--flights 50000] [--legs 2000000]
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+MCT_DEFAULTS = {'MCT_DOM_DOM_MINUTES': 45, 'MCT_DOM_INTL_MINUTES': 90, 'MCT_INTL_DOM_MINUTES': 90}
+REACCOM_COST_USD = {'DOM': 250.0, 'INTL': 900.0}
+
+
+@dataclass(frozen=True)
+class DelayDistribution:
+    """Delay ~ Normal(mean, sd) with sd = sqrt(floor^2 + (cv * mean)^2)."""
+    floor_minutes: float = 12.0
+    cv: float = 0.5
+
+    def variance(self, mean: np.ndarray) -> np.ndarray:
+        return self.floor_minutes ** 2 + (self.cv * np.maximum(mean, 0)) ** 2
+
+
+DEFAULT_DISTRIBUTION = DelayDistribution()
+
+
+def _minutes(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[s]').astype(np.int64) / 60.0
+
+
+def expected_delays(flights: pd.DataFrame, predicted: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Expected DEP_DELAY / ARR_DELAY minutes per FLIGHT_KEY: the current delay or the model's, whichever is larger."""
+    f = flights.set_index('FLIGHT_KEY')
+    dep = f['CURRENT_DELAY_DEPARTURE'].astype(float).fillna(0)
+    arr = f['CURRENT_DELAY_ARRIVAL'].astype(float).fillna(0)
+    if predicted is not None and not predicted.empty:
+        model = predicted.drop_duplicates('FLIGHT_KEY', keep='last').set_index('FLIGHT_KEY')
+        model = model['PREDICTED_DELAY_MINUTES'].reindex(f.index).fillna(0).clip(lower=0)
+        # The model predicts departure delay; absent en-route recovery it carries to arrival.
+        dep, arr = np.maximum(dep, model), np.maximum(arr, model)
+    return pd.DataFrame({'DEP_DELAY': dep, 'ARR_DELAY': arr})
+
+
+class MisconnectEngine:
+    """Connection arrays plus per-flight sums of pax and reaccommodation cost at risk."""
+
+    def __init__(self, flights: pd.DataFrame, airports: pd.DataFrame, legs: pd.DataFrame, trips: pd.DataFrame,
+                 delays: Optional[pd.DataFrame] = None, distribution: DelayDistribution = DEFAULT_DISTRIBUTION,
+                 cost_usd: Dict[str, float] = REACCOM_COST_USD):
+        self.distribution = distribution
+        self.keys = pd.Index(flights['FLIGHT_KEY'])
+        delays = (delays if delays is not None else expected_delays(flights)).reindex(self.keys).fillna(0)
+        self.sched_dep = _minutes(flights['SCHED_DEP_UTC'])
+        self.sched_arr = _minutes(flights['SCHED_ARR_UTC'])
+        self.dep_delay = delays['DEP_DELAY'].to_numpy(dtype=np.float64).copy()
+        self.arr_delay = delays['ARR_DELAY'].to_numpy(dtype=np.float64).copy()
+
+        apt = airports.set_index('STATION_CODE')
+        dep_country = apt['COUNTRY'].reindex(flights['DEPARTURE_STATION']).fillna('').to_numpy()
+        arr_country = apt['COUNTRY'].reindex(flights['ARRIVAL_STATION']).fillna('').to_numpy()
+        intl = dep_country != arr_country
+
+        conn = legs[legs['OUTBOUND_FLIGHT_KEY'].notna()]
+        inbound = self.keys.get_indexer(conn['FLIGHT_KEY'])
+        outbound = self.keys.get_indexer(conn['OUTBOUND_FLIGHT_KEY'])
+        known = (inbound >= 0) & (outbound >= 0)
+        self.trip_ids = conn['TRIP_ID'].to_numpy()[known]
+        self.inbound, self.outbound = inbound[known], outbound[known]
+        group = pd.Index(trips['TRIP_ID']).get_indexer(self.trip_ids)
+        self.pax = np.where(group >= 0, trips['GROUP_SIZE'].fillna(1).to_numpy(dtype=np.float64)[group], 1.0)
+
+        stations = flights['ARRIVAL_STATION'].to_numpy()[self.inbound]
+        mct = apt.reindex(columns=list(MCT_DEFAULTS)).reindex(stations).fillna(MCT_DEFAULTS)
+        in_intl, out_intl = intl[self.inbound], intl[self.outbound]
+        dom_intl = mct['MCT_DOM_INTL_MINUTES'].to_numpy(dtype=np.float64)
+        intl_dom = mct['MCT_INTL_DOM_MINUTES'].to_numpy(dtype=np.float64)
+        self.mct = np.select(
+            [~in_intl & ~out_intl, ~in_intl & out_intl, in_intl & ~out_intl],
+            [mct['MCT_DOM_DOM_MINUTES'].to_numpy(dtype=np.float64), dom_intl, intl_dom],
+            np.maximum(dom_intl, intl_dom),
+        )
+        self.cost = np.where(in_intl | out_intl, cost_usd['INTL'], cost_usd['DOM']) * self.pax
+
+        # Connection ids grouped by flight (as either end), so update() finds them without a scan.
+        ends = np.concatenate([self.inbound, self.outbound])
+        self._touching = np.argsort(ends) % max(len(self.inbound), 1)
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(ends, minlength=len(self.keys)))])
+
+        n = len(self.keys)
+        self.connect_minutes = np.zeros(len(self.inbound))
+        self.prob = np.zeros(len(self.inbound))
+        self.connecting_pax = np.bincount(self.inbound, weights=self.pax, minlength=n)
+        self.pax_at_risk = np.zeros(n)
+        self.revenue_at_risk = np.zeros(n)
+        self._evaluate(np.arange(len(self.inbound)))
+
+    def _evaluate(self, idx: np.ndarray):
+        i, o = self.inbound[idx], self.outbound[idx]
+        connect = (self.sched_dep[o] + self.dep_delay[o]) - (self.sched_arr[i] + self.arr_delay[i])
+        sd = np.sqrt(self.distribution.variance(self.arr_delay[i]) + self.distribution.variance(self.dep_delay[o]))
+        prob = ndtr((self.mct[idx] - connect) / sd)
+        delta = prob - self.prob[idx]
+        self.connect_minutes[idx] = connect
+        self.prob[idx] = prob
+        n = len(self.keys)
+        self.pax_at_risk += np.bincount(i, weights=delta * self.pax[idx], minlength=n)
+        self.revenue_at_risk += np.bincount(i, weights=delta * self.cost[idx], minlength=n)
+
+    def update(self, dep_delay: Optional[Mapping[str, float]] = None,
+               arr_delay: Optional[Mapping[str, float]] = None) -> pd.DataFrame:
+        """Apply new expected delays (minutes, keyed by FLIGHT_KEY); returns per_flight() rows that changed."""
+        moved = []
+        for values, target in ((dep_delay, self.dep_delay), (arr_delay, self.arr_delay)):
+            if values is None:
+                continue
+            values = pd.Series(values, dtype=np.float64)
+            pos = self.keys.get_indexer(values.index)
+            target[pos[pos >= 0]] = values.to_numpy()[pos >= 0]
+            moved.append(pos[pos >= 0])
+        flights = np.unique(np.concatenate(moved)) if moved else np.empty(0, dtype=np.int64)
+        idx = np.unique(np.concatenate(
+            [self._touching[self._offsets[f]:self._offsets[f + 1]] for f in flights] or [np.empty(0, dtype=np.int64)]
+        ))
+        if len(idx):
+            self._evaluate(idx)
+        return self.per_flight(np.unique(self.inbound[idx]))
+
+    def per_flight(self, positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Pax and cost at risk among passengers connecting off each flight."""
+        positions = np.arange(len(self.keys)) if positions is None else positions
+        pax = self.connecting_pax[positions]
+        at_risk = np.clip(self.pax_at_risk[positions], 0, None)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prob = np.where(pax > 0, at_risk / np.maximum(pax, 1e-9), 0.0)
+        return pd.DataFrame({
+            'FLIGHT_KEY': self.keys[positions],
+            'CONNECTING_PAX': pax.astype(np.int64),
+            'MISCONNECT_PROB': prob.round(4),
+            'MISCONNECT_PAX_AT_RISK': at_risk,
+            'MISCONNECT_REVENUE_AT_RISK_USD': np.clip(self.revenue_at_risk[positions], 0, None),
+        })
+
+    def connections(self) -> pd.DataFrame:
+        """One row per connection with its expected connect time, MCT and misconnect probability."""
+        return pd.DataFrame({
+            'TRIP_ID': self.trip_ids,
+            'INBOUND_FLIGHT_KEY': self.keys[self.inbound],
+            'OUTBOUND_FLIGHT_KEY': self.keys[self.outbound],
+            'PAX': self.pax.astype(np.int64),
+            'CONNECT_MINUTES': self.connect_minutes.round(1),
+            'MCT_MINUTES': self.mct,
+            'MISCONNECT_PROB': self.prob.round(4),
+        })
+
+
+def _synthetic(n_flights: int, n_legs: int, n_stations: int = 300, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    codes = np.array([f'S{i:03d}' for i in range(n_stations)])
+    start = np.datetime64('2026-01-01T00:00:00')
+    dep = start + rng.integers(0, 86400, n_flights).astype('timedelta64[s]')
+    arr_station = rng.choice(codes, n_flights)
+    flights = pd.DataFrame({
+        'FLIGHT_KEY': [f'F{i}' for i in range(n_flights)],
+        'DEPARTURE_STATION': rng.choice(codes, n_flights),
+        'ARRIVAL_STATION': arr_station,
+        'SCHED_DEP_UTC': dep,
+        'SCHED_ARR_UTC': dep + rng.integers(3600, 6 * 3600, n_flights).astype('timedelta64[s]'),
+        'CURRENT_DELAY_DEPARTURE': rng.choice([0, 0, 0, 15, 30, 60], n_flights),
+        'CURRENT_DELAY_ARRIVAL': rng.choice([0, 0, 0, 15, 30, 60], n_flights),
+    })
+    airports = pd.DataFrame({'STATION_CODE': codes, 'COUNTRY': rng.choice(['USA', 'UK'], n_stations, p=[0.8, 0.2]),
+                             **{col: value for col, value in MCT_DEFAULTS.items()}})
+    n_trips = n_legs // 2
+    inbound = rng.integers(0, n_flights, n_trips)
+    outbound = rng.integers(0, n_flights, n_trips)
+    trips = pd.DataFrame({'TRIP_ID': [f'T{i}' for i in range(n_trips)], 'GROUP_SIZE': rng.integers(1, 4, n_trips)})
+    legs = pd.DataFrame({
+        'TRIP_ID': np.repeat(trips['TRIP_ID'].to_numpy(), 2),
+        'FLIGHT_KEY': np.column_stack([inbound, outbound]).ravel(),
+        'OUTBOUND_FLIGHT_KEY': np.column_stack([outbound, np.full(n_trips, -1)]).ravel(),
+    })
+    legs['FLIGHT_KEY'] = 'F' + legs['FLIGHT_KEY'].astype(str)
+    legs['OUTBOUND_FLIGHT_KEY'] = np.where(legs['OUTBOUND_FLIGHT_KEY'] >= 0,
+                                           'F' + legs['OUTBOUND_FLIGHT_KEY'].astype(str), None)
+    return flights, airports, legs, trips
+
+
+def benchmark(n_flights: int = 50_000, n_legs: int = 2_000_000, updates: int = 200) -> pd.DataFrame:
+    """Full evaluation time at growing sizes and the median latency of a one-flight ETA update."""
+    rows = []
+    for scale in (0.01, 0.1, 1.0):
+        nf, nl = max(int(n_flights * scale), 2), max(int(n_legs * scale), 2)
+        flights, airports, legs, trips = _synthetic(nf, nl)
+        start = time.perf_counter()
+        engine = MisconnectEngine(flights, airports, legs, trips)
+        engine.per_flight()
+        built = time.perf_counter() - start
+
+        rng = np.random.default_rng(1)
+        timings = []
+        for pos in rng.integers(0, nf, updates):
+            start = time.perf_counter()
+            engine.update(arr_delay={engine.keys[pos]: float(rng.integers(0, 120))})
+            timings.append((time.perf_counter() - start) * 1000)
+        rows.append({'FLIGHTS': nf, 'PNR_LEGS': nl, 'CONNECTIONS': len(engine.inbound),
+                     'FULL_S': round(built, 3), 'UPDATE_P50_MS': round(float(np.median(timings)), 3)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the misconnect engine")
+    parser.add_argument('--flights', type=int, default=50_000)
+    parser.add_argument('--legs', type=int, default=2_000_000)
+    args = parser.parse_args()
+    print(benchmark(args.flights, args.legs).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
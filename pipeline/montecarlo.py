@@ -0,0 +1,332 @@
+"""
+Monte Carlo delay propagation over rotations, crew duties and connections.
+
+Instead of one point estimate per flight, draws `scenarios` joint delay
+scenarios and pushes each through the network:
+
+- Own departure delay ~ Normal(expected delay, DelayDistribution sd),
+  truncated at zero, where the expected delay is the larger of the current
+  delay and DELAY_PREDICTIONS (as in pipeline.misconnect).
+- Weather: one standard-normal shock per departure station and scenario,
+  so flights out of the same hub move together; a positive shock adds
+  shock x (CONVECTIVE_INDEX x weather_minutes + EDCT_DELAY_MEAN) from the
+  time-windowed WEATHER_ATC join. Arrival holding is added with the
+  window's HOLDING_PROBABILITY.
+- Propagation: a departure waits for the inbound tail and the inbound crew,
+  dep[v] = max(own[v], arr[u] - slack(u, v)) over pipeline.downline's tail
+  and crew edges, swept forward in departure-time buckets.
+- Connections: a passenger misconnects when the realised connect time is
+  below the station MCT (MisconnectEngine's arrays); pax and reaccommodation
+  cost are summed onto the inbound flight with a sparse matmul.
+- FDP: a leg violates when its realised arrival runs past the duty's
+  REPORT_TIME_UTC plus its FAR 117 limit from pipeline.legality.
+
+Delays are (flights x scenarios) float32 arrays, so every step is one array
+operation over all scenarios. Scenario chunks run on a thread pool; numpy
+releases the GIL inside the kernels, so chunks use separate cores.
+
+Per flight it reports P50/P90 departure delay, misconnect pax and revenue at
+risk, and the FDP-violation probability, to ML_PROCESSING.DELAY_SCENARIO_QUANTILES.
+
+Usage:
+    python -m pipeline.montecarlo --connection demo --station ATL [--hours 3] [--scenarios 10000]
+    python -m pipeline.montecarlo --benchmark [--flights 2000]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import breadth_first_order
+
+from pipeline.downline import _minutes, propagation_edges, sweep_order
+from pipeline.features import Tables, load_tables
+from pipeline.legality import LegalityEngine
+from pipeline.misconnect import DEFAULT_DISTRIBUTION, DelayDistribution, MisconnectEngine, expected_delays
+from pipeline.weather import flight_weather
+
+DATABASE = 'IROP_GNN_RISK'
+SOURCES = ['FLIGHT_INSTANCE', 'AIRCRAFT_ROTATION', 'CREW_ASSIGNMENT', 'CREW_DUTY_PERIOD', 'PNR_LEG', 'PNR_TRIP',
+           'AIRPORT_CAPABILITY', 'WEATHER_ATC']
+RESULT_TABLE = 'ML_PROCESSING.DELAY_SCENARIO_QUANTILES'
+QUANTILE_METRICS = {'DEP_DELAY': 'delay', 'MISCONNECT_PAX': 'pax', 'REVENUE_AT_RISK': 'cost'}
+
+
+@dataclass(frozen=True)
+class MonteCarloConfig:
+    scenarios: int = 10_000
+    chunk_scenarios: int = 500
+    workers: int = 0
+    weather_minutes: float = 60.0
+    holding_minutes: float = 20.0
+    distribution: DelayDistribution = DEFAULT_DISTRIBUTION
+    seed: int = 0
+
+
+DEFAULT_CONFIG = MonteCarloConfig()
+
+
+def hub_bank(t: Tables, station: str, start, hours: float = 3.0, horizon_hours: float = 6.0) -> Tables:
+    """Flights in or out of `station` departing in [start, start + hours), plus every flight a delay
+    on them can reach that departs before the horizon; the other tables are cut to those flights."""
+    fi = t['FLIGHT_INSTANCE']
+    dep = pd.to_datetime(fi['SCHED_DEP_UTC'])
+    start = pd.Timestamp(start)
+    window = (dep >= start) & (dep < start + pd.Timedelta(hours=hours))
+    seeds = np.flatnonzero((window & ((fi['DEPARTURE_STATION'] == station) | (fi['ARRIVAL_STATION'] == station)))
+                           .to_numpy())
+    horizon = (dep < start + pd.Timedelta(hours=hours + horizon_hours)).to_numpy()
+    edges = propagation_edges(t)
+    edges = edges[horizon[edges['DST'].to_numpy()]]
+    n = len(fi)
+    graph = sp.csr_matrix((np.ones(len(edges)), (edges['SRC'], edges['DST'])), shape=(n, n))
+    # Reachability from all seeds at once: a virtual root with an edge to every seed.
+    root = sp.csr_matrix((np.ones(len(seeds)), (np.zeros(len(seeds), dtype=np.int64), seeds)), shape=(1, n))
+    graph = sp.bmat([[sp.csr_matrix((1, 1)), root], [sp.csr_matrix((n, 1)), graph]], format='csr')
+    reached = breadth_first_order(graph, 0, directed=True, return_predecessors=False)
+    keep = np.zeros(n, dtype=bool)
+    keep[reached[reached > 0] - 1] = True
+    keys = set(fi['FLIGHT_KEY'].to_numpy()[keep])
+
+    bank = dict(t)
+    bank['FLIGHT_INSTANCE'] = fi[keep].reset_index(drop=True)
+    for name in ('AIRCRAFT_ROTATION', 'CREW_ASSIGNMENT', 'PNR_LEG'):
+        if name in t:
+            bank[name] = t[name][t[name]['FLIGHT_KEY'].isin(keys)].reset_index(drop=True)
+    return bank
+
+
+class PropagationKernel:
+    """Static network arrays for one set of flights; sample() runs a batch of scenarios."""
+
+    def __init__(self, t: Tables, delays: Optional[pd.DataFrame] = None, config: MonteCarloConfig = DEFAULT_CONFIG):
+        self.config = config
+        fi = t['FLIGHT_INSTANCE']
+        self.keys = pd.Index(fi['FLIGHT_KEY'])
+        n = len(self.keys)
+        delays = (delays if delays is not None else expected_delays(fi)).reindex(self.keys).fillna(0)
+        self.mean = delays['DEP_DELAY'].to_numpy(dtype=np.float32)
+        self.sd = np.sqrt(config.distribution.variance(self.mean)).astype(np.float32)
+
+        weather = t.get('WEATHER_ATC')
+        if weather is not None and not weather.empty:
+            w = flight_weather(fi, weather).fillna(0)
+            self.weather_load = (w['DEP_WEATHER_CONVECTIVE'] * config.weather_minutes
+                                 + w['DEP_WEATHER_EDCT']).to_numpy(dtype=np.float32)
+            self.holding_prob = w['ARR_WEATHER_HOLDING'].clip(0, 1).to_numpy(dtype=np.float32)
+        else:
+            self.weather_load = np.zeros(n, dtype=np.float32)
+            self.holding_prob = np.zeros(n, dtype=np.float32)
+        self.station, self.n_stations = pd.factorize(fi['DEPARTURE_STATION'])[0], fi['DEPARTURE_STATION'].nunique()
+
+        # Tail and crew edges only: a passenger connection never holds the outbound.
+        physical = propagation_edges({**t, 'PNR_LEG': t['PNR_LEG'].iloc[:0]})
+        dep = _minutes(fi['SCHED_DEP_UTC'])
+        self.steps = []
+        if not physical.empty:
+            src, dst, slack = (physical[c].to_numpy() for c in ('SRC', 'DST', 'SLACK'))
+            order, slices = sweep_order(dep, src, dst)
+            src, dst, slack = src[order], dst[order], slack[order].astype(np.float32)
+            for lo, hi in reversed(slices):
+                # Group each bucket's edges by destination so one maximum.reduceat covers them.
+                by_dst = np.argsort(dst[lo:hi], kind='stable')
+                d = dst[lo:hi][by_dst]
+                targets, starts = np.unique(d, return_index=True)
+                self.steps.append((src[lo:hi][by_dst], slack[lo:hi][by_dst, None], targets, starts))
+
+        engine = MisconnectEngine(fi, t['AIRPORT_CAPABILITY'], t['PNR_LEG'], t['PNR_TRIP'], delays,
+                                  config.distribution)
+        self.inbound, self.outbound, self.mct = engine.inbound, engine.outbound, engine.mct.astype(np.float32)
+        self.sched_connect = (engine.sched_dep[self.outbound] - engine.sched_arr[self.inbound]).astype(np.float32)
+        c = len(self.inbound)
+        self.pax_by_flight = sp.csr_matrix((engine.pax.astype(np.float32), (self.inbound, np.arange(c))), shape=(n, c))
+        self.cost_by_flight = sp.csr_matrix((engine.cost.astype(np.float32), (self.inbound, np.arange(c))), shape=(n, c))
+
+        self.fdp_margin = np.full(n, np.inf, dtype=np.float32)
+        duties = t.get('CREW_DUTY_PERIOD')
+        if duties is not None and not duties.empty:
+            a = t['CREW_ASSIGNMENT']
+            pos = self.keys.get_indexer(a['FLIGHT_KEY'])
+            legality = LegalityEngine(duties, a, fi, t['AIRPORT_CAPABILITY'], delays)
+            duty = legality.duties.get_indexer(a['DUTY_ID'])
+            limit_end = np.where(duty >= 0, (legality.report + legality.limit)[np.maximum(duty, 0)], np.nan)
+            margin = limit_end - _minutes(fi['SCHED_ARR_UTC'])[np.maximum(pos, 0)]
+            ok = (pos >= 0) & ~np.isnan(margin)
+            np.minimum.at(self.fdp_margin, pos[ok], margin[ok].astype(np.float32))
+
+    def sample(self, n_scenarios: int, seed) -> Dict[str, np.ndarray]:
+        """(flights x n_scenarios) departure delay, misconnect pax and cost, and FDP violations."""
+        rng = np.random.default_rng(seed)
+        n = len(self.keys)
+        delay = self.mean[:, None] + self.sd[:, None] * rng.standard_normal((n, n_scenarios), dtype=np.float32)
+        shock = np.maximum(rng.standard_normal((self.n_stations, n_scenarios), dtype=np.float32), 0)
+        delay += shock[self.station] * self.weather_load[:, None]
+        np.maximum(delay, 0, out=delay)
+        holding = (rng.random((n, n_scenarios), dtype=np.float32) < self.holding_prob[:, None]) \
+            * np.float32(self.config.holding_minutes)
+
+        # Forward sweep: every edge into a bucket's sources was applied in an earlier step.
+        for src, slack, targets, starts in self.steps:
+            pushed = np.maximum.reduceat(delay[src] + holding[src] - slack, starts, axis=0)
+            delay[targets] = np.maximum(delay[targets], pushed)
+        arrival = delay + holding
+
+        connect = self.sched_connect[:, None] + delay[self.outbound] - arrival[self.inbound]
+        missed = (connect < self.mct[:, None]).astype(np.float32)
+        return {
+            'delay': delay,
+            'pax': self.pax_by_flight @ missed,
+            'cost': self.cost_by_flight @ missed,
+            'fdp': (arrival > self.fdp_margin[:, None]).sum(axis=1),
+        }
+
+    def simulate(self, workers: Optional[int] = None) -> pd.DataFrame:
+        """Quantiles per flight over `config.scenarios` scenarios, chunked across worker threads."""
+        config = self.config
+        workers = workers or config.workers or os.cpu_count()
+        sizes = [config.chunk_scenarios] * (config.scenarios // config.chunk_scenarios)
+        if config.scenarios % config.chunk_scenarios:
+            sizes.append(config.scenarios % config.chunk_scenarios)
+        seeds = np.random.SeedSequence(config.seed).spawn(len(sizes))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(self.sample, sizes, seeds))
+
+        out = {'FLIGHT_KEY': self.keys.to_numpy(), 'SCENARIOS': config.scenarios}
+        for name, part in QUANTILE_METRICS.items():
+            values = np.hstack([chunk[part] for chunk in chunks])
+            p50, p90 = np.quantile(values, [0.5, 0.9], axis=1)
+            out[f'{name}_P50'], out[f'{name}_P90'] = p50.round(1), p90.round(1)
+        out['FDP_VIOLATION_PROB'] = (sum(chunk['fdp'] for chunk in chunks) / config.scenarios).round(4)
+        return pd.DataFrame(out)
+
+
+def simulate(t: Tables, delays: Optional[pd.DataFrame] = None, config: MonteCarloConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    return PropagationKernel(t, delays, config).simulate()
+
+
+def persist(session, quantiles: pd.DataFrame, run_ts: datetime, station: Optional[str]):
+    staged = f'{DATABASE}.ML_PROCESSING.DELAY_SCENARIO_QUANTILES_STAGE'
+    session.create_dataframe(quantiles.assign(RUN_TS=run_ts, STATION_CODE=station)) \
+        .write.mode('overwrite').save_as_table(staged, table_type='temporary')
+    columns = ', '.join(['FLIGHT_KEY', 'RUN_TS', 'STATION_CODE', 'SCENARIOS']
+                        + [f'{m}_{q}' for m in QUANTILE_METRICS for q in ('P50', 'P90')] + ['FDP_VIOLATION_PROB'])
+    session.sql(f"INSERT INTO {DATABASE}.{RESULT_TABLE} ({columns}) SELECT {columns} FROM {staged}").collect()
+
+
+def run(session, station: str, start=None, hours: float = 3.0, config: MonteCarloConfig = DEFAULT_CONFIG,
+        write: bool = True) -> pd.DataFrame:
+    """Simulate one hub bank from ATOMIC and the latest delay predictions."""
+    predictions = session.table(f'{DATABASE}.ML_PROCESSING.DELAY_PREDICTIONS') \
+        .select('FLIGHT_KEY', 'PREDICTED_DELAY_MINUTES', 'SNAPSHOT_TS').to_pandas(block=False)
+    t = load_tables(session, SOURCES)
+    run_ts = datetime.utcnow()
+    bank = hub_bank(t, station, start if start is not None else run_ts, hours)
+    delays = expected_delays(bank['FLIGHT_INSTANCE'], predictions.result().sort_values('SNAPSHOT_TS'))
+    quantiles = simulate(bank, delays, config)
+    if write:
+        persist(session, quantiles, run_ts, station)
+    return quantiles
+
+
+def _synthetic(n_flights: int, seed: int = 0) -> Tables:
+    """One hub bank: inbound waves into HUB, outbound waves out of it, tails and crews turning at the hub."""
+    rng = np.random.default_rng(seed)
+    spokes = np.array([f'S{i:02d}' for i in range(40)])
+    half = n_flights // 2
+    start = np.datetime64('2026-01-01T12:00:00')
+    arr_in = start + rng.integers(0, 180, half).astype('timedelta64[m]')
+    dep_in = arr_in - rng.integers(60, 180, half).astype('timedelta64[m]')
+    # Each outbound is flown by an inbound's tail and crew after a 45-90 minute turn.
+    dep_out = arr_in + rng.integers(45, 90, half).astype('timedelta64[m]')
+    keys = np.array([f'F{i}' for i in range(2 * half)], dtype=object)
+    fi = pd.DataFrame({
+        'FLIGHT_KEY': keys,
+        'DEPARTURE_STATION': np.concatenate([rng.choice(spokes, half), np.full(half, 'HUB')]),
+        'ARRIVAL_STATION': np.concatenate([np.full(half, 'HUB'), rng.choice(spokes, half)]),
+        'SCHED_DEP_UTC': np.concatenate([dep_in, dep_out]),
+        'SCHED_ARR_UTC': np.concatenate([arr_in, dep_out + rng.integers(60, 180, half).astype('timedelta64[m]')]),
+        'CURRENT_DELAY_DEPARTURE': rng.choice([0, 0, 0, 15, 30], 2 * half),
+        'CURRENT_DELAY_ARRIVAL': 0,
+    })
+    inbound, outbound = keys[:half], keys[half:]
+    rotations = pd.DataFrame({'FLIGHT_KEY': outbound, 'PREV_FLIGHT_KEY': inbound})
+    assignments = pd.DataFrame({'FLIGHT_KEY': keys, 'DUTY_ID': np.tile(np.arange(half), 2),
+                                'LEG_SEQUENCE_IN_DUTY': np.repeat([1, 2], half)})
+    report = dep_in - np.timedelta64(60, 'm')
+    duties = pd.DataFrame({'DUTY_ID': np.arange(half), 'PAIRING_ID': np.arange(half), 'CREW_BASE': 'HUB',
+                           'REPORT_TIME_UTC': report, 'SCHEDULED_RELEASE_TIME_UTC': report + np.timedelta64(600, 'm'),
+                           'NUM_SEGMENTS': 2, 'AUGMENTED_CREW_FLAG': False,
+                           'TIME_ZONE_SPAN_HOURS': rng.choice([0, 0, 0, 4], half),
+                           'REST_IN_LAST_168_HOURS_MINUTES': 2400})
+    n_trips = 4 * n_flights
+    trips = pd.DataFrame({'TRIP_ID': np.arange(n_trips), 'GROUP_SIZE': rng.integers(1, 4, n_trips)})
+    legs = pd.DataFrame({'TRIP_ID': trips['TRIP_ID'], 'FLIGHT_KEY': rng.choice(inbound, n_trips),
+                         'OUTBOUND_FLIGHT_KEY': rng.choice(outbound, n_trips)})
+    stations = np.append(spokes, 'HUB')
+    airports = pd.DataFrame({'STATION_CODE': stations, 'COUNTRY': 'USA', 'MCT_DOM_DOM_MINUTES': 45,
+                             'MCT_DOM_INTL_MINUTES': 90, 'MCT_INTL_DOM_MINUTES': 90, 'TIMEZONE_OFFSET_UTC': -5})
+    weather = pd.DataFrame({
+        'STATION_CODE': np.repeat(stations, 12),
+        'VALID_TIME_UTC': np.tile(start + np.arange(-360, 360, 60).astype('timedelta64[m]'), len(stations)),
+        'CONVECTIVE_INDEX': rng.beta(1, 6, 12 * len(stations)),
+        'EDCT_DELAY_MEAN': rng.choice([0, 0, 0, 15, 30], 12 * len(stations)),
+        'HOLDING_PROBABILITY': rng.beta(1, 8, 12 * len(stations)),
+    })
+    return {'FLIGHT_INSTANCE': fi, 'AIRCRAFT_ROTATION': rotations, 'CREW_ASSIGNMENT': assignments,
+            'CREW_DUTY_PERIOD': duties, 'PNR_LEG': legs, 'PNR_TRIP': trips, 'AIRPORT_CAPABILITY': airports,
+            'WEATHER_ATC': weather}
+
+
+def benchmark(n_flights: int = 2_000, config: MonteCarloConfig = DEFAULT_CONFIG) -> pd.DataFrame:
+    """Wall-clock for `config.scenarios` scenarios at growing bank sizes, serial vs. all cores."""
+    rows = []
+    for scale in (0.1, 0.5, 1.0):
+        n = max(int(n_flights * scale), 10)
+        t = _synthetic(n)
+        start = time.perf_counter()
+        kernel = PropagationKernel(t, config=config)
+        built = time.perf_counter()
+        kernel.simulate(workers=1)
+        serial = time.perf_counter()
+        result = kernel.simulate()
+        parallel = time.perf_counter()
+        rows.append({'FLIGHTS': n, 'CONNECTIONS': len(kernel.inbound), 'SCENARIOS': config.scenarios,
+                     'BUILD_S': round(built - start, 3), 'SERIAL_S': round(serial - built, 3),
+                     'PARALLEL_S': round(parallel - serial, 3),
+                     'MEAN_PAX_P90': round(float(result['MISCONNECT_PAX_P90'].mean()), 1),
+                     'MEAN_FDP_PROB': round(float(result['FDP_VIOLATION_PROB'].mean()), 4)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo delay propagation for a hub bank")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--station', default='ATL', help="Hub whose bank is simulated")
+    parser.add_argument('--start', help="Bank start (UTC); defaults to now")
+    parser.add_argument('--hours', type=float, default=3.0, help="Bank length in hours")
+    parser.add_argument('--scenarios', type=int, default=DEFAULT_CONFIG.scenarios)
+    parser.add_argument('--workers', type=int, default=0, help="Worker threads (0 = all cores)")
+    parser.add_argument('--benchmark', action='store_true', help="Time the kernel on a synthetic bank")
+    parser.add_argument('--flights', type=int, default=2_000)
+    args = parser.parse_args()
+    config = MonteCarloConfig(scenarios=args.scenarios, workers=args.workers)
+
+    if args.benchmark:
+        print(benchmark(args.flights, config).to_string(index=False))
+        return
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    quantiles = run(session, args.station, args.start, args.hours, config)
+    print(f"{config.scenarios} scenarios simulated for {len(quantiles)} flights around {args.station}")
+    print(quantiles.sort_values('MISCONNECT_PAX_P90', ascending=False).head(10).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Where trained boosters come from.
+
+RegistrySource reads the Snowflake Model Registry the notebooks log to;
+DirectorySource reads a local artifact directory with the same models
+saved in their native formats, for offline runs and tests:
+
+    <root>/<MODEL_NAME>/<VERSION>/model.json   (XGBoost)
+    <root>/<MODEL_NAME>/<VERSION>/model.txt    (LightGBM)
+
+Both return native xgboost.Booster / lightgbm.Booster objects.
+"""
+import os
+import re
+from typing import List, Optional
+
+from pipeline import explain
+
+DATABASE = 'IROP_GNN_RISK'
+SCHEMA = 'ML_PROCESSING'
+ARTIFACT_FILES = {'xgboost': 'model.json', 'lightgbm': 'model.txt'}
+
+
+def _version_key(version: str):
+    """Natural sort so v10 ranks above v9."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', version)]
+
+
+class RegistrySource:
+    def __init__(self, session, database: str = DATABASE, schema: str = SCHEMA):
+        from snowflake.ml.registry import Registry
+        self.registry = Registry(session=session, database_name=database, schema_name=schema)
+
+    def versions(self, name: str) -> List[str]:
+        return sorted((v.version_name for v in self.registry.get_model(name).versions()), key=_version_key)
+
+    def latest_version(self, name: str) -> str:
+        return self.versions(name)[-1]
+
+    def load(self, name: str, version: Optional[str] = None):
+        model = self.registry.get_model(name)
+        return explain.native_booster(model.version(version or self.latest_version(name)).load())
+
+
+class DirectorySource:
+    def __init__(self, root: str):
+        self.root = root
+
+    def versions(self, name: str) -> List[str]:
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(path):
+            return []
+        return sorted((v for v in os.listdir(path) if os.path.isdir(os.path.join(path, v))), key=_version_key)
+
+    def latest_version(self, name: str) -> str:
+        versions = self.versions(name)
+        if not versions:
+            raise FileNotFoundError(f"No artifacts for {name} under {self.root}")
+        return versions[-1]
+
+    def load(self, name: str, version: Optional[str] = None):
+        path = os.path.join(self.root, name, version or self.latest_version(name))
+        if os.path.exists(os.path.join(path, ARTIFACT_FILES['xgboost'])):
+            import xgboost as xgb
+            return xgb.Booster(model_file=os.path.join(path, ARTIFACT_FILES['xgboost']))
+        if os.path.exists(os.path.join(path, ARTIFACT_FILES['lightgbm'])):
+            import lightgbm as lgb
+            return lgb.Booster(model_file=os.path.join(path, ARTIFACT_FILES['lightgbm']))
+        raise FileNotFoundError(f"No model.json or model.txt in {path}")
+
+    def save(self, name: str, version: str, booster) -> str:
+        framework = 'xgboost' if type(booster).__module__.startswith('xgboost') else 'lightgbm'
+        path = os.path.join(self.root, name, version)
+        os.makedirs(path, exist_ok=True)
+        target = os.path.join(path, ARTIFACT_FILES[framework])
+        booster.save_model(target)
+        return target
+
+
+def export(source, target: DirectorySource, names: List[str]) -> dict:
+    """Copy the latest version of each model from `source` into a local artifact directory."""
+    exported = {}
+    for name in names:
+        version = source.latest_version(name)
+        exported[name] = target.save(name, version, source.load(name, version))
+    return exported
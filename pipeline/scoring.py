@@ -0,0 +1,320 @@
+"""
+Batch scoring orchestrator for the five gradient-boosted IROP models.
+
+Replaces the serial notebook run (irco_01..05 each reloading the ATOMIC
+tables) with one pass:
+
+1. load the shared ATOMIC tables once, as concurrent async queries;
+2. refresh the shared feature store from that in-memory copy and read the
+   current snapshot of every feature set (pipeline.feature_store); with
+   write=False the feature sets are built in process and the store is left
+   untouched;
+3. score the registered models in a process pool, TreeSHAP included;
+4. write the five prediction tables and the SHAP tables;
+5. compose FLIGHT_RISK from the predictions (pipeline.composition) and MERGE
+   it by FLIGHT_KEY.
+
+The notebooks are still where the models are trained and registered.
+
+Usage:
+    python -m pipeline.scoring --connection demo [--workers 5] [--benchmark] [--config risk.json]
+"""
+import argparse
+import json
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline import composition, explain
+from pipeline.composition import DEFAULT_CONFIG, CompositionConfig
+from pipeline.feature_store import FeatureStore
+from pipeline.features import ATOMIC_TABLES, FEATURE_SETS, Tables, load_tables
+from pipeline.registry import RegistrySource
+
+DATABASE = 'IROP_GNN_RISK'
+MODEL_VERSION = 'v1.0'
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    name: str
+    registry_version: str
+    feature_set: str
+    output_table: str
+    entity_type: str
+
+
+MODEL_SPECS = [
+    ModelSpec('DELAY_PREDICTION_MODEL', 'v1', 'delay', 'DELAY_PREDICTIONS', 'FLIGHT'),
+    ModelSpec('TURN_SUCCESS_MODEL', 'v1', 'turn', 'TURN_PREDICTIONS', 'FLIGHT'),
+    ModelSpec('CREW_TIMEOUT_MODEL', 'v1', 'crew', 'CREW_TIMEOUT_PREDICTIONS', 'CREW_DUTY'),
+    ModelSpec('PNR_MISCONNECT_MODEL', 'v1', 'pnr', 'PNR_MISCONNECT_PREDICTIONS', 'PNR_TRIP'),
+    ModelSpec('AOG_RISK_MODEL', 'v1', 'aog', 'AOG_RISK_PREDICTIONS', 'ROTATION'),
+]
+
+
+@dataclass
+class ScoringReport:
+    mode: str
+    stages: Dict[str, float] = field(default_factory=dict)
+    rows: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_s(self) -> float:
+        return sum(self.stages.values())
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({'STAGE': list(self.stages), 'SECONDS': [round(s, 2) for s in self.stages.values()]})
+        return pd.concat([frame, pd.DataFrame({'STAGE': ['TOTAL'], 'SECONDS': [round(self.total_s, 2)]})],
+                         ignore_index=True)
+
+
+class _Timer:
+    def __init__(self, report: ScoringReport, stage: str):
+        self.report, self.stage = report, stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.report.stages[self.stage] = self.report.stages.get(self.stage, 0.0) + time.perf_counter() - self.start
+
+
+def load_boosters(session, specs: Sequence[ModelSpec] = MODEL_SPECS) -> Dict[str, object]:
+    source = RegistrySource(session)
+    return {spec.name: source.load(spec.name, spec.registry_version) for spec in specs}
+
+
+def predict(booster, X) -> np.ndarray:
+    """Raw booster output (probability, or minutes for the delay regressor); XGBoost skips DMatrix construction."""
+    if type(booster).__module__.startswith('xgboost'):
+        return np.asarray(booster.inplace_predict(X), dtype=np.float64)
+    return np.asarray(booster.predict(X), dtype=np.float64)
+
+
+def score_model(name: str, booster, X: pd.DataFrame, with_shap: bool = True) -> dict:
+    """Process-pool task: predictions plus optional TreeSHAP contributions for one model."""
+    start = time.perf_counter()
+    X = X.astype(np.float32)
+    result = {'name': name, 'predictions': predict(booster, X), 'contribs': None}
+    if with_shap:
+        result['contribs'] = explain.tree_shap(booster, X)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _prediction_ids(n: int) -> List[str]:
+    return [str(uuid.uuid4())[:8].upper() for _ in range(n)]
+
+
+def prediction_frame(spec: ModelSpec, features: pd.DataFrame, scores: np.ndarray, snapshot_ts: datetime,
+                     drivers: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Rows for the model's ML_PROCESSING prediction table, matching the notebook output columns."""
+    base = {'PREDICTION_ID': _prediction_ids(len(features)), 'SNAPSHOT_TS': snapshot_ts}
+    f = features.reset_index(drop=True)
+    if spec.feature_set == 'delay':
+        out = pd.DataFrame({**base, 'FLIGHT_KEY': f['FLIGHT_KEY'], 'PREDICTED_DELAY_MINUTES': scores,
+                            'DELAY_RISK_SCORE': scores / 60 * 100})
+    elif spec.feature_set == 'turn':
+        flags = [
+            json.dumps([flag for flag, on in (('MEL_ACTIVE', mel == 1), ('INBOUND_DELAYED', inbound > 30),
+                                              ('TIGHT_TURN', buffer < 45)) if on])
+            for mel, inbound, buffer in zip(f['HAS_MEL'], f['INBOUND_DELAY'], f['TURN_BUFFER_MINUTES'])
+        ]
+        out = pd.DataFrame({**base, 'FLIGHT_KEY': f['FLIGHT_KEY'], 'TURN_SUCCESS_PROB': scores,
+                            'TURN_RISK_FLAGS': flags})
+    elif spec.feature_set == 'crew':
+        out = pd.DataFrame({**base, 'DUTY_ID': f['DUTY_ID'], 'TIMEOUT_PROB': scores,
+                            'TIME_TO_TIMEOUT_MINUTES': f['PROJECTED_FDP_REMAINING_MINUTES']})
+    elif spec.feature_set == 'pnr':
+        out = pd.DataFrame({**base, 'PNR_ID': f['PNR_ID'], 'TRIP_ID': f['TRIP_ID'], 'PNR_MISCONNECT_PROB': scores,
+                            'CONNECTION_LEG_AT_RISK': None})
+    else:
+        out = pd.DataFrame({**base, 'TAIL_NUMBER': f['TAIL_NUMBER'], 'FLIGHT_KEY': f['FLIGHT_KEY'],
+                            'AOG_RISK_SCORE': scores, 'CRITICAL_MEL_FLAG': f['HAS_APU_MEL'] == 1,
+                            'MEL_NARRATIVE_SUMMARY': None})
+    out['MODEL_VERSION'] = MODEL_VERSION
+    key_col = FEATURE_SETS[spec.feature_set].key_col
+    if drivers is not None:
+        out = out.merge(drivers, on=key_col, how='left')
+    else:
+        out['FEATURE_IMPORTANCE'] = None
+    return out
+
+
+VARIANT_COLUMNS = {'FEATURE_IMPORTANCE', 'TURN_RISK_FLAGS', 'RISK_DRIVERS'}
+
+
+def write_predictions(session, spec: ModelSpec, frame: pd.DataFrame):
+    from snowflake.snowpark.functions import col, parse_json
+    df = session.create_dataframe(frame)
+    df = df.select(*[parse_json(col(c)).alias(c) if c in VARIANT_COLUMNS else col(c) for c in frame.columns])
+    df.write.mode('overwrite').save_as_table(f'{DATABASE}.ML_PROCESSING.{spec.output_table}')
+
+
+def merge_predictions(session, spec: ModelSpec, frame: pd.DataFrame):
+    """Upsert re-scored rows into the model's prediction table by entity key."""
+    merge_frame(session, frame, f'ML_PROCESSING.{spec.output_table}', FEATURE_SETS[spec.feature_set].key_col)
+
+
+def merge_frame(session, frame: pd.DataFrame, table: str, key_col: str,
+                update_cols: Optional[Sequence[str]] = None, stage_table: Optional[str] = None):
+    """Stage `frame` in a temp table and MERGE it into `table` (schema.table) by `key_col`.
+
+    Matched rows get `update_cols` (default: everything but the key and the row id).
+    """
+    schema, name = table.split('.')
+    staged = f'{DATABASE}.{schema}.{stage_table or name + "_STAGE"}'
+    session.create_dataframe(frame).write.mode('overwrite').save_as_table(staged, table_type='temporary')
+    source = {c: f'PARSE_JSON(src.{c})' if c in VARIANT_COLUMNS else f'src.{c}' for c in frame.columns}
+    if update_cols is None:
+        update_cols = [c for c in frame.columns if c != key_col and not c.endswith('_ID')]
+    updates = ",\n            ".join(f"tgt.{c} = {source[c]}" for c in update_cols)
+    columns = ", ".join(frame.columns)
+    values = ", ".join(source[c] for c in frame.columns)
+    session.sql(f"""
+        MERGE INTO {DATABASE}.{table} tgt
+        USING {staged} src
+        ON tgt.{key_col} = src.{key_col}
+        WHEN MATCHED THEN UPDATE SET
+            {updates}
+        WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values})
+    """).collect()
+
+
+def _finish(session, spec: ModelSpec, features: pd.DataFrame, result: dict, snapshot_ts: datetime,
+            write: bool) -> pd.DataFrame:
+    fs = FEATURE_SETS[spec.feature_set]
+    drivers = None
+    explanation = None
+    if result['contribs'] is not None:
+        contribs = result['contribs']
+        explanation = explain.Explanation(features[fs.key_col].to_numpy(), fs.feature_cols,
+                                          contribs[:, :-1], float(contribs[:, -1].mean()))
+        drivers = explanation.top_drivers(fs.key_col)
+    frame = prediction_frame(spec, features, result['predictions'], snapshot_ts, drivers)
+    if write:
+        write_predictions(session, spec, frame)
+        if explanation is not None:
+            explain.persist(session, explanation, spec.name, MODEL_VERSION, spec.entity_type, snapshot_ts)
+    return frame
+
+
+def run(session, workers: int = len(MODEL_SPECS), with_shap: bool = True, write: bool = True,
+        config: CompositionConfig = DEFAULT_CONFIG) -> ScoringReport:
+    """Load once, score all models concurrently, then recompose FLIGHT_RISK."""
+    report = ScoringReport('orchestrated')
+    snapshot_ts = datetime.utcnow()
+    with _Timer(report, 'load_tables'):
+        criticality_job = composition.criticality_frame(session).to_pandas(block=False)
+        tables = load_tables(session)
+        criticality = criticality_job.result()
+    with _Timer(report, 'load_models'):
+        boosters = load_boosters(session)
+    names = [spec.feature_set for spec in MODEL_SPECS]
+    if write:
+        # Score from the materialized store so serving sees exactly the rows training read.
+        store = FeatureStore(session)
+        with _Timer(report, 'feature_store'):
+            report.rows.update({f'FS_{name.upper()}_WRITTEN': st.rows_written
+                                for name, st in store.refresh(names, tables=tables).items()})
+        with _Timer(report, 'features'):
+            by_set = store.read_many(names)
+    else:
+        # Read-only run: build in process from the shared tables, as the serial leg does.
+        with _Timer(report, 'features'):
+            by_set = {name: FEATURE_SETS[name].builder(tables) for name in names}
+    features = {spec.name: by_set[spec.feature_set] for spec in MODEL_SPECS}
+    with _Timer(report, 'score'):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                spec.name: pool.submit(score_model, spec.name, boosters[spec.name],
+                                       features[spec.name][FEATURE_SETS[spec.feature_set].feature_cols], with_shap)
+                for spec in MODEL_SPECS
+            }
+            results = {name: future.result() for name, future in futures.items()}
+    with _Timer(report, 'write_predictions'):
+        predictions = {
+            spec.name: _finish(session, spec, features[spec.name], results[spec.name], snapshot_ts, write)
+            for spec in MODEL_SPECS
+        }
+    with _Timer(report, 'compose_flight_risk'):
+        flight_risk = composition.compose(tables, predictions, criticality, snapshot_ts, config)
+        if write:
+            composition.write(session, flight_risk)
+    report.rows.update({name: len(frame) for name, frame in predictions.items()})
+    report.rows['FLIGHT_RISK'] = len(flight_risk)
+    return report
+
+
+def run_serial(session, with_shap: bool = True, write: bool = True,
+               config: CompositionConfig = DEFAULT_CONFIG) -> ScoringReport:
+    """Notebook-equivalent baseline: each model reloads its own tables and is scored in turn."""
+    report = ScoringReport('serial')
+    snapshot_ts = datetime.utcnow()
+    predictions = {}
+    tables: Tables = {}
+    for spec in MODEL_SPECS:
+        with _Timer(report, 'load_tables'):
+            tables = {**tables, **load_tables(session, FEATURE_SETS[spec.feature_set].sources)}
+        with _Timer(report, 'load_models'):
+            booster = load_boosters(session, [spec])[spec.name]
+        with _Timer(report, 'features'):
+            features = FEATURE_SETS[spec.feature_set].builder(tables)
+        with _Timer(report, 'score'):
+            result = score_model(spec.name, booster, features[FEATURE_SETS[spec.feature_set].feature_cols], with_shap)
+        with _Timer(report, 'write_predictions'):
+            predictions[spec.name] = _finish(session, spec, features, result, snapshot_ts, write)
+    with _Timer(report, 'compose_flight_risk'):
+        tables.update(load_tables(session, [t for t in ATOMIC_TABLES if t not in tables]))
+        criticality = composition.criticality_frame(session).to_pandas()
+        flight_risk = composition.compose(tables, predictions, criticality, snapshot_ts, config)
+        if write:
+            composition.write(session, flight_risk)
+    report.rows = {name: len(frame) for name, frame in predictions.items()}
+    report.rows['FLIGHT_RISK'] = len(flight_risk)
+    return report
+
+
+def benchmark(session, workers: int = len(MODEL_SPECS), write: bool = True) -> pd.DataFrame:
+    """Wall-clock comparison per stage; the store refresh (write=True only) has no serial counterpart."""
+    serial = run_serial(session, write=write)
+    orchestrated = run(session, workers=workers, write=write)
+    frame = serial.to_frame().merge(orchestrated.to_frame(), on='STAGE', how='outer',
+                                    suffixes=('_SERIAL', '_ORCHESTRATED'))
+    order = list(dict.fromkeys([*orchestrated.stages, *serial.stages, 'TOTAL']))
+    frame = frame.set_index('STAGE').loc[order].reset_index()
+    frame['SPEEDUP'] = (frame['SECONDS_SERIAL'] / frame['SECONDS_ORCHESTRATED'].replace(0, np.nan)).round(2)
+    return frame
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Score the IROP models and recompose FLIGHT_RISK")
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--workers', type=int, default=len(MODEL_SPECS))
+    parser.add_argument('--no-shap', action='store_true', help="Skip TreeSHAP attributions")
+    parser.add_argument('--benchmark', action='store_true', help="Also time the serial notebook-style run")
+    parser.add_argument('--no-write', action='store_true', help="Benchmark both legs without writing tables")
+    parser.add_argument('--config', help="FLIGHT_RISK composition config (JSON)")
+    args = parser.parse_args(argv)
+    config = CompositionConfig.load(args.config) if args.config else DEFAULT_CONFIG
+
+    from snowflake.snowpark import Session
+    session = Session.builder.config('connection_name', args.connection).create()
+    session.use_database(DATABASE)
+    if args.benchmark:
+        print(benchmark(session, workers=args.workers, write=not args.no_write).to_string(index=False))
+    else:
+        report = run(session, workers=args.workers, with_shap=not args.no_shap, config=config)
+        print(report.to_frame().to_string(index=False))
+        print(json.dumps(report.rows))
+
+
+if __name__ == '__main__':
+    main()
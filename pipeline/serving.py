@@ -0,0 +1,185 @@
+"""
+Warm in-memory scoring service for intraday refreshes.
+
+ScoringService loads the latest registered version of every model once
+(concurrently) and keeps the native boosters in memory. score() then goes
+straight to the booster's in-place predict with no Snowpark round trip or
+DMatrix copy. refresh() swaps in newly registered versions without a
+restart.
+
+Offline, point it at a local artifact directory instead of the registry:
+
+    python -m pipeline.serving export --connection demo --models-dir ./models
+    python -m pipeline.serving bench --models-dir ./models
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pipeline import explain
+from pipeline.features import FEATURE_SETS
+from pipeline.registry import DirectorySource, RegistrySource, export
+from pipeline.scoring import MODEL_SPECS, ModelSpec, predict
+
+
+@dataclass
+class LoadedModel:
+    spec: ModelSpec
+    version: str
+    booster: object
+    feature_cols: Sequence[str]
+    loaded_at: datetime
+    load_ms: float
+
+
+class ScoringService:
+    """Process-wide cache of warm boosters keyed by model name."""
+
+    def __init__(self, source, specs: Sequence[ModelSpec] = MODEL_SPECS):
+        self.source = source
+        self.specs = {spec.name: spec for spec in specs}
+        self._models: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+        self.startup_ms = 0.0
+
+    def _load(self, spec: ModelSpec, version: Optional[str] = None) -> LoadedModel:
+        start = time.perf_counter()
+        version = version or self.source.latest_version(spec.name)
+        booster = self.source.load(spec.name, version)
+        return LoadedModel(spec, version, booster, FEATURE_SETS[spec.feature_set].feature_cols,
+                           datetime.utcnow(), (time.perf_counter() - start) * 1000)
+
+    def warm(self) -> 'ScoringService':
+        """Load every model concurrently; call once at startup."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.specs)) as pool:
+            loaded = list(pool.map(self._load, self.specs.values()))
+        with self._lock:
+            self._models = {m.spec.name: m for m in loaded}
+        self.startup_ms = (time.perf_counter() - start) * 1000
+        return self
+
+    def refresh(self) -> Dict[str, str]:
+        """Reload models whose latest registered version changed; returns {name: new_version}."""
+        changed = {}
+        for name, spec in self.specs.items():
+            latest = self.source.latest_version(name)
+            current = self._models.get(name)
+            if current is None or current.version != latest:
+                model = self._load(spec, latest)
+                with self._lock:
+                    self._models[name] = model
+                changed[name] = latest
+        return changed
+
+    def model(self, name: str) -> LoadedModel:
+        with self._lock:
+            model = self._models.get(name)
+        if model is None:
+            raise KeyError(f"{name} is not loaded; call warm() first")
+        return model
+
+    def status(self) -> pd.DataFrame:
+        with self._lock:
+            models = list(self._models.values())
+        return pd.DataFrame({
+            'MODEL_NAME': [m.spec.name for m in models],
+            'VERSION': [m.version for m in models],
+            'LOADED_AT': [m.loaded_at for m in models],
+            'LOAD_MS': [round(m.load_ms, 1) for m in models],
+        })
+
+    def score(self, name: str, entities: pd.DataFrame, with_shap: bool = False) -> pd.DataFrame:
+        """Score a batch of feature rows (key column + the model's feature columns).
+
+        Returns the key column, SCORE and MODEL_VERSION, plus the top-3 SHAP drivers as
+        FEATURE_IMPORTANCE when `with_shap` is set.
+        """
+        model = self.model(name)
+        key_col = FEATURE_SETS[model.spec.feature_set].key_col
+        X = entities[list(model.feature_cols)].to_numpy(dtype=np.float32)
+        out = pd.DataFrame({
+            key_col: entities[key_col].to_numpy(),
+            'SCORE': predict(model.booster, X) if len(X) else np.empty(0),
+            'MODEL_VERSION': model.version,
+        })
+        if with_shap and len(X):
+            contribs = explain.tree_shap(model.booster, pd.DataFrame(X, columns=model.feature_cols))
+            drivers = explain.Explanation(out[key_col].to_numpy(), list(model.feature_cols), contribs[:, :-1],
+                                          float(contribs[:, -1].mean())).top_drivers(key_col)
+            out['FEATURE_IMPORTANCE'] = drivers['FEATURE_IMPORTANCE'].to_numpy()
+        return out
+
+    def score_many(self, entities: Dict[str, pd.DataFrame], with_shap: bool = False) -> Dict[str, pd.DataFrame]:
+        """score() for several models at once, keyed by model name."""
+        return {name: self.score(name, frame, with_shap) for name, frame in entities.items()}
+
+
+_services: Dict[str, ScoringService] = {}
+_services_lock = threading.Lock()
+
+
+def get_service(session=None, models_dir: Optional[str] = None) -> ScoringService:
+    """Shared warm service per source; the local directory wins when both are given."""
+    key = models_dir or 'registry'
+    with _services_lock:
+        if key not in _services:
+            source = DirectorySource(models_dir) if models_dir else RegistrySource(session)
+            _services[key] = ScoringService(source).warm()
+        return _services[key]
+
+
+def bench(service: ScoringService, batch_sizes: Sequence[int] = (1, 100, 1000), repeats: int = 50) -> pd.DataFrame:
+    """Median per-call latency for each warm model on random feature rows."""
+    rng = np.random.default_rng(0)
+    rows = []
+    for name, spec in service.specs.items():
+        fs = FEATURE_SETS[spec.feature_set]
+        for n in batch_sizes:
+            batch = pd.DataFrame(rng.random((n, len(fs.feature_cols))), columns=fs.feature_cols)
+            batch[fs.key_col] = [f'K{i}' for i in range(n)]
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                service.score(name, batch)
+                timings.append((time.perf_counter() - start) * 1000)
+            rows.append({'MODEL_NAME': name, 'BATCH': n, 'P50_MS': round(float(np.median(timings)), 3),
+                         'P95_MS': round(float(np.percentile(timings, 95)), 3)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm model scoring service")
+    parser.add_argument('command', choices=['export', 'bench'])
+    parser.add_argument('-c', '--connection', default='demo', help="Snowflake connection name")
+    parser.add_argument('--models-dir', help="Local artifact directory (export target / bench source)")
+    args = parser.parse_args()
+
+    session = None
+    if args.command == 'export' or not args.models_dir:
+        from snowflake.snowpark import Session
+        session = Session.builder.config('connection_name', args.connection).create()
+
+    if args.command == 'export':
+        if not args.models_dir:
+            parser.error("export needs --models-dir")
+        for name, path in export(RegistrySource(session), DirectorySource(args.models_dir),
+                                 [spec.name for spec in MODEL_SPECS]).items():
+            print(f"{name}: {path}")
+        return
+
+    service = get_service(session, args.models_dir)
+    print(f"Startup: {service.startup_ms:.0f} ms")
+    print(service.status().to_string(index=False))
+    print(bench(service).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -40,6 +40,7 @@ done
 
 SNOW_CONN="-c $CONNECTION_NAME"
 COMMAND="${1:-help}"
+SCORE_ARGS=("${@:2}")
 
 cmd_test() {
     info "Running deployment verification tests..."
@@ -67,6 +68,41 @@ cmd_test() {
     success "All tests completed!"
 }
 
+cmd_score() {
+    info "Scoring models and recomposing FLIGHT_RISK..."
+    python3 -m pipeline.scoring --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
+cmd_compose() {
+    info "Recomposing FLIGHT_RISK from the stored predictions..."
+    python3 -m pipeline.composition --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
+cmd_rescore() {
+    info "Re-scoring entities changed since the last run..."
+    python3 -m pipeline.incremental --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
+cmd_downline() {
+    info "Computing downline reach over tail, crew and passenger connections..."
+    python3 -m pipeline.downline --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
+cmd_centrality() {
+    info "Computing the graph-centrality baseline for network criticality..."
+    python3 -m pipeline.centrality --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
+cmd_legality() {
+    info "Projecting FAR 117 crew legality for every duty..."
+    python3 -m pipeline.legality --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
+cmd_montecarlo() {
+    info "Sampling delay scenarios for a hub bank and writing outcome quantiles..."
+    python3 -m pipeline.montecarlo --connection "$CONNECTION_NAME" "${SCORE_ARGS[@]}"
+}
+
 cmd_main() {
     info "Running main workflow..."
     echo ""
@@ -82,6 +118,10 @@ cmd_main() {
         "irco_06_hgnn_network_criticality"
     )
     
+    for module in pipeline/*.py; do
+        snow sql $SNOW_CONN -q "PUT file://${module} @${DATABASE}.RAW.${STAGE}/pipeline/ AUTO_COMPRESS=FALSE OVERWRITE=TRUE;" 2>/dev/null || true
+    done
+    
     for nb in "${NOTEBOOKS[@]}"; do
         info "  Creating notebook: ${nb}..."
         snow sql $SNOW_CONN -q "PUT file://notebooks/${nb}.ipynb @${DATABASE}.RAW.${STAGE}/notebooks/${nb}/ AUTO_COMPRESS=FALSE OVERWRITE=TRUE;" 2>/dev/null || true
@@ -104,58 +144,21 @@ cmd_main() {
     echo ""
     
     info "Step 2: Refreshing risk scores from ML predictions..."
-    snow sql $SNOW_CONN -q "
-        MERGE INTO ${DATABASE}.IROP_MART.FLIGHT_RISK fr
-        USING (
-            SELECT 
-                fi.flight_key,
-                fi.flight_number,
-                fi.departure_station,
-                fi.arrival_station,
-                fi.flight_date,
-                fi.sched_dep_utc,
-                fi.sched_arr_utc,
-                CURRENT_TIMESTAMP() as snapshot_ts,
-                fi.tail_number,
-                fi.aircraft_fleet_type as fleet_type,
-                ap.hub_flag,
-                CASE 
-                    WHEN fi.intl_connector_flag THEN 
-                        CASE WHEN ap.country = 'USA' THEN 'DOM-INTL' ELSE 'INTL-DOM' END
-                    ELSE 'DOM-DOM'
-                END as route_type,
-                COALESCE(fi.delay_risk_score, 0) * 0.3 +
-                COALESCE(1 - fi.turn_success_prob, 0) * 0.2 +
-                COALESCE(fi.misconnect_prob, 0) * 0.3 +
-                COALESCE(fi.network_criticality_score, 0) * 0.2 as flight_risk_score_0_100,
-                fi.network_criticality_score as network_impact_score_0_100,
-                fi.connecting_pax_pct * fi.pax_count as misconnect_pax_at_risk,
-                fi.revenue_at_risk_usd
-            FROM ${DATABASE}.ATOMIC.FLIGHT_INSTANCE fi
-            LEFT JOIN ${DATABASE}.ATOMIC.AIRPORT_CAPABILITY ap ON fi.departure_station = ap.station_code
-        ) src
-        ON fr.flight_key = src.flight_key
-        WHEN MATCHED THEN UPDATE SET
-            fr.flight_risk_score_0_100 = src.flight_risk_score_0_100,
-            fr.snapshot_ts = src.snapshot_ts
-        WHEN NOT MATCHED THEN INSERT (
-            risk_id, flight_key, flight_number, departure_station, arrival_station,
-            flight_date, sched_dep_utc, sched_arr_utc, snapshot_ts, tail_number,
-            fleet_type, hub_flag, route_type, flight_risk_score_0_100,
-            network_impact_score_0_100, misconnect_pax_at_risk, revenue_at_risk_usd, risk_band
-        ) VALUES (
-            UUID_STRING(), src.flight_key, src.flight_number, src.departure_station,
-            src.arrival_station, src.flight_date, src.sched_dep_utc, src.sched_arr_utc,
-            src.snapshot_ts, src.tail_number, src.fleet_type, src.hub_flag, src.route_type,
-            src.flight_risk_score_0_100, src.network_impact_score_0_100,
-            src.misconnect_pax_at_risk, src.revenue_at_risk_usd,
-            CASE 
-                WHEN src.flight_risk_score_0_100 >= 70 THEN 'High'
-                WHEN src.flight_risk_score_0_100 >= 40 THEN 'Medium'
-                ELSE 'Low'
-            END
-        );
-    " 2>/dev/null && success "Risk scores refreshed" || warn "Risk score refresh encountered issues"
+    if cmd_score; then
+        success "Risk scores refreshed"
+    else
+        warn "Scoring failed, recomposing FLIGHT_RISK from the last stored predictions"
+        cmd_compose || warn "Risk score refresh encountered issues"
+    fi
+    
+    info "Step 3: Recomputing downline reach from the new delay predictions..."
+    cmd_downline || warn "Downline reach not refreshed"
+    
+    info "Step 4: Recomputing the graph-centrality baseline..."
+    cmd_centrality || warn "Centrality baseline not refreshed"
+    
+    info "Step 5: Projecting crew legality from the new delay predictions..."
+    cmd_legality || warn "Crew legality not refreshed"
     
     echo ""
     success "Main workflow completed!"
@@ -192,6 +195,20 @@ cmd_help() {
     echo "Commands:"
     echo "  test       Run deployment verification tests"
     echo "  main       Execute main workflow (refresh risk scores)"
+    echo "  score      Score all models in parallel and MERGE FLIGHT_RISK"
+    echo "             (extra args: --workers N, --no-shap, --config FILE, --benchmark [--no-write])"
+    echo "  compose    Recompose FLIGHT_RISK from stored predictions without re-scoring"
+    echo "             (extra args: --config FILE, --benchmark, --flights N)"
+    echo "  rescore    Re-score only entities changed since the last run"
+    echo "             (extra args: --full, --interval SECONDS)"
+    echo "  downline   Recompute downline legs affected for every flight"
+    echo "             (extra args: --benchmark, --flights N)"
+    echo "  centrality Recompute PageRank/betweenness/reach baseline criticality"
+    echo "             (extra args: --benchmark, --flights N, --samples K)"
+    echo "  legality   Project FDP end, remaining FDP and rest compliance per crew duty"
+    echo "             (extra args: --benchmark, --duties N)"
+    echo "  montecarlo Simulate delay scenarios for a hub bank (P50/P90 outcomes, FDP risk)"
+    echo "             (extra args: --station CODE, --hours H, --scenarios N, --workers N, --benchmark, --flights N)"
     echo "  status     Check deployment status and row counts"
     echo "  streamlit  Get Streamlit app URL"
     echo "  help       Show this help message"
@@ -202,6 +219,9 @@ cmd_help() {
     echo "Examples:"
     echo "  ./run.sh test           # Verify deployment"
     echo "  ./run.sh main           # Refresh risk scores"
+    echo "  ./run.sh score --benchmark  # Compare against serial notebook-style scoring"
+    echo "  ./run.sh rescore --interval 900  # Incremental refresh every 15 minutes"
+    echo "  ./run.sh montecarlo --station ATL --hours 3  # Outcome distribution for the next ATL bank"
     echo "  ./run.sh -c prod main   # Use 'prod' connection"
     echo ""
 }
@@ -209,6 +229,13 @@ cmd_help() {
 case $COMMAND in
     test) cmd_test ;;
     main) cmd_main ;;
+    score) cmd_score ;;
+    compose) cmd_compose ;;
+    rescore) cmd_rescore ;;
+    downline) cmd_downline ;;
+    centrality) cmd_centrality ;;
+    legality) cmd_legality ;;
+    montecarlo) cmd_montecarlo ;;
     status) cmd_status ;;
     streamlit) cmd_streamlit ;;
     help|--help|-h) cmd_help ;;
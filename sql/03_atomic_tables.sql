@@ -113,6 +113,21 @@ CREATE OR REPLACE TABLE PNR_TRIP (
     PRIMARY KEY (trip_id)
 );
 
+-- One row per itinerary leg. Clustered by flight_key so "every passenger on (or connecting off)
+-- this flight" prunes to a few micro-partitions instead of flattening every PNR_TRIP array.
+CREATE OR REPLACE TABLE PNR_LEG (
+    pnr_id VARCHAR(20) NOT NULL,
+    trip_id VARCHAR(50) NOT NULL,
+    leg_sequence INT NOT NULL,
+    flight_key VARCHAR(50) NOT NULL,
+    inbound_flight_key VARCHAR(50),
+    outbound_flight_key VARCHAR(50),
+    PRIMARY KEY (trip_id, leg_sequence),
+    FOREIGN KEY (trip_id) REFERENCES PNR_TRIP(trip_id),
+    FOREIGN KEY (flight_key) REFERENCES FLIGHT_INSTANCE(flight_key)
+)
+CLUSTER BY (flight_key);
+
 CREATE OR REPLACE TABLE AIRPORT_CAPABILITY (
     station_code VARCHAR(5) NOT NULL,
     hub_flag BOOLEAN DEFAULT FALSE,
@@ -153,3 +168,13 @@ CREATE OR REPLACE TABLE WEATHER_ATC (
     processed_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
     PRIMARY KEY (record_id)
 );
+
+-- Change tracking lets the incremental re-scorer read CHANGES(...) since its last watermark.
+ALTER TABLE FLIGHT_INSTANCE SET CHANGE_TRACKING = TRUE;
+ALTER TABLE AIRCRAFT_ROTATION SET CHANGE_TRACKING = TRUE;
+ALTER TABLE CREW_DUTY_PERIOD SET CHANGE_TRACKING = TRUE;
+ALTER TABLE CREW_ASSIGNMENT SET CHANGE_TRACKING = TRUE;
+ALTER TABLE PNR_TRIP SET CHANGE_TRACKING = TRUE;
+ALTER TABLE PNR_LEG SET CHANGE_TRACKING = TRUE;
+ALTER TABLE AIRPORT_CAPABILITY SET CHANGE_TRACKING = TRUE;
+ALTER TABLE WEATHER_ATC SET CHANGE_TRACKING = TRUE;
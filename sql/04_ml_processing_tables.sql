@@ -51,6 +51,7 @@ CREATE OR REPLACE TABLE PNR_MISCONNECT_PREDICTIONS (
 CREATE OR REPLACE TABLE AOG_RISK_PREDICTIONS (
     prediction_id VARCHAR(50) NOT NULL,
     tail_number VARCHAR(10) NOT NULL,
+    flight_key VARCHAR(50),
     snapshot_ts TIMESTAMP_NTZ NOT NULL,
     aog_risk_score FLOAT,
     critical_mel_flag BOOLEAN DEFAULT FALSE,
@@ -72,3 +73,174 @@ CREATE OR REPLACE TABLE GNN_FLIGHT_EMBEDDINGS (
     model_version VARCHAR(20),
     PRIMARY KEY (embedding_id)
 );
+
+CREATE OR REPLACE TABLE FLIGHT_CENTRALITY (
+    flight_key VARCHAR(50) NOT NULL,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    pagerank_score FLOAT,
+    betweenness_score FLOAT,
+    reach_count FLOAT,
+    baseline_network_criticality FLOAT,
+    PRIMARY KEY (flight_key, snapshot_ts)
+);
+
+CREATE OR REPLACE TABLE SHAP_ATTRIBUTIONS (
+    model_name VARCHAR(50) NOT NULL,
+    model_version VARCHAR(20),
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    entity_type VARCHAR(20) NOT NULL,
+    entity_key VARCHAR(50) NOT NULL,
+    feature VARCHAR(50) NOT NULL,
+    shap_value FLOAT NOT NULL
+)
+CLUSTER BY (model_name, entity_key);
+
+CREATE OR REPLACE TABLE FEATURE_SNAPSHOTS (
+    feature_set VARCHAR(20) NOT NULL,
+    version VARCHAR(10) NOT NULL,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    source_fingerprint VARCHAR(2000),
+    rows_written INT DEFAULT 0,
+    rows_deleted INT DEFAULT 0,
+    rows_total INT DEFAULT 0,
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (feature_set, version, snapshot_ts)
+);
+
+CREATE OR REPLACE TABLE FS_DELAY_V2 (
+    flight_key VARCHAR(50) NOT NULL,
+    target_delay_minutes FLOAT,
+    block_time_minutes FLOAT,
+    turn_buffer_minutes FLOAT,
+    pax_count FLOAT,
+    connecting_pax_pct FLOAT,
+    is_hub INT,
+    is_intl INT,
+    atc_congestion FLOAT,
+    dep_weather_convective FLOAT,
+    dep_weather_edct FLOAT,
+    dep_weather_holding FLOAT,
+    arr_weather_convective FLOAT,
+    arr_weather_edct FLOAT,
+    arr_weather_holding FLOAT,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    row_hash NUMBER(19, 0),
+    is_deleted BOOLEAN DEFAULT FALSE
+)
+CLUSTER BY (flight_key);
+
+CREATE OR REPLACE TABLE FS_TURN_V1 (
+    flight_key VARCHAR(50) NOT NULL,
+    tail_number VARCHAR(10),
+    turn_success_flag INT,
+    turn_buffer_minutes FLOAT,
+    inbound_delay FLOAT,
+    pax_count FLOAT,
+    connecting_pax_pct FLOAT,
+    is_hub INT,
+    gate_count FLOAT,
+    has_mel INT,
+    aog_risk FLOAT,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    row_hash NUMBER(19, 0),
+    is_deleted BOOLEAN DEFAULT FALSE
+)
+CLUSTER BY (flight_key);
+
+CREATE OR REPLACE TABLE FS_CREW_V2 (
+    duty_id VARCHAR(50) NOT NULL,
+    timeout_flag INT,
+    fdp_limit_minutes FLOAT,
+    fdp_time_used_minutes FLOAT,
+    fdp_remaining_minutes FLOAT,
+    num_segments FLOAT,
+    time_zone_span_hours FLOAT,
+    is_augmented INT,
+    rest_in_last_168_hours_minutes FLOAT,
+    avg_delay FLOAT,
+    total_delay FLOAT,
+    legal_fdp_limit_minutes FLOAT,
+    projected_fdp_remaining_minutes FLOAT,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    row_hash NUMBER(19, 0),
+    is_deleted BOOLEAN DEFAULT FALSE
+)
+CLUSTER BY (duty_id);
+
+CREATE OR REPLACE TABLE FS_PNR_V1 (
+    trip_id VARCHAR(50) NOT NULL,
+    pnr_id VARCHAR(20),
+    misconnect_flag INT,
+    group_size FLOAT,
+    is_intl INT,
+    rebook_flexibility_index FLOAT,
+    loyalty_value_index FLOAT,
+    pnr_reaccom_complexity_score FLOAT,
+    is_elite INT,
+    estimated_voucher_cost_usd FLOAT,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    row_hash NUMBER(19, 0),
+    is_deleted BOOLEAN DEFAULT FALSE
+)
+CLUSTER BY (trip_id);
+
+CREATE OR REPLACE TABLE FS_AOG_V1 (
+    flight_key VARCHAR(50) NOT NULL,
+    tail_number VARCHAR(10),
+    aog_flag INT,
+    aircraft_age_years FLOAT,
+    utilization_hours_24h FLOAT,
+    has_apu_mel INT,
+    has_mel INT,
+    mel_severity_score INT,
+    at_mx_station INT,
+    is_etops INT,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    row_hash NUMBER(19, 0),
+    is_deleted BOOLEAN DEFAULT FALSE
+)
+CLUSTER BY (flight_key);
+
+CREATE OR REPLACE TABLE RESCORE_RUNS (
+    run_id VARCHAR(50) NOT NULL,
+    mode VARCHAR(20) NOT NULL,
+    watermark_ts TIMESTAMP_TZ NOT NULL,
+    changed_entities VARIANT,
+    rescored_entities VARIANT,
+    elapsed_ms FLOAT,
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (run_id)
+);
+
+CREATE OR REPLACE TABLE DELAY_SCENARIO_QUANTILES (
+    flight_key VARCHAR(50) NOT NULL,
+    run_ts TIMESTAMP_NTZ NOT NULL,
+    station_code VARCHAR(10),
+    scenarios INT,
+    dep_delay_p50 FLOAT,
+    dep_delay_p90 FLOAT,
+    misconnect_pax_p50 FLOAT,
+    misconnect_pax_p90 FLOAT,
+    revenue_at_risk_p50 FLOAT,
+    revenue_at_risk_p90 FLOAT,
+    fdp_violation_prob FLOAT,
+    PRIMARY KEY (flight_key, run_ts)
+)
+CLUSTER BY (run_ts, station_code);
+
+CREATE OR REPLACE TABLE CREW_LEGALITY (
+    duty_id VARCHAR(50) NOT NULL,
+    projected_fdp_end_utc TIMESTAMP_NTZ,
+    projected_fdp_minutes FLOAT,
+    legal_fdp_limit_minutes FLOAT,
+    augmented_fdp_limit_minutes FLOAT,
+    projected_fdp_remaining_minutes FLOAT,
+    rest_after_minutes FLOAT,
+    rest_compliant_flag BOOLEAN,
+    extension_required_flag BOOLEAN,
+    augmentation_resolves_flag BOOLEAN,
+    timeout_risk_flag BOOLEAN,
+    legal_flag BOOLEAN,
+    snapshot_ts TIMESTAMP_NTZ NOT NULL,
+    PRIMARY KEY (duty_id)
+);
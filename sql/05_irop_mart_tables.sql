@@ -24,6 +24,7 @@ CREATE OR REPLACE TABLE FLIGHT_RISK (
     pax_component FLOAT DEFAULT 0,
     maintenance_component FLOAT DEFAULT 0,
     gnn_network_criticality FLOAT DEFAULT 0,
+    baseline_network_criticality FLOAT DEFAULT 0,
     gnn_embedding ARRAY,
     downline_legs_affected_count INT DEFAULT 0,
     misconnect_pax_at_risk INT DEFAULT 0,
@@ -39,16 +40,21 @@ CREATE OR REPLACE TABLE FLIGHT_RISK (
     PRIMARY KEY (risk_id)
 );
 
+-- Change points only: a flight gets a row when it first appears or its scores
+-- move, plus a periodic KEYFRAME row per active flight that bounds how far
+-- back a reader has to scan to rebuild any snapshot (see pipeline/history.py).
 CREATE OR REPLACE TABLE FLIGHT_RISK_HISTORY (
-    history_id VARCHAR(50) NOT NULL,
+    history_id VARCHAR(80) NOT NULL,
     risk_id VARCHAR(50) NOT NULL,
     flight_key VARCHAR(50) NOT NULL,
+    flight_date DATE NOT NULL,
     snapshot_ts TIMESTAMP_NTZ NOT NULL,
     flight_risk_score_0_100 FLOAT,
     network_impact_score_0_100 FLOAT,
     change_reason VARCHAR(200),
     PRIMARY KEY (history_id)
-);
+)
+CLUSTER BY (flight_date, flight_key);
 
 CREATE OR REPLACE TABLE SIMULATION_RESULTS (
     simulation_id VARCHAR(50) NOT NULL,
@@ -61,5 +67,21 @@ CREATE OR REPLACE TABLE SIMULATION_RESULTS (
     total_delta_misconnect_pax INT,
     total_delta_revenue_usd FLOAT,
     recommendation_text VARCHAR(1000),
+    scenario_key VARCHAR(40),
+    input_version TIMESTAMP_NTZ,
+    result_rows VARIANT,
     PRIMARY KEY (simulation_id)
 );
+
+CREATE OR REPLACE TABLE FEATURE_IMPORTANCE_DAILY (
+    model_name VARCHAR(50) NOT NULL,
+    model_version VARCHAR(20),
+    score_date DATE NOT NULL,
+    feature VARCHAR(50) NOT NULL,
+    mean_abs_shap FLOAT NOT NULL,
+    mean_shap FLOAT,
+    max_abs_shap FLOAT,
+    n_rows INT,
+    expected_value FLOAT,
+    PRIMARY KEY (model_name, score_date, feature)
+);
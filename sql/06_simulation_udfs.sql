@@ -121,10 +121,11 @@ $$
     WITH crew_duty AS (
         SELECT 
             cd.duty_id,
-            cd.crew_timeout_risk_score,
-            cd.fdp_remaining_minutes,
+            COALESCE(cl.timeout_risk_flag, cd.crew_timeout_risk_score > 0.5) AS timeout_at_risk,
+            COALESCE(cl.projected_fdp_remaining_minutes, cd.fdp_remaining_minutes) AS fdp_remaining_minutes,
             cd.reserve_crew_eta_minutes
         FROM IROP_GNN_RISK.ATOMIC.CREW_DUTY_PERIOD cd
+        LEFT JOIN IROP_GNN_RISK.ML_PROCESSING.CREW_LEGALITY cl ON cl.duty_id = cd.duty_id
         WHERE cd.duty_id = duty_id
     ),
     affected_flights AS (
@@ -132,22 +133,22 @@ $$
             ca.flight_key,
             fr.flight_risk_score_0_100 AS original_risk_score,
             CASE 
-                WHEN cd.crew_timeout_risk_score > 0.5 
+                WHEN cd.timeout_at_risk
                 THEN GREATEST(10, fr.flight_risk_score_0_100 - 40)
                 ELSE fr.flight_risk_score_0_100 - 10
             END AS new_risk_score,
             CASE 
-                WHEN cd.crew_timeout_risk_score > 0.5 
+                WHEN cd.timeout_at_risk
                 THEN -FLOOR(fr.misconnect_pax_at_risk * 0.6)
                 ELSE -FLOOR(fr.misconnect_pax_at_risk * 0.1)
             END AS delta_misconnect_pax,
             CASE 
-                WHEN cd.crew_timeout_risk_score > 0.5 
+                WHEN cd.timeout_at_risk
                 THEN -fr.revenue_at_risk_usd * 0.5
                 ELSE -fr.revenue_at_risk_usd * 0.1
             END AS delta_revenue_usd,
             CASE 
-                WHEN cd.crew_timeout_risk_score > 0.5 
+                WHEN cd.timeout_at_risk
                 THEN 'FDP timeout prevented by reserve crew assignment'
                 ELSE 'Minor improvement from reserve crew buffer'
             END AS crew_action_result
@@ -4,6 +4,25 @@ import plotly.express as px
 import plotly.graph_objects as go
 from snowflake.snowpark.context import get_active_session
 import json
+import time
+from utils.query_builder import (
+    QueryStats, run_query, run_queries_concurrently, flight_detail_query, policy_search_query,
+    downstream_flights_query
+)
+from utils.scenarios import ScenarioCache
+from utils.copilot import (
+    Copilot, CopilotMetrics, ResponseCache, build_flight_context, format_policy_references,
+    make_backend, network_context
+)
+from utils.paging import (
+    KeysetPager, PageStore, flight_page_query, flight_count_query, swap_candidate_page_query
+)
+from utils.policy_index import PolicyIndexManager
+from utils.ann import EmbeddingIndexService
+from utils.capacity import StationCapacityService
+
+FLIGHT_PAGE_SIZE = 200
+SWAP_PAGE_SIZE = 100
 
 st.set_page_config(page_title="IOC Copilot", page_icon="🤖", layout="wide")
 
@@ -13,46 +32,73 @@ def get_session():
 
 session = get_session()
 
-def cortex_complete(model: str, prompt: str) -> str:
-    escaped_prompt = prompt.replace("'", "''")
-    result = session.sql(f"""
-        SELECT SNOWFLAKE.CORTEX.COMPLETE('{model}', '{escaped_prompt}') as RESPONSE
-    """).to_pandas()
-    return result['RESPONSE'].iloc[0] if not result.empty else ""
-
-def get_downstream_flights(flight_key: str, max_depth: int = 3) -> pd.DataFrame:
-    return session.sql(f"""
-        WITH RECURSIVE downstream AS (
-            SELECT 
-                ar.FLIGHT_KEY,
-                ar.NEXT_FLIGHT_KEY,
-                ar.TAIL_NUMBER,
-                1 as depth
-            FROM IROP_GNN_RISK.ATOMIC.AIRCRAFT_ROTATION ar
-            WHERE ar.FLIGHT_KEY = '{flight_key}'
-            
-            UNION ALL
-            
-            SELECT 
-                ar.FLIGHT_KEY,
-                ar.NEXT_FLIGHT_KEY,
-                ar.TAIL_NUMBER,
-                d.depth + 1
-            FROM IROP_GNN_RISK.ATOMIC.AIRCRAFT_ROTATION ar
-            JOIN downstream d ON ar.FLIGHT_KEY = d.NEXT_FLIGHT_KEY
-            WHERE d.depth < {max_depth} AND d.NEXT_FLIGHT_KEY IS NOT NULL
-        )
-        SELECT 
-            d.FLIGHT_KEY,
-            d.depth,
-            fr.FLIGHT_NUMBER,
-            fr.DEPARTURE_STATION,
-            fr.ARRIVAL_STATION,
-            ROUND(fr.FLIGHT_RISK_SCORE_0_100, 0) as RISK_SCORE,
-            fr.MISCONNECT_PAX_AT_RISK as PAX_AT_RISK
-        FROM downstream d
-        JOIN IROP_GNN_RISK.IROP_MART.FLIGHT_RISK fr ON d.FLIGHT_KEY = fr.FLIGHT_KEY
-        ORDER BY d.depth
+if 'query_stats' not in st.session_state:
+    st.session_state.query_stats = QueryStats()
+query_stats = st.session_state.query_stats
+if 'page_store' not in st.session_state:
+    st.session_state.page_store = PageStore()
+page_store = st.session_state.page_store
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(max_entries=512)
+
+if 'copilot_metrics' not in st.session_state:
+    st.session_state.copilot_metrics = CopilotMetrics()
+if 'flight_contexts' not in st.session_state:
+    st.session_state.flight_contexts = {}
+@st.cache_resource
+def get_embedding_index():
+    return EmbeddingIndexService(session)
+
+@st.cache_resource
+def get_scenario_cache():
+    return ScenarioCache(session, max_entries=256)
+
+def run_scenario(name: str, **params) -> pd.DataFrame:
+    result = get_scenario_cache().run(name, query_stats, **params)
+    st.caption(f"{'Computed' if result.source == 'computed' else 'Reused'} in {result.elapsed_ms:,.0f} ms"
+               + ("" if result.source == 'computed' else f" (from {result.source})"))
+    return result.rows
+
+@st.cache_resource
+def get_capacity_service():
+    return StationCapacityService(session, min_interval_s=60)
+
+def show_capacity_conflicts(**plan):
+    service = get_capacity_service()
+    conflicts = service.what_if(**plan)
+    if conflicts.empty:
+        st.success("No new gate, widebody-gate or curfew conflicts")
+    else:
+        st.warning(f"{len(conflicts)} new station conflict(s)")
+        st.dataframe(conflicts, use_container_width=True, hide_index=True)
+    st.caption(f"Station capacity checked in {service.last_query_ms:,.1f} ms")
+
+@st.cache_resource
+def get_policy_index_manager():
+    return PolicyIndexManager(session)
+
+copilot = Copilot(make_backend(session, query_stats), get_response_cache(), st.session_state.copilot_metrics)
+
+def fetch_flight_frames(flight_key: str) -> dict:
+    return run_queries_concurrently(session, {
+        'flight_detail': flight_detail_query(flight_key),
+        'downstream_chain': downstream_flights_query(flight_key),
+    }, query_stats, raise_errors=False)
+
+@st.cache_data(ttl=60)
+def load_latest_snapshot() -> str:
+    result = session.sql("SELECT MAX(SNAPSHOT_TS) as TS FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK").collect()
+    return str(result[0]['TS']) if result else ""
+
+@st.cache_data(ttl=300)
+def load_stations() -> pd.DataFrame:
+    return session.sql("""
+        SELECT DISTINCT DEPARTURE_STATION 
+        FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK 
+        WHERE FLIGHT_DATE = CURRENT_DATE
+        ORDER BY 1
     """).to_pandas()
 
 st.title("IOC Copilot")
@@ -68,12 +114,7 @@ st.subheader("Flight Selection")
 filter_col1, filter_col2, filter_col3 = st.columns(3)
 
 with filter_col1:
-    stations = session.sql("""
-        SELECT DISTINCT DEPARTURE_STATION 
-        FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK 
-        WHERE FLIGHT_DATE = CURRENT_DATE
-        ORDER BY 1
-    """).to_pandas()
+    stations = load_stations()
     selected_station = st.selectbox("Departure Station", ['All'] + stations['DEPARTURE_STATION'].tolist())
 
 with filter_col2:
@@ -82,35 +123,27 @@ with filter_col2:
 with filter_col3:
     flag_filter = st.multiselect("Risk Flags", ['FDP Timeout', 'Curfew', 'MEL', 'Turn'])
 
-where_clauses = ["FLIGHT_DATE = CURRENT_DATE"]
-if selected_station != 'All':
-    where_clauses.append(f"DEPARTURE_STATION = '{selected_station}'")
-if risk_filter != 'All':
-    where_clauses.append(f"RISK_BAND = '{risk_filter}'")
-if 'FDP Timeout' in flag_filter:
-    where_clauses.append("FDP_TIMEOUT_RISK_FLAG = TRUE")
-if 'Curfew' in flag_filter:
-    where_clauses.append("CURFEW_RISK_FLAG = TRUE")
-if 'MEL' in flag_filter:
-    where_clauses.append("MEL_RISK_FLAG = TRUE")
-if 'Turn' in flag_filter:
-    where_clauses.append("TURN_RISK_FLAG = TRUE")
-
-where_sql = " AND ".join(where_clauses)
-
-flights_df = session.sql(f"""
-    SELECT 
-        FLIGHT_KEY,
-        FLIGHT_NUMBER,
-        DEPARTURE_STATION || '-' || ARRIVAL_STATION as ROUTE,
-        ROUND(FLIGHT_RISK_SCORE_0_100, 0) as RISK,
-        RISK_BAND,
-        MISCONNECT_PAX_AT_RISK as PAX
-    FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK
-    WHERE {where_sql}
-    ORDER BY FLIGHT_RISK_SCORE_0_100 DESC
-    LIMIT 50
-""").to_pandas()
+latest_snapshot = load_latest_snapshot()
+if st.session_state.get('page_store_snapshot') != latest_snapshot:
+    page_store.clear()
+    st.session_state.page_store_snapshot = latest_snapshot
+
+filter_key = ('flights', latest_snapshot, selected_station, risk_filter, tuple(sorted(flag_filter)))
+table_key = "flight_table_" + "_".join([selected_station, risk_filter] + list(filter_key[4])).replace(' ', '')
+flight_pager = page_store.get(filter_key, lambda: KeysetPager(
+    session,
+    lambda after, size: flight_page_query(selected_station, risk_filter, flag_filter, after, size),
+    key_columns=['SORT_SCORE', 'FLIGHT_KEY'],
+    page_size=FLIGHT_PAGE_SIZE,
+    stats=query_stats,
+    label="flight_page"
+))
+if flight_pager.total is None:
+    flight_pager.total = int(run_query(
+        session, flight_count_query(selected_station, risk_filter, flag_filter), query_stats, "flight_count"
+    )['CNT'].iloc[0])
+flight_pager.ensure(1)
+flights_df = flight_pager.rows()
 
 if not flights_df.empty:
     high_risk_count = flights_df[flights_df['RISK_BAND'] == 'High'].shape[0]
@@ -118,28 +151,42 @@ if not flights_df.empty:
         st.error(f"**Alert:** {high_risk_count} high-risk flight(s) in current filter require immediate attention!")
     
     st.dataframe(
-        flights_df,
+        flights_df.drop(columns=['SORT_SCORE']),
         use_container_width=True,
         hide_index=True,
+        height=420,
         selection_mode="single-row",
         on_select="rerun",
-        key="flight_table"
+        key=table_key
     )
     
-    if "flight_table" in st.session_state and st.session_state.flight_table.selection.rows:
-        selected_idx = st.session_state.flight_table.selection.rows[0]
+    page_col1, page_col2 = st.columns([3, 1])
+    with page_col1:
+        st.caption(f"Showing {len(flights_df):,} of {flight_pager.total:,} flights")
+    with page_col2:
+        if not flight_pager.exhausted and st.button("Load more flights", key="load_more_flights"):
+            flight_pager.load_next()
+            st.rerun()
+    
+    table_state = st.session_state.get(table_key)
+    if table_state is not None and table_state.selection.rows:
+        selected_idx = table_state.selection.rows[0]
         st.session_state.selected_flight = flights_df.iloc[selected_idx]['FLIGHT_KEY']
+    
+    flight_pager.prefetch()
 
 st.markdown("---")
 
+flight_context = network_context(latest_snapshot)
+
 if st.session_state.selected_flight:
     st.subheader(f"Flight Detail: {st.session_state.selected_flight}")
     
-    detail = session.sql(f"""
-        SELECT *
-        FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK
-        WHERE FLIGHT_KEY = '{st.session_state.selected_flight}'
-    """).to_pandas()
+    flight_frames = fetch_flight_frames(st.session_state.selected_flight)
+    detail = flight_frames['flight_detail']
+    if isinstance(detail, Exception):
+        st.error(f"Flight detail unavailable: {str(detail)}")
+        detail = pd.DataFrame()
     
     if not detail.empty:
         row = detail.iloc[0]
@@ -193,8 +240,10 @@ if st.session_state.selected_flight:
             st.success("No critical flags active")
         
         st.markdown("**Downstream Impact Chain:**")
+        downstream = flight_frames['downstream_chain']
         try:
-            downstream = get_downstream_flights(st.session_state.selected_flight)
+            if isinstance(downstream, Exception):
+                raise downstream
             if not downstream.empty and len(downstream) > 1:
                 labels = [f"{r['DEPARTURE_STATION']}-{r['ARRIVAL_STATION']} ({r['FLIGHT_NUMBER']})" 
                           for _, r in downstream.iterrows()]
@@ -224,6 +273,22 @@ if st.session_state.selected_flight:
                 st.info("No downstream flights found in rotation.")
         except Exception as e:
             st.info(f"Downstream chain unavailable: {str(e)}")
+            downstream = None
+        
+        with st.expander("Flights like this one"):
+            try:
+                similar = get_embedding_index().similar_flights(row['FLIGHT_KEY'], k=10)
+                if not similar.empty:
+                    st.dataframe(similar, use_container_width=True, hide_index=True)
+                else:
+                    st.info("No GNN embedding available for this flight.")
+            except Exception as e:
+                st.info(f"Similar flights unavailable: {str(e)}")
+        
+        context_key = (row['FLIGHT_KEY'], str(row['SNAPSHOT_TS']))
+        if context_key not in st.session_state.flight_contexts:
+            st.session_state.flight_contexts[context_key] = build_flight_context(row, downstream)
+        flight_context = st.session_state.flight_contexts[context_key]
 
 st.markdown("---")
 
@@ -243,52 +308,68 @@ with tab1:
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        context = ""
-        if st.session_state.selected_flight:
-            context = f"Context: User has selected flight {st.session_state.selected_flight}. "
-        
-        full_prompt = f"""You are an IOC Flight Manager assistant. {context}
-        
-User question: {prompt}
-
-Provide a helpful, data-driven response. If you need to query data, describe what you would query.
-Focus on actionable insights for operations."""
-        
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    response = cortex_complete('claude-3-5-sonnet', full_prompt)
+            try:
+                completion = copilot.lookup(prompt, flight_context)
+                if completion is not None:
+                    response = completion.text
                     st.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+                else:
+                    started = time.perf_counter()
+                    try:
+                        hits = get_policy_index_manager().get().search(prompt, limit=3)
+                    except Exception:
+                        try:
+                            hits = run_query(session, policy_search_query(prompt, limit=3), query_stats,
+                                             "policy_search")
+                        except Exception:
+                            hits = None
+                    references = format_policy_references(hits)
+                    response = st.write_stream(copilot.stream(prompt, flight_context, references, started=started))
+                    completion = copilot.last
+                st.caption(
+                    f"{'cached' if completion.cached else copilot.backend.name} · "
+                    f"first token {completion.first_token_ms:,.0f} ms · total {completion.latency_ms:,.0f} ms · "
+                    f"{completion.prompt_tokens} prompt / {completion.completion_tokens} completion tokens"
+                )
+                st.session_state.messages.append({"role": "assistant", "content": response})
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
 
 with tab2:
     st.markdown("Search FAR 117, MEL procedures, curfew rules, and IROP playbooks using semantic search.")
     
     policy_query = st.text_input("Search policies and regulations...", key="policy_search")
+    col_backend, col_type, col_station = st.columns(3)
+    with col_backend:
+        search_backend = st.radio("Search backend", ["Local index", "Cortex Search"], horizontal=True,
+                                  key="policy_backend")
+    with col_type:
+        doc_type_filter = st.selectbox("Document type", ['All', 'FAR_117', 'MEL_MANUAL', 'CURFEW_RULES', 'IROP_PLAYBOOK'],
+                                       key="policy_doc_type")
+    with col_station:
+        station_filter = st.text_input("Station code", key="policy_station").strip().upper()
+    policy_filters = {}
+    if doc_type_filter != 'All':
+        policy_filters['doc_type'] = doc_type_filter
+    if station_filter:
+        policy_filters['station_code'] = station_filter
     
     if policy_query:
-        with st.spinner("Searching with Cortex Search..."):
+        with st.spinner(f"Searching with {search_backend}..."):
             try:
-                escaped_query = policy_query.replace("'", "''")
-                results = session.sql(f"""
-                    SELECT 
-                        DOC_TYPE,
-                        TITLE,
-                        CONTENT,
-                        STATION_CODE
-                    FROM TABLE(
-                        SNOWFLAKE.CORTEX.SEARCH_PREVIEW(
-                            '{escaped_query}',
-                            'IROP_GNN_RISK.IROP_MART.IROP_GNN_RISK_SEARCH_SVC',
-                            OBJECT_CONSTRUCT('columns', ARRAY_CONSTRUCT('DOC_TYPE', 'TITLE', 'CONTENT', 'STATION_CODE'), 'limit', 5)
-                        )
+                started = time.perf_counter()
+                if search_backend == "Local index":
+                    results = get_policy_index_manager().get().search(policy_query, limit=5, filters=policy_filters)
+                else:
+                    results = run_query(
+                        session, policy_search_query(policy_query, limit=5, filters=policy_filters),
+                        query_stats, label="policy_search"
                     )
-                """).to_pandas()
+                elapsed_ms = (time.perf_counter() - started) * 1000
                 
                 if not results.empty:
-                    st.success(f"Found {len(results)} relevant document(s)")
+                    st.success(f"Found {len(results)} relevant document(s) in {elapsed_ms:,.1f} ms")
                     for _, doc in results.iterrows():
                         with st.expander(f"📄 {doc['TITLE']} ({doc['DOC_TYPE']})"):
                             content = str(doc['CONTENT']) if doc['CONTENT'] else ""
@@ -309,14 +390,11 @@ with tab3:
         if st.button("Simulate Delay", key="sim_delay"):
             with st.spinner("Running simulation..."):
                 try:
-                    results = session.sql(f"""
-                        SELECT * FROM TABLE(
-                            IROP_GNN_RISK.IROP_MART.SIMULATE_DELAY(
-                                '{st.session_state.selected_flight}',
-                                {delay_minutes}
-                            )
-                        )
-                    """).to_pandas()
+                    results = run_scenario(
+                        "simulate_delay",
+                        flight_key=st.session_state.selected_flight,
+                        delay_minutes=int(delay_minutes)
+                    )
                     
                     if not results.empty:
                         st.dataframe(results, use_container_width=True, hide_index=True)
@@ -324,6 +402,7 @@ with tab3:
                         total_delta_rev = results['DELTA_REVENUE_USD'].sum()
                         st.metric("Total Added Misconnect Pax", f"{total_delta_pax:+,.0f}")
                         st.metric("Total Added Revenue Risk", f"${total_delta_rev:+,.0f}")
+                    show_capacity_conflicts(delays={st.session_state.selected_flight: int(delay_minutes)})
                 except Exception as e:
                     st.error(f"Simulation error: {str(e)}")
         
@@ -335,13 +414,7 @@ with tab3:
             if duty_id:
                 with st.spinner("Running simulation..."):
                     try:
-                        results = session.sql(f"""
-                            SELECT * FROM TABLE(
-                                IROP_GNN_RISK.IROP_MART.SIMULATE_RESERVE_CREW(
-                                    '{duty_id}'
-                                )
-                            )
-                        """).to_pandas()
+                        results = run_scenario("simulate_reserve_crew", duty_id=duty_id.strip())
                         
                         if not results.empty:
                             st.dataframe(results, use_container_width=True, hide_index=True)
@@ -356,37 +429,41 @@ with tab3:
         
         st.markdown("**Swap Tail with Another Flight**")
         try:
-            available_flights = session.sql(f"""
-                SELECT DISTINCT FLIGHT_KEY, FLIGHT_NUMBER, TAIL_NUMBER
-                FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK
-                WHERE FLIGHT_DATE = CURRENT_DATE
-                  AND FLIGHT_KEY != '{st.session_state.selected_flight}'
-                  AND TAIL_NUMBER IS NOT NULL
-                ORDER BY FLIGHT_NUMBER
-                LIMIT 20
-            """).to_pandas()
+            source_flight = st.session_state.selected_flight
+            swap_pager = page_store.get(('swap', latest_snapshot, source_flight), lambda: KeysetPager(
+                session,
+                lambda after, size: swap_candidate_page_query(source_flight, after, size),
+                key_columns=['FLIGHT_NUMBER', 'FLIGHT_KEY'],
+                page_size=SWAP_PAGE_SIZE,
+                stats=query_stats,
+                label="swap_page"
+            ))
+            swap_pager.ensure(1)
+            available_flights = swap_pager.rows()
             
             if not available_flights.empty:
-                swap_options = [f"{r['FLIGHT_NUMBER']} ({r['TAIL_NUMBER']})" 
-                                for _, r in available_flights.iterrows()]
-                selected_swap = st.selectbox("Swap tail with:", swap_options, key="swap_select")
+                swap_labels = {r['FLIGHT_KEY']: f"{r['FLIGHT_NUMBER']} ({r['TAIL_NUMBER']})"
+                               for _, r in available_flights.iterrows()}
+                swap_col1, swap_col2 = st.columns([3, 1])
+                with swap_col1:
+                    swap_flight_key = st.selectbox(
+                        "Swap tail with:", list(swap_labels), format_func=swap_labels.get, key="swap_select"
+                    )
+                with swap_col2:
+                    if not swap_pager.exhausted and st.button("More flights", key="more_swap_flights"):
+                        swap_pager.load_next()
+                        st.rerun()
+                swap_pager.prefetch()
                 
                 if st.button("Simulate Tail Swap", key="sim_tail"):
-                    swap_flight_num = selected_swap.split(' ')[0]
-                    swap_flight_key = available_flights[
-                        available_flights['FLIGHT_NUMBER'] == swap_flight_num
-                    ].iloc[0]['FLIGHT_KEY']
                     
                     with st.spinner("Running tail swap simulation..."):
                         try:
-                            results = session.sql(f"""
-                                SELECT * FROM TABLE(
-                                    IROP_GNN_RISK.IROP_MART.SIMULATE_TAIL_SWAP(
-                                        '{st.session_state.selected_flight}',
-                                        '{swap_flight_key}'
-                                    )
-                                )
-                            """).to_pandas()
+                            results = run_scenario(
+                                "simulate_tail_swap",
+                                flight_key_a=st.session_state.selected_flight,
+                                flight_key_b=swap_flight_key
+                            )
                             
                             if not results.empty:
                                 st.dataframe(results, use_container_width=True, hide_index=True)
@@ -399,6 +476,7 @@ with tab3:
                                     st.metric("Delta Revenue Risk", f"${total_delta_rev:+,.0f}")
                                 if 'SWAP_BENEFIT' in results.columns:
                                     st.info(f"Swap Assessment: {results.iloc[0]['SWAP_BENEFIT']}")
+                            show_capacity_conflicts(swaps=[(st.session_state.selected_flight, swap_flight_key)])
                         except Exception as e:
                             st.error(f"Simulation error: {str(e)}")
             else:
@@ -412,3 +490,31 @@ st.sidebar.markdown("---")
 if st.sidebar.button("Clear Chat History"):
     st.session_state.messages = []
     st.rerun()
+
+with st.sidebar.expander("Copilot LLM Stats"):
+    response_cache = get_response_cache()
+    lookups = response_cache.hits + response_cache.misses
+    st.metric("Response Cache Hit Rate", f"{response_cache.hits / lookups:.0%}" if lookups else "N/A")
+    latency = st.session_state.copilot_metrics.percentiles('LATENCY_MS')
+    lat_col1, lat_col2 = st.columns(2)
+    lat_col1.metric("p50 latency", f"{latency['p50']:,.0f} ms" if pd.notna(latency['p50']) else "N/A")
+    lat_col2.metric("p95 latency", f"{latency['p95']:,.0f} ms" if pd.notna(latency['p95']) else "N/A")
+    turns_df = st.session_state.copilot_metrics.to_frame()
+    if not turns_df.empty:
+        st.dataframe(turns_df, use_container_width=True, hide_index=True)
+
+with st.sidebar.expander("Scenario Cache Stats"):
+    scenario_cache = get_scenario_cache()
+    runs = scenario_cache.hits + scenario_cache.table_hits + scenario_cache.misses
+    st.metric("Scenario Reuse Rate",
+              f"{(scenario_cache.hits + scenario_cache.table_hits) / runs:.0%}" if runs else "N/A")
+    st.caption(f"{scenario_cache.hits} memory · {scenario_cache.table_hits} stored · "
+               f"{scenario_cache.misses} computed · {scenario_cache.revalidated} revalidated")
+
+with st.sidebar.expander("Query Cache Stats"):
+    if st.button("Refresh from query history", key="refresh_query_stats"):
+        query_stats.refresh(session)
+    st.metric("Result Cache Hit Rate", f"{query_stats.hit_rate:.0%}")
+    stats_df = query_stats.to_frame()
+    if not stats_df.empty:
+        st.dataframe(stats_df, use_container_width=True, hide_index=True)
@@ -3,6 +3,10 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from snowflake.snowpark.context import get_active_session
+from utils.projection import ProjectionService, umap_available
+from utils.ann import EmbeddingIndexService
+
+MAX_EMBEDDING_POINTS = 5000
 
 st.set_page_config(page_title="Model Diagnostics", page_icon="📊", layout="wide")
 
@@ -12,6 +16,14 @@ def get_session():
 
 session = get_session()
 
+@st.cache_resource
+def get_projection_service():
+    return ProjectionService(session)
+
+@st.cache_resource
+def get_embedding_index():
+    return EmbeddingIndexService(session)
+
 st.title("Model Diagnostics")
 st.markdown("ML model performance metrics and explainability for technical validation")
 
@@ -22,17 +34,27 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader("Feature Importance (SHAP Attribution)")
     
+    models = session.sql("""
+        SELECT DISTINCT MODEL_NAME
+        FROM IROP_GNN_RISK.IROP_MART.FEATURE_IMPORTANCE_DAILY
+        WHERE SCORE_DATE = (SELECT MAX(SCORE_DATE) FROM IROP_GNN_RISK.IROP_MART.FEATURE_IMPORTANCE_DAILY)
+        ORDER BY MODEL_NAME
+    """).to_pandas()
+    model_options = models['MODEL_NAME'].tolist() if not models.empty else []
+    selected_model = st.selectbox("Model", model_options, key="shap_model") if model_options else None
+    
     shap_data = session.sql("""
         SELECT 
-            f.key as feature,
-            AVG(ABS(f.value::FLOAT)) as avg_importance
-        FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK,
-             LATERAL FLATTEN(input => SHAP_ATTRIBUTION) f
-        WHERE FLIGHT_DATE = CURRENT_DATE AND SHAP_ATTRIBUTION IS NOT NULL
-        GROUP BY f.key
-        ORDER BY avg_importance DESC
+            FEATURE,
+            MEAN_ABS_SHAP as AVG_IMPORTANCE
+        FROM IROP_GNN_RISK.IROP_MART.FEATURE_IMPORTANCE_DAILY
+        WHERE MODEL_NAME = ?
+          AND SCORE_DATE = (
+              SELECT MAX(SCORE_DATE) FROM IROP_GNN_RISK.IROP_MART.FEATURE_IMPORTANCE_DAILY WHERE MODEL_NAME = ?
+          )
+        ORDER BY MEAN_ABS_SHAP DESC
         LIMIT 15
-    """).to_pandas()
+    """, params=[selected_model, selected_model]).to_pandas() if selected_model else pd.DataFrame()
     
     if not shap_data.empty:
         fig = px.bar(
@@ -52,45 +74,63 @@ with col1:
         )
         st.plotly_chart(fig, use_container_width=True)
     else:
-        st.warning("No SHAP attribution data available. Ensure SHAP_ATTRIBUTION column is populated.")
+        st.warning("No SHAP attribution data available. Run the scoring notebooks to populate FEATURE_IMPORTANCE_DAILY.")
 
 with col2:
     st.subheader("GNN Embedding Space")
     
-    embedding_data = session.sql("""
-        SELECT 
-            FLIGHT_KEY,
-            RISK_BAND,
-            GNN_EMBEDDING[0]::FLOAT as dim1,
-            GNN_EMBEDDING[1]::FLOAT as dim2,
-            ROUND(FLIGHT_RISK_SCORE_0_100, 1) as risk_score,
-            MISCONNECT_PAX_AT_RISK as pax_at_risk
-        FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK
-        WHERE FLIGHT_DATE = CURRENT_DATE AND GNN_EMBEDDING IS NOT NULL
-        LIMIT 100
-    """).to_pandas()
+    methods = ['PCA'] + (['UMAP'] if umap_available() else [])
+    method = st.radio("Projection", methods, horizontal=True, key="embedding_projection")
+    projection = get_projection_service().get(method.lower())
+    embedding_data = projection.sample(MAX_EMBEDDING_POINTS) if projection is not None else pd.DataFrame()
     
     if not embedding_data.empty:
         fig = px.scatter(
             embedding_data, 
-            x='DIM1', 
-            y='DIM2', 
+            x='X', 
+            y='Y', 
             color='RISK_BAND',
             hover_data=['FLIGHT_KEY', 'RISK_SCORE', 'PAX_AT_RISK'],
-            color_discrete_map={'High': '#FF4136', 'Medium': '#FF851B', 'Low': '#2ECC40'}
+            color_discrete_map={'High': '#FF4136', 'Medium': '#FF851B', 'Low': '#2ECC40'},
+            render_mode='webgl'
         )
+        fig.update_traces(marker=dict(size=4, opacity=0.7))
+        if projection.method == 'pca':
+            x_title = f"PC1 ({projection.explained_variance[0]:.0%} var)"
+            y_title = f"PC2 ({projection.explained_variance[1]:.0%} var)" if len(projection.explained_variance) > 1 else "PC2"
+        else:
+            x_title, y_title = 'UMAP 1', 'UMAP 2'
         fig.update_layout(
             height=400,
             margin=dict(l=0, r=0, t=10, b=0),
-            xaxis_title='Embedding Dimension 1',
-            yaxis_title='Embedding Dimension 2'
+            xaxis_title=x_title,
+            yaxis_title=y_title
         )
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(
+            f"{len(embedding_data):,} of {len(projection.points):,} flights shown · model {projection.model_version} · "
+            f"snapshot {projection.snapshot_ts} · projected in {projection.build_ms:,.0f} ms"
+        )
     else:
         st.warning("No GNN embedding data available. Ensure GNN_EMBEDDING column is populated.")
 
 st.markdown("---")
 
+st.subheader("Nearest Neighbors in Embedding Space")
+
+neighbor_key = st.text_input("Flight key", key="neighbor_flight_key",
+                             placeholder="Enter a FLIGHT_KEY to find the most similar historical flights")
+if neighbor_key:
+    similar = get_embedding_index().similar_flights(neighbor_key.strip(), k=15)
+    if not similar.empty:
+        st.dataframe(similar, use_container_width=True, hide_index=True)
+        index = get_embedding_index()
+        st.caption(f"IVF index over {len(index.index):,} embeddings · model {index.model_version}")
+    else:
+        st.info("No embedding found for that flight key.")
+
+st.markdown("---")
+
 st.subheader("Risk Score Distribution")
 
 dist_data = session.sql("""
@@ -124,6 +164,45 @@ if not dist_data.empty:
 
 st.markdown("---")
 
+st.subheader("GNN vs. Graph-Centrality Baseline")
+
+baseline_data = session.sql("""
+    SELECT 
+        FLIGHT_KEY,
+        GNN_NETWORK_CRITICALITY as GNN_SCORE,
+        BASELINE_NETWORK_CRITICALITY as BASELINE_SCORE,
+        RISK_BAND
+    FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK
+    WHERE FLIGHT_DATE = CURRENT_DATE
+      AND BASELINE_NETWORK_CRITICALITY > 0
+""").to_pandas()
+
+if not baseline_data.empty:
+    fig = px.scatter(
+        baseline_data,
+        x='BASELINE_SCORE',
+        y='GNN_SCORE',
+        color='RISK_BAND',
+        hover_data=['FLIGHT_KEY'],
+        color_discrete_map={'High': '#FF4136', 'Medium': '#FF851B', 'Low': '#2ECC40'},
+        render_mode='webgl'
+    )
+    fig.update_traces(marker=dict(size=5, opacity=0.7))
+    fig.update_layout(
+        height=300,
+        margin=dict(l=0, r=0, t=10, b=0),
+        xaxis_title='Baseline (PageRank / betweenness / reach percentile)',
+        yaxis_title='GNN Network Criticality'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    rank_corr = baseline_data['GNN_SCORE'].corr(baseline_data['BASELINE_SCORE'], method='spearman')
+    st.caption(f"Spearman rank correlation {rank_corr:.2f} over {len(baseline_data):,} flights · "
+               f"baseline from ML_PROCESSING.FLIGHT_CENTRALITY (./run.sh centrality)")
+else:
+    st.info("No centrality baseline yet. Run './run.sh centrality' to populate BASELINE_NETWORK_CRITICALITY.")
+
+st.markdown("---")
+
 st.subheader("Sample Predictions with Risk Drivers")
 
 sample_predictions = session.sql("""
@@ -137,7 +216,8 @@ sample_predictions = session.sql("""
         ROUND(AIRPORT_ENV_COMPONENT, 2) as AIRPORT,
         ROUND(PAX_COMPONENT, 2) as PAX,
         ROUND(MAINTENANCE_COMPONENT, 2) as MAINT,
-        ROUND(GNN_NETWORK_CRITICALITY, 1) as GNN_SCORE
+        ROUND(GNN_NETWORK_CRITICALITY, 1) as GNN_SCORE,
+        ROUND(BASELINE_NETWORK_CRITICALITY, 1) as BASELINE_SCORE
     FROM IROP_GNN_RISK.IROP_MART.FLIGHT_RISK
     WHERE FLIGHT_DATE = CURRENT_DATE
     ORDER BY FLIGHT_RISK_SCORE_0_100 DESC
@@ -164,7 +244,7 @@ with model_col1:
 
 with model_col2:
     if not embedding_data.empty:
-        st.metric("Embeddings Available", f"{len(embedding_data)}")
+        st.metric("Embeddings Available", f"{len(projection.points):,}")
     else:
         st.metric("Embeddings Available", "0")
 
@@ -0,0 +1,313 @@
+"""
+Approximate nearest-neighbour search over GNN flight embeddings ("flights like this one").
+
+IVFIndex is an in-process inverted-file index: a k-means coarse quantizer
+splits unit-normalised vectors into lists, and a query scans only the
+`n_probe` lists whose centroids are closest. Adds and deletes are O(1) per
+vector, so the index follows new embeddings without a rebuild; it retrains the
+quantizer once it has grown well past the size it was trained on.
+EmbeddingIndexService keeps one index per model version in sync with
+ML_PROCESSING.GNN_FLIGHT_EMBEDDINGS and attaches FLIGHT_INSTANCE outcomes to
+the neighbours it returns.
+"""
+import json
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.query_builder import Query
+
+EMBEDDINGS_TABLE = "IROP_GNN_RISK.ML_PROCESSING.GNN_FLIGHT_EMBEDDINGS"
+FLIGHT_INSTANCE_TABLE = "IROP_GNN_RISK.ATOMIC.FLIGHT_INSTANCE"
+
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.where(norms == 0, 1, norms)
+
+
+def kmeans(X: np.ndarray, k: int, n_iter: int = 10, seed: int = 42) -> np.ndarray:
+    """Spherical k-means with k-means++ seeding; returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(X)))
+    centroids = [X[rng.integers(len(X))]]
+    closest = 1 - X @ centroids[0]
+    for _ in range(1, k):
+        probs = np.maximum(closest, 0)
+        probs = probs / probs.sum() if probs.sum() > 0 else None
+        centroids.append(X[rng.choice(len(X), p=probs)])
+        closest = np.minimum(closest, 1 - X @ centroids[-1])
+    C = np.vstack(centroids)
+    for _ in range(n_iter):
+        assign = np.argmax(X @ C.T, axis=1)
+        sums = np.zeros_like(C)
+        np.add.at(sums, assign, X)
+        empty = np.bincount(assign, minlength=k) == 0
+        sums[empty] = C[empty]
+        C = _normalize(sums)
+    return C
+
+
+class _InvertedList:
+    """Growable (ids, vectors) block with swap-remove deletes."""
+
+    def __init__(self, dim: int):
+        self.ids: List[Hashable] = []
+        self.vectors = np.empty((16, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, id_: Hashable, vector: np.ndarray) -> int:
+        slot = len(self.ids)
+        if slot == len(self.vectors):
+            self.vectors = np.vstack([self.vectors, np.empty_like(self.vectors)])
+        self.vectors[slot] = vector
+        self.ids.append(id_)
+        return slot
+
+    def remove(self, slot: int) -> Optional[Hashable]:
+        """Remove `slot`, returning the id that moved into it (if any)."""
+        last = len(self.ids) - 1
+        moved = None
+        if slot != last:
+            self.vectors[slot] = self.vectors[last]
+            self.ids[slot] = self.ids[last]
+            moved = self.ids[slot]
+        self.ids.pop()
+        return moved
+
+
+class IVFIndex:
+    """Cosine-similarity IVF index with incremental add/delete."""
+
+    def __init__(self, dim: int, n_lists: Optional[int] = None, n_probe: int = 8, retrain_factor: float = 4.0):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.retrain_factor = retrain_factor
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[_InvertedList] = []
+        self.location: Dict[Hashable, Tuple[int, int]] = {}
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.location)
+
+    def __contains__(self, id_: Hashable) -> bool:
+        return id_ in self.location
+
+    def train(self, X: np.ndarray, sample_size: int = 20000, seed: int = 42):
+        X = _normalize(X)
+        # Retraining is gated on growth against the full set, not the k-means sample.
+        self.trained_size = max(len(X), 1)
+        rng = np.random.default_rng(seed)
+        if len(X) > sample_size:
+            X = X[rng.choice(len(X), sample_size, replace=False)]
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+        self.centroids = kmeans(X, n_lists, seed=seed)
+
+    def add(self, ids: Sequence[Hashable], X: np.ndarray):
+        """Insert vectors; an id that is already present is replaced."""
+        X = _normalize(X)
+        if self.centroids is None:
+            self.train(X)
+        if not self.lists:
+            self.lists = [_InvertedList(self.dim) for _ in range(len(self.centroids))]
+        self.delete([i for i in ids if i in self.location])
+        assign = np.argmax(X @ self.centroids.T, axis=1)
+        for id_, vector, list_no in zip(ids, X, assign):
+            self.location[id_] = (int(list_no), self.lists[list_no].append(id_, vector))
+
+    def delete(self, ids: Sequence[Hashable]) -> int:
+        removed = 0
+        for id_ in ids:
+            loc = self.location.pop(id_, None)
+            if loc is None:
+                continue
+            moved = self.lists[loc[0]].remove(loc[1])
+            if moved is not None:
+                self.location[moved] = loc
+            removed += 1
+        return removed
+
+    @property
+    def needs_retrain(self) -> bool:
+        return len(self) > self.retrain_factor * self.trained_size
+
+    def retrain(self):
+        """Re-cluster the current contents and redistribute them across the new lists."""
+        ids = [i for lst in self.lists for i in lst.ids]
+        X = np.vstack([lst.vectors[:len(lst)] for lst in self.lists if len(lst)]) if ids else np.empty((0, self.dim))
+        self.centroids, self.lists, self.location = None, [], {}
+        if ids:
+            self.train(X)
+            self.add(ids, X)
+
+    def get_vector(self, id_: Hashable) -> Optional[np.ndarray]:
+        loc = self.location.get(id_)
+        return None if loc is None else self.lists[loc[0]].vectors[loc[1]]
+
+    def search(self, query: np.ndarray, k: int = 10, n_probe: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """Top-k (id, cosine similarity) among the `n_probe` nearest lists."""
+        if self.centroids is None or not self.location:
+            return []
+        q = _normalize(query)[0]
+        probe = min(n_probe or self.n_probe, len(self.centroids))
+        nearest_lists = np.argpartition(-(self.centroids @ q), probe - 1)[:probe]
+        candidate_ids: List[Hashable] = []
+        blocks = []
+        for list_no in nearest_lists:
+            lst = self.lists[list_no]
+            if len(lst):
+                candidate_ids.extend(lst.ids)
+                blocks.append(lst.vectors[:len(lst)])
+        if not blocks:
+            return []
+        scores = np.vstack(blocks) @ q
+        top = min(k, len(scores))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [(candidate_ids[i], float(scores[i])) for i in best]
+
+
+def embedding_rows_query(model_version: str, after_ts=None) -> Query:
+    seek_sql, params = "", [model_version]
+    if after_ts is not None:
+        seek_sql = "AND SNAPSHOT_TS > ?"
+        params.append(after_ts)
+    return Query(f"""
+        SELECT EMBEDDING_ID, FLIGHT_KEY, SNAPSHOT_TS, GNN_EMBEDDING
+        FROM {EMBEDDINGS_TABLE}
+        WHERE MODEL_VERSION = ? AND GNN_EMBEDDING IS NOT NULL {seek_sql}
+    """, params)
+
+
+def embedding_probe_query(model_version: str) -> Query:
+    return Query(f"""
+        SELECT MAX(SNAPSHOT_TS) as TS, COUNT(*) as CNT
+        FROM {EMBEDDINGS_TABLE}
+        WHERE MODEL_VERSION = ? AND GNN_EMBEDDING IS NOT NULL
+    """, [model_version])
+
+
+def latest_model_version_query() -> Query:
+    return Query(f"""
+        SELECT MODEL_VERSION
+        FROM {EMBEDDINGS_TABLE}
+        WHERE GNN_EMBEDDING IS NOT NULL
+        ORDER BY SNAPSHOT_TS DESC
+        LIMIT 1
+    """)
+
+
+def flight_outcomes_query(flight_keys: Sequence[str]) -> Query:
+    placeholders = ", ".join("?" for _ in flight_keys)
+    return Query(f"""
+        SELECT
+            FLIGHT_KEY,
+            FLIGHT_NUMBER,
+            DEPARTURE_STATION || '-' || ARRIVAL_STATION as ROUTE,
+            FLIGHT_DATE,
+            STATUS,
+            CURRENT_DELAY_DEPARTURE as DEP_DELAY_MIN,
+            CURRENT_DELAY_ARRIVAL as ARR_DELAY_MIN
+        FROM {FLIGHT_INSTANCE_TABLE}
+        WHERE FLIGHT_KEY IN ({placeholders})
+    """, list(flight_keys))
+
+
+class EmbeddingIndexService:
+    """One IVFIndex per model version, kept in sync with GNN_FLIGHT_EMBEDDINGS."""
+
+    def __init__(self, session, min_interval_s: float = 60.0, n_probe: int = 8):
+        self.session = session
+        self.min_interval_s = min_interval_s
+        self.n_probe = n_probe
+        self.model_version: Optional[str] = None
+        self.index: Optional[IVFIndex] = None
+        self.meta: Dict[str, Tuple[str, object]] = {}
+        self.latest_by_flight: Dict[str, str] = {}
+        self.watermark = None
+        self.last_sync_ms: Optional[float] = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self, query: Query) -> pd.DataFrame:
+        return self.session.sql(query.sql, params=query.params).to_pandas()
+
+    def _ingest(self, rows: pd.DataFrame):
+        if rows.empty:
+            return
+        X = np.asarray([json.loads(v) if isinstance(v, str) else v for v in rows['GNN_EMBEDDING']], dtype=np.float32)
+        if self.index is None:
+            self.index = IVFIndex(X.shape[1], n_probe=self.n_probe)
+        ids = rows['EMBEDDING_ID'].tolist()
+        self.index.add(ids, X)
+        for id_, flight_key, ts in zip(ids, rows['FLIGHT_KEY'], rows['SNAPSHOT_TS']):
+            self.meta[id_] = (flight_key, ts)
+            current = self.latest_by_flight.get(flight_key)
+            if current is None or self.meta[current][1] <= ts:
+                self.latest_by_flight[flight_key] = id_
+        if self.index.needs_retrain:
+            self.index.retrain()
+
+    def delete(self, embedding_ids: Sequence[str]) -> int:
+        with self._lock:
+            removed = self.index.delete(embedding_ids) if self.index is not None else 0
+            for id_ in embedding_ids:
+                flight_key, _ = self.meta.pop(id_, (None, None))
+                if flight_key is not None and self.latest_by_flight.get(flight_key) == id_:
+                    del self.latest_by_flight[flight_key]
+            return removed
+
+    def sync(self, force: bool = False) -> IVFIndex:
+        """Pull embeddings newer than the watermark; rebuild if rows vanished or the model changed."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.index is not None and now - self._synced_at < self.min_interval_s:
+                return self.index
+            self._synced_at = now
+            start = time.perf_counter()
+            rows = self.session.sql(latest_model_version_query().sql).collect()
+            model_version = rows[0]['MODEL_VERSION'] if rows else None
+            if model_version != self.model_version:
+                self.model_version, self.index, self.meta, self.latest_by_flight, self.watermark = (
+                    model_version, None, {}, {}, None
+                )
+            if model_version is None:
+                return self.index
+            probe_query = embedding_probe_query(model_version)
+            probe = self.session.sql(probe_query.sql, params=probe_query.params).collect()[0]
+            if probe['TS'] != self.watermark or probe['CNT'] != len(self.meta):
+                self._ingest(self._fetch(embedding_rows_query(model_version, self.watermark)))
+                if len(self.meta) != probe['CNT']:
+                    self.index, self.meta, self.latest_by_flight = None, {}, {}
+                    self._ingest(self._fetch(embedding_rows_query(model_version)))
+                self.watermark = probe['TS']
+            self.last_sync_ms = (time.perf_counter() - start) * 1000
+            return self.index
+
+    def similar_flights(self, flight_key: str, k: int = 10) -> pd.DataFrame:
+        """The k most similar other flights across history, with their recorded outcomes."""
+        self.sync()
+        embedding_id = self.latest_by_flight.get(flight_key)
+        if self.index is None or embedding_id is None:
+            return pd.DataFrame()
+        hits = [
+            (id_, score) for id_, score in self.index.search(self.index.get_vector(embedding_id), k=k * 3)
+            if self.meta[id_][0] != flight_key
+        ][:k]
+        if not hits:
+            return pd.DataFrame()
+        neighbours = pd.DataFrame({
+            'FLIGHT_KEY': [self.meta[id_][0] for id_, _ in hits],
+            'SNAPSHOT_TS': [self.meta[id_][1] for id_, _ in hits],
+            'SIMILARITY': [round(score, 3) for _, score in hits],
+        })
+        outcomes = self._fetch(flight_outcomes_query(neighbours['FLIGHT_KEY'].unique().tolist()))
+        return neighbours.merge(outcomes, on='FLIGHT_KEY', how='left')
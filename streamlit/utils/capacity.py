@@ -0,0 +1,373 @@
+"""
+Gate and station capacity conflicts for what-if recovery plans.
+
+Every departure holds a gate at its departure station from the inbound
+tail's ETA (AIRCRAFT_ROTATION.PREV_FLIGHT_KEY) to its own ETD. With no
+inbound at that station, the hold starts `default_turn_minutes` before the
+ETD. A tail's last arrival holds a gate for `default_turn_minutes` after its
+ETA. ETD/ETA use the larger of the current delay and the latest
+DELAY_PREDICTIONS row.
+
+StationCapacityIndex keeps those holds as sweep-line indexes: +1/-1 events
+sorted once by a composite (station, time) key, with the running occupancy
+after each event. One index covers all gates and one covers widebody
+holds. Occupancy at any instant is one searchsorted. A candidate plan
+(extra delay on some flights and/or tail swaps) only rewrites the holds of
+the flights it touches and the next legs of their tails. Each of these is
+checked against the indexed occupancy around it rather than re-sweeping
+the station:
+
+- GATE_CAPACITY / WIDEBODY_CAPACITY: occupancy above AIRPORT_CAPABILITY
+  GATE_COUNT / WIDEBODY_GATE_COUNT, and above what the base plan had there.
+- GATE_DOUBLE_BOOKED: a moved hold overlaps another flight on the same
+  GATE_ID that it did not overlap before.
+- CURFEW: a moved ETD or ETA falls inside the station's local curfew
+  window when it did not before.
+
+StationCapacityService rebuilds the index when FLIGHT_INSTANCE or the
+delay predictions move, at most every `min_interval_s`.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.query_builder import Query
+
+FLIGHT_INSTANCE_TABLE = "IROP_GNN_RISK.ATOMIC.FLIGHT_INSTANCE"
+ROTATION_TABLE = "IROP_GNN_RISK.ATOMIC.AIRCRAFT_ROTATION"
+AIRPORT_TABLE = "IROP_GNN_RISK.ATOMIC.AIRPORT_CAPABILITY"
+DELAY_PREDICTIONS_TABLE = "IROP_GNN_RISK.ML_PROCESSING.DELAY_PREDICTIONS"
+WIDEBODY_PREFIXES = ('A330', 'A340', 'A350', 'A380', 'B747', 'B767', 'B777', 'B787')
+CONFLICT_COLUMNS = ['CONFLICT_TYPE', 'STATION_CODE', 'FLIGHT_KEY', 'OTHER_FLIGHT_KEY', 'GATE_ID', 'AT_UTC',
+                    'OCCUPANCY', 'CAPACITY', 'DETAIL']
+
+
+@dataclass(frozen=True)
+class CapacityConfig:
+    default_turn_minutes: float = 60.0
+    min_turn_minutes: float = 40.0
+    max_propagation_legs: int = 8
+
+
+DEFAULT_CONFIG = CapacityConfig()
+
+
+def capacity_flights_query() -> Query:
+    return Query(f"""
+        WITH predicted AS (
+            SELECT FLIGHT_KEY, PREDICTED_DELAY_MINUTES
+            FROM {DELAY_PREDICTIONS_TABLE}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY FLIGHT_KEY ORDER BY SNAPSHOT_TS DESC) = 1
+        )
+        SELECT
+            f.FLIGHT_KEY, f.DEPARTURE_STATION, f.ARRIVAL_STATION, f.SCHED_DEP_UTC, f.SCHED_ARR_UTC,
+            f.GATE_ID, f.AIRCRAFT_FLEET_TYPE, r.PREV_FLIGHT_KEY, r.NEXT_FLIGHT_KEY,
+            GREATEST(COALESCE(f.CURRENT_DELAY_DEPARTURE, 0), COALESCE(p.PREDICTED_DELAY_MINUTES, 0)) AS DEP_DELAY,
+            GREATEST(COALESCE(f.CURRENT_DELAY_ARRIVAL, 0), COALESCE(p.PREDICTED_DELAY_MINUTES, 0)) AS ARR_DELAY
+        FROM {FLIGHT_INSTANCE_TABLE} f
+        LEFT JOIN {ROTATION_TABLE} r ON r.FLIGHT_KEY = f.FLIGHT_KEY
+        LEFT JOIN predicted p ON p.FLIGHT_KEY = f.FLIGHT_KEY
+    """)
+
+
+def capacity_airports_query() -> Query:
+    return Query(f"""
+        SELECT STATION_CODE, GATE_COUNT, WIDEBODY_GATE_COUNT, CURFEW_START_LOCAL, CURFEW_END_LOCAL,
+               TIMEZONE_OFFSET_UTC
+        FROM {AIRPORT_TABLE}
+    """)
+
+
+def capacity_probe_query() -> Query:
+    return Query(f"""
+        SELECT
+            (SELECT COUNT(*) FROM {FLIGHT_INSTANCE_TABLE}) AS FLIGHTS,
+            (SELECT SUM(CURRENT_DELAY_DEPARTURE) + SUM(CURRENT_DELAY_ARRIVAL) FROM {FLIGHT_INSTANCE_TABLE}) AS DELAY_SUM,
+            (SELECT MAX(SNAPSHOT_TS) FROM {DELAY_PREDICTIONS_TABLE}) AS PREDICTED_TS
+    """)
+
+
+def _minutes(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[s]').astype(np.int64) / 60.0
+
+
+def _minute_of_day(values) -> np.ndarray:
+    """'HH:MM[:SS]' strings or datetime.time values as minutes after midnight; NaN when missing."""
+    out = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        hours, minutes = str(value).split(':')[:2]
+        out[i] = int(hours) * 60 + int(minutes)
+    return out
+
+
+class _Sweep:
+    """Occupancy after each +1/-1 event, events sorted by (station, time); ends sort before starts."""
+
+    def __init__(self, station: np.ndarray, start: np.ndarray, end: np.ndarray, stride: float):
+        self.stride = stride
+        keys = np.concatenate([station * stride + start, station * stride + end])
+        steps = np.concatenate([np.ones(len(start), dtype=np.int64), -np.ones(len(end), dtype=np.int64)])
+        order = np.lexsort((steps, keys))
+        self.keys, self.steps = keys[order], steps[order]
+        # Every hold opens and closes at one station, so the running level is back to zero between stations.
+        self.level = np.cumsum(self.steps)
+
+    def at(self, station: int, times: np.ndarray) -> np.ndarray:
+        """Occupancy at each time, holds being half-open [start, end)."""
+        pos = np.searchsorted(self.keys, station * self.stride + np.asarray(times), side='right') - 1
+        inside = (pos >= 0) & (self.keys[np.maximum(pos, 0)] >= station * self.stride)
+        return np.where(inside, self.level[np.maximum(pos, 0)], 0)
+
+    def times_between(self, station: int, lo: float, hi: float) -> np.ndarray:
+        a = np.searchsorted(self.keys, station * self.stride + lo, side='left')
+        b = np.searchsorted(self.keys, station * self.stride + hi, side='left')
+        return self.keys[a:b] - station * self.stride
+
+
+class StationCapacityIndex:
+    """Predicted gate holds per station with sweep-line occupancy indexes."""
+
+    def __init__(self, flights: pd.DataFrame, airports: pd.DataFrame, config: CapacityConfig = DEFAULT_CONFIG):
+        self.config = config
+        self.keys = pd.Index(flights['FLIGHT_KEY'])
+        n = len(self.keys)
+        self.codes = pd.Index(sorted(set(airports['STATION_CODE']) | set(flights['DEPARTURE_STATION'])
+                                     | set(flights['ARRIVAL_STATION'])))
+        self.dep_station = self.codes.get_indexer(flights['DEPARTURE_STATION'])
+        self.arr_station = self.codes.get_indexer(flights['ARRIVAL_STATION'])
+        self.etd = _minutes(flights['SCHED_DEP_UTC']) + flights['DEP_DELAY'].fillna(0).to_numpy(dtype=np.float64)
+        self.eta = _minutes(flights['SCHED_ARR_UTC']) + flights['ARR_DELAY'].fillna(0).to_numpy(dtype=np.float64)
+        self.prev = self.keys.get_indexer(flights['PREV_FLIGHT_KEY'])
+        self.next = self.keys.get_indexer(flights['NEXT_FLIGHT_KEY'])
+        fleet = flights['AIRCRAFT_FLEET_TYPE'].fillna('').astype(str)
+        self.widebody = fleet.str.upper().str.replace('-', '', regex=False).str.startswith(WIDEBODY_PREFIXES).to_numpy()
+        gates = flights['DEPARTURE_STATION'].astype(str) + '/' + flights['GATE_ID'].astype(str)
+        self.gate_ids = flights['GATE_ID'].to_numpy()
+        self.gate = np.where(flights['GATE_ID'].notna().to_numpy(), pd.factorize(gates)[0], -1)
+
+        a = airports.set_index('STATION_CODE').reindex(self.codes)
+        self.gate_count = a['GATE_COUNT'].to_numpy(dtype=np.float64)
+        self.widebody_count = a['WIDEBODY_GATE_COUNT'].to_numpy(dtype=np.float64)
+        self.utc_offset = a['TIMEZONE_OFFSET_UTC'].fillna(0).to_numpy(dtype=np.float64) * 60
+        self.curfew_start = _minute_of_day(a['CURFEW_START_LOCAL'].tolist())
+        self.curfew_end = _minute_of_day(a['CURFEW_END_LOCAL'].tolist())
+
+        # Hold h < n is flight h's departure turn; hold n + j is terminal flight j's last arrival.
+        self.terminal = np.flatnonzero(self.next < 0)
+        station, start, end = self._holds(np.arange(n), self.etd, self.eta, self.prev)
+        t_station, t_start, t_end = self._terminal_holds(self.terminal, self.eta)
+        self.hold_station = np.concatenate([station, t_station])
+        self.hold_start = np.concatenate([start, t_start])
+        self.hold_end = np.concatenate([end, t_end])
+        self.hold_widebody = np.concatenate([self.widebody, self.widebody[self.terminal]])
+        self.hold_gate = np.concatenate([self.gate, np.full(len(self.terminal), -1)])
+
+        times = np.concatenate([self.hold_start, self.hold_end])
+        self.origin = float(times.min()) if len(times) else 0.0
+        self.stride = float(times.max() - self.origin) + 10 ** 6 if len(times) else 10 ** 6
+        rel_start, rel_end = self.hold_start - self.origin, self.hold_end - self.origin
+        self.all = _Sweep(self.hold_station, rel_start, rel_end, self.stride)
+        wb = self.hold_widebody
+        self.wide = _Sweep(self.hold_station[wb], rel_start[wb], rel_end[wb], self.stride)
+
+        # Gate holds grouped by gate, so a moved hold only compares against its own gate.
+        holds = np.flatnonzero(self.hold_gate >= 0)
+        self._gate_holds = holds[np.argsort(self.hold_gate[holds], kind='stable')]
+        self._gate_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.hold_gate[holds],
+                                                                        minlength=self.gate.max() + 1 if n else 0))])
+
+    def _holds(self, flights: np.ndarray, etd: np.ndarray, eta: np.ndarray, prev: np.ndarray):
+        """(station, start, end) of each flight's departure turn, given ETD/ETA arrays and inbound tails."""
+        inbound = prev[flights]
+        turned = (inbound >= 0) & (self.arr_station[np.maximum(inbound, 0)] == self.dep_station[flights])
+        start = np.where(turned, eta[np.maximum(inbound, 0)], etd[flights] - self.config.default_turn_minutes)
+        return self.dep_station[flights], np.minimum(start, etd[flights]), etd[flights]
+
+    def _terminal_holds(self, flights: np.ndarray, eta: np.ndarray):
+        return self.arr_station[flights], eta[flights], eta[flights] + self.config.default_turn_minutes
+
+    def _in_curfew(self, station: np.ndarray, utc_minutes: np.ndarray) -> np.ndarray:
+        local = np.mod(utc_minutes + self.utc_offset[station], 1440)
+        start, end = self.curfew_start[station], self.curfew_end[station]
+        wraps = start > end
+        inside = np.where(wraps, (local >= start) | (local < end), (local >= start) & (local < end))
+        return inside & ~np.isnan(start) & ~np.isnan(end)
+
+    def _at(self, minutes: float):
+        return pd.Timestamp(int(round(minutes * 60)), unit='s')
+
+    def _plan(self, delays: Mapping[str, float], swaps: Sequence[Tuple[str, str]]):
+        """New ETD/ETA/inbound arrays for the flights a plan touches, propagated down their tails."""
+        etd, eta, prev, widebody = self.etd.copy(), self.eta.copy(), self.prev.copy(), self.widebody.copy()
+        touched, seeds = set(), []
+        for key, minutes in delays.items():
+            f = self.keys.get_loc(key)
+            etd[f] += minutes
+            eta[f] += minutes
+            touched.add(f)
+            seeds.append(f)
+        for key_a, key_b in swaps:
+            a, b = self.keys.get_loc(key_a), self.keys.get_loc(key_b)
+            prev[a], prev[b] = self.prev[b], self.prev[a]
+            widebody[a], widebody[b] = self.widebody[b], self.widebody[a]
+            for f in (a, b):
+                if prev[f] >= 0:
+                    push = eta[prev[f]] + self.config.min_turn_minutes - etd[f]
+                    if push > 0:
+                        etd[f] += push
+                        eta[f] += push
+                touched.add(f)
+                seeds.append(f)
+        for f in seeds:
+            for _ in range(self.config.max_propagation_legs):
+                g = self.next[f]
+                if g < 0:
+                    break
+                touched.add(g)
+                push = eta[f] + self.config.min_turn_minutes - etd[g]
+                if push <= 0:
+                    break
+                etd[g] += push
+                eta[g] += push
+                f = g
+        return np.array(sorted(touched), dtype=np.int64), etd, eta, prev, widebody
+
+    def what_if(self, delays: Optional[Mapping[str, float]] = None,
+                swaps: Sequence[Tuple[str, str]] = ()) -> pd.DataFrame:
+        """Conflicts a plan creates or worsens: extra delay minutes by FLIGHT_KEY and/or (a, b) tail swaps."""
+        touched, etd, eta, prev, widebody = self._plan(dict(delays or {}), list(swaps))
+        n = len(self.keys)
+        # Departure holds of touched flights and of the legs their tails fly next; terminal holds they own.
+        nxt = self.next[touched]
+        flights = np.unique(np.concatenate([touched, nxt[nxt >= 0]]))
+        terminals = touched[self.next[touched] < 0]
+        station, start, end = self._holds(flights, etd, eta, prev)
+        t_station, t_start, t_end = self._terminal_holds(terminals, eta)
+        ids = np.concatenate([flights, n + np.searchsorted(self.terminal, terminals)])
+        new_station = np.concatenate([station, t_station])
+        new_start, new_end = np.concatenate([start, t_start]), np.concatenate([end, t_end])
+        new_wide = np.concatenate([widebody[flights], widebody[terminals]])
+        owner = np.concatenate([flights, terminals])
+
+        rows: List[Dict] = []
+        for kind, sweep, wide_only, capacity in (('GATE_CAPACITY', self.all, False, self.gate_count),
+                                                 ('WIDEBODY_CAPACITY', self.wide, True, self.widebody_count)):
+            for s in np.unique(new_station):
+                mine = (new_station == s) & (new_wide if wide_only else True)
+                old = ids[(self.hold_station[ids] == s) & (self.hold_widebody[ids] if wide_only else True)]
+                if not mine.any() or np.isnan(capacity[s]):
+                    continue
+                lo, hi = new_start[mine].min() - self.origin, new_end[mine].max() - self.origin
+                points = np.unique(np.concatenate([sweep.times_between(s, lo, hi), new_start[mine] - self.origin]))
+                points = points[(points >= lo) & (points < hi)]
+                base = sweep.at(s, points)
+                t = points[:, None]
+                added = ((new_start[mine] - self.origin <= t) & (t < new_end[mine] - self.origin)).sum(axis=1)
+                removed = ((self.hold_start[old] - self.origin <= t) & (t < self.hold_end[old] - self.origin)).sum(axis=1)
+                level = base + added - removed
+                worse = (level > capacity[s]) & (level > base)
+                if not worse.any():
+                    continue
+                peak = np.flatnonzero(worse)[np.argmax(level[worse])]
+                at = points[peak] + self.origin
+                covering = owner[mine][(new_start[mine] <= at) & (at < new_end[mine])]
+                rows.append({'CONFLICT_TYPE': kind, 'STATION_CODE': self.codes[s],
+                             'FLIGHT_KEY': self.keys[covering[0]] if len(covering) else None,
+                             'OTHER_FLIGHT_KEY': None, 'GATE_ID': None, 'AT_UTC': self._at(at),
+                             'OCCUPANCY': int(level[peak]), 'CAPACITY': int(capacity[s]),
+                             'DETAIL': f"{int(level[peak])} holds for {int(capacity[s])} gates "
+                                       f"(base plan {int(base[peak])})"})
+
+        moved = dict(zip(ids.tolist(), zip(new_start, new_end)))
+        for h in ids[ids < n]:
+            g = self.hold_gate[h]
+            if g < 0:
+                continue
+            s, e = moved[h]
+            for other in self._gate_holds[self._gate_offsets[g]:self._gate_offsets[g + 1]]:
+                if other == h or (other in moved and other < h):
+                    continue
+                s2, e2 = moved.get(other, (self.hold_start[other], self.hold_end[other]))
+                was = self.hold_start[h] < self.hold_end[other] and self.hold_start[other] < self.hold_end[h]
+                if s < e2 and s2 < e and not was:
+                    rows.append({'CONFLICT_TYPE': 'GATE_DOUBLE_BOOKED', 'STATION_CODE': self.codes[self.hold_station[h]],
+                                 'FLIGHT_KEY': self.keys[h], 'OTHER_FLIGHT_KEY': self.keys[other],
+                                 'GATE_ID': self.gate_ids[h], 'AT_UTC': self._at(max(s, s2)),
+                                 'OCCUPANCY': 2, 'CAPACITY': 1,
+                                 'DETAIL': f"Gate {self.gate_ids[h]} held until {self._at(min(e, e2)):%H:%M}Z"})
+
+        for label, stations, new, old in (('departure', self.dep_station, etd, self.etd),
+                                          ('arrival', self.arr_station, eta, self.eta)):
+            now = self._in_curfew(stations[touched], new[touched])
+            before = self._in_curfew(stations[touched], old[touched])
+            for f in touched[now & ~before]:
+                rows.append({'CONFLICT_TYPE': 'CURFEW', 'STATION_CODE': self.codes[stations[f]],
+                             'FLIGHT_KEY': self.keys[f], 'OTHER_FLIGHT_KEY': None, 'GATE_ID': None,
+                             'AT_UTC': self._at(new[f]), 'OCCUPANCY': None, 'CAPACITY': None,
+                             'DETAIL': f"Projected {label} inside the local curfew"})
+        return pd.DataFrame(rows, columns=CONFLICT_COLUMNS)
+
+    def conflicts(self) -> pd.DataFrame:
+        """Stations whose base-plan occupancy already exceeds gate or widebody-gate capacity."""
+        rows = []
+        for kind, sweep, capacity in (('GATE_CAPACITY', self.all, self.gate_count),
+                                      ('WIDEBODY_CAPACITY', self.wide, self.widebody_count)):
+            station = np.floor(sweep.keys / self.stride).astype(np.int64)
+            over = sweep.level > np.nan_to_num(capacity[station], nan=np.inf)
+            for s in np.unique(station[over]):
+                at = np.flatnonzero(over & (station == s))
+                peak = at[np.argmax(sweep.level[at])]
+                rows.append({'CONFLICT_TYPE': kind, 'STATION_CODE': self.codes[s], 'FLIGHT_KEY': None,
+                             'OTHER_FLIGHT_KEY': None, 'GATE_ID': None,
+                             'AT_UTC': self._at(sweep.keys[peak] - s * self.stride + self.origin),
+                             'OCCUPANCY': int(sweep.level[peak]), 'CAPACITY': int(capacity[s]),
+                             'DETAIL': f"Over capacity at {len(at)} events"})
+        return pd.DataFrame(rows, columns=CONFLICT_COLUMNS)
+
+
+class StationCapacityService:
+    """A StationCapacityIndex rebuilt when flights or delay predictions change."""
+
+    def __init__(self, session, min_interval_s: float = 60.0, config: CapacityConfig = DEFAULT_CONFIG):
+        self.session = session
+        self.min_interval_s = min_interval_s
+        self.config = config
+        self.index: Optional[StationCapacityIndex] = None
+        self.watermark = None
+        self.last_build_ms: Optional[float] = None
+        self.last_query_ms: Optional[float] = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self, query: Query) -> pd.DataFrame:
+        return self.session.sql(query.sql, params=query.params).to_pandas()
+
+    def sync(self, force: bool = False) -> StationCapacityIndex:
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.index is not None and now - self._synced_at < self.min_interval_s:
+                return self.index
+            self._synced_at = now
+            probe = self.session.sql(capacity_probe_query().sql).collect()[0]
+            watermark = (probe['FLIGHTS'], probe['DELAY_SUM'], probe['PREDICTED_TS'])
+            if self.index is None or watermark != self.watermark:
+                start = time.perf_counter()
+                self.index = StationCapacityIndex(self._fetch(capacity_flights_query()),
+                                                  self._fetch(capacity_airports_query()), self.config)
+                self.watermark = watermark
+                self.last_build_ms = (time.perf_counter() - start) * 1000
+            return self.index
+
+    def what_if(self, delays: Optional[Mapping[str, float]] = None,
+                swaps: Sequence[Tuple[str, str]] = ()) -> pd.DataFrame:
+        index = self.sync()
+        start = time.perf_counter()
+        result = index.what_if(delays, swaps)
+        self.last_query_ms = (time.perf_counter() - start) * 1000
+        return result
@@ -0,0 +1,382 @@
+"""
+IOC Copilot LLM plumbing: flight context reuse, response cache and backends.
+
+Prompts are assembled from a flight context block that is built once per
+(flight, snapshot) and reused across chat turns. Responses are cached on the
+normalized question plus the context fingerprint, so asking the same thing
+about the same flight snapshot skips the Cortex round trip entirely. Fresh
+answers are streamed token by token so controllers see output immediately.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+from utils.query_builder import Query, QueryStats, run_query
+
+DEFAULT_MODEL = 'claude-3-5-sonnet'
+CORTEX_COMPLETE_PATH = '/api/v2/cortex/inference:complete'
+STREAM_TIMEOUT_S = 120
+
+PROMPT_TEMPLATE = """You are an IOC Flight Manager assistant. {context}
+{references}
+User question: {question}
+
+Provide a helpful, data-driven response. If you need to query data, describe what you would query.
+Focus on actionable insights for operations."""
+
+
+@dataclass
+class FlightContext:
+    flight_key: Optional[str]
+    snapshot: str
+    text: str
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(f"{self.flight_key}|{self.snapshot}|{self.text}".encode('utf-8')).hexdigest()
+
+
+def network_context(snapshot: str) -> FlightContext:
+    """Context for questions asked with no flight selected, scoped to a data snapshot."""
+    return FlightContext(None, str(snapshot), "")
+
+
+def build_flight_context(detail_row: pd.Series, downstream: Optional[pd.DataFrame] = None) -> FlightContext:
+    """Render the selected flight's risk detail and downstream chain as prompt context."""
+    flags = [label for column, label in [
+        ('FDP_TIMEOUT_RISK_FLAG', 'crew FDP timeout'),
+        ('CURFEW_RISK_FLAG', 'curfew'),
+        ('MEL_RISK_FLAG', 'MEL'),
+        ('TURN_RISK_FLAG', 'turn'),
+    ] if detail_row.get(column)]
+    lines = [
+        f"Context: User has selected flight {detail_row['FLIGHT_KEY']} "
+        f"({detail_row['FLIGHT_NUMBER']} {detail_row['DEPARTURE_STATION']}-{detail_row['ARRIVAL_STATION']}).",
+        f"Risk score {detail_row['FLIGHT_RISK_SCORE_0_100']:.0f}/100 ({detail_row['RISK_BAND']}), "
+        f"pax at risk {detail_row['MISCONNECT_PAX_AT_RISK']}, revenue at risk ${detail_row['REVENUE_AT_RISK_USD']:,.0f}.",
+        f"Components: crew {detail_row['CREW_LEGALITY_COMPONENT']}, airport {detail_row['AIRPORT_ENV_COMPONENT']}, "
+        f"pax {detail_row['PAX_COMPONENT']}, maintenance {detail_row['MAINTENANCE_COMPONENT']}.",
+        f"Active risk flags: {', '.join(flags) if flags else 'none'}.",
+    ]
+    if downstream is not None and not downstream.empty:
+        chain = "; ".join(
+            f"{r['FLIGHT_NUMBER']} {r['DEPARTURE_STATION']}-{r['ARRIVAL_STATION']} risk {r['RISK_SCORE']:.0f}"
+            for _, r in downstream.iterrows()
+        )
+        lines.append(f"Downstream rotation: {chain}.")
+    return FlightContext(str(detail_row['FLIGHT_KEY']), str(detail_row['SNAPSHOT_TS']), " ".join(lines))
+
+
+def format_policy_references(hits: pd.DataFrame, max_chars: int = 600) -> str:
+    """Condense policy search hits into a references block for the prompt."""
+    if hits is None or hits.empty:
+        return ""
+    lines = ["Relevant policy excerpts:"]
+    for _, doc in hits.iterrows():
+        content = " ".join(str(doc.get('PASSAGE') or doc['CONTENT'] or "").split())
+        lines.append(f"- {doc['TITLE']} ({doc['DOC_TYPE']}): {content[:max_chars]}")
+    return "\n".join(lines) + "\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+def normalize_question(question: str) -> str:
+    text = question.strip().lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip("?!. ")
+
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+    cached: bool = False
+    first_token_ms: Optional[float] = None
+
+
+class CortexBackend:
+    """SNOWFLAKE.CORTEX.COMPLETE with usage reporting."""
+
+    name = 'cortex'
+
+    def __init__(self, session, stats: Optional[QueryStats] = None):
+        self.session = session
+        self.stats = stats
+        self.usage = None
+
+    def complete(self, model: str, prompt: str) -> Completion:
+        start = time.perf_counter()
+        result = run_query(self.session, Query("""
+            SELECT SNOWFLAKE.CORTEX.COMPLETE(
+                ?,
+                ARRAY_CONSTRUCT(OBJECT_CONSTRUCT('role', 'user', 'content', ?)),
+                OBJECT_CONSTRUCT()
+            ) as RESPONSE
+        """, [model, prompt]), self.stats, "cortex_complete")
+        latency_ms = (time.perf_counter() - start) * 1000
+        if result.empty:
+            return Completion("", 0, 0, latency_ms)
+        payload = result['RESPONSE'].iloc[0]
+        payload = json.loads(payload) if isinstance(payload, str) else payload
+        usage = payload.get('usage', {})
+        return Completion(
+            payload['choices'][0]['messages'],
+            int(usage.get('prompt_tokens', 0)),
+            int(usage.get('completion_tokens', 0)),
+            latency_ms,
+        )
+
+    def _open_stream(self, model: str, prompt: str):
+        """Server-sent events from the Cortex REST complete endpoint, opened before any output."""
+        import requests
+
+        conn = self.session._conn._conn
+        response = requests.post(
+            f"https://{conn.host}{CORTEX_COMPLETE_PATH}",
+            json={'model': model, 'messages': [{'role': 'user', 'content': prompt}], 'stream': True},
+            headers={'Authorization': f'Snowflake Token="{conn.rest.token}"',
+                     'Content-Type': 'application/json', 'Accept': 'text/event-stream'},
+            stream=True, timeout=STREAM_TIMEOUT_S,
+        )
+        response.raise_for_status()
+        return response
+
+    def stream(self, model: str, prompt: str) -> Iterator[str]:
+        """Stream tokens through the Cortex REST API, falling back to one blocking call.
+
+        Token usage from the stream (or the blocking call) is left in `self.usage`.
+        """
+        self.usage = None
+        try:
+            response = self._open_stream(model, prompt)
+        except Exception:
+            completion = self.complete(model, prompt)
+            self.usage = (completion.prompt_tokens, completion.completion_tokens)
+            yield completion.text
+            return
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            event = json.loads(data)
+            usage = event.get('usage')
+            if usage:
+                self.usage = (int(usage.get('prompt_tokens', 0)), int(usage.get('completion_tokens', 0)))
+            for choice in event.get('choices', []):
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    yield text
+
+
+class StubBackend:
+    """Deterministic offline stand-in for Cortex, for local runs without a warehouse."""
+
+    name = 'stub'
+
+    def __init__(self, first_token_ms: float = 0.0, per_token_ms: float = 0.0):
+        self.first_token_ms = first_token_ms
+        self.per_token_ms = per_token_ms
+        self.usage = None
+
+    def _answer(self, model: str, prompt: str) -> str:
+        question = prompt.split("User question:", 1)[-1].split("\n\n", 1)[0].strip()
+        context = prompt.split("User question:", 1)[0]
+        return (f"[stub:{model}] Offline response to: {question}\n\n"
+                f"Context provided: {len(context.split())} words.")
+
+    def stream(self, model: str, prompt: str) -> Iterator[str]:
+        answer = self._answer(model, prompt)
+        self.usage = (len(prompt.split()), len(answer.split()))
+        if self.first_token_ms:
+            time.sleep(self.first_token_ms / 1000)
+        for i, word in enumerate(answer.split(" ")):
+            if i and self.per_token_ms:
+                time.sleep(self.per_token_ms / 1000)
+            yield word if i == 0 else " " + word
+
+    def complete(self, model: str, prompt: str) -> Completion:
+        start = time.perf_counter()
+        text = "".join(self.stream(model, prompt))
+        return Completion(text, len(prompt.split()), len(text.split()),
+                          (time.perf_counter() - start) * 1000)
+
+
+class ResponseCache:
+    """LRU of completions keyed on model, normalized question and context fingerprint."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Completion]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Shared across sessions through st.cache_resource; the LRU and the counters move together.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, question: str, context: FlightContext) -> str:
+        raw = f"{model}|{normalize_question(question)}|{context.fingerprint}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Completion]:
+        with self._lock:
+            completion = self._entries.get(key)
+            if completion is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return completion
+
+    def put(self, key: str, completion: Completion):
+        with self._lock:
+            self._entries[key] = completion
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@dataclass
+class CopilotMetrics:
+    turns: List[Dict] = field(default_factory=list)
+
+    def record(self, completion: Completion, backend: str):
+        self.turns.append({
+            'BACKEND': backend,
+            'CACHED': completion.cached,
+            'FIRST_TOKEN_MS': round(completion.first_token_ms, 1) if completion.first_token_ms is not None else None,
+            'LATENCY_MS': round(completion.latency_ms, 1),
+            'PROMPT_TOKENS': completion.prompt_tokens,
+            'COMPLETION_TOKENS': completion.completion_tokens,
+        })
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.turns)
+
+    def percentiles(self, column: str = 'LATENCY_MS', quantiles: Sequence[float] = (0.5, 0.95)) -> Dict[str, float]:
+        values = self.to_frame()[column].dropna() if self.turns else pd.Series(dtype=float)
+        return {f"p{int(q * 100)}": float(values.quantile(q)) if not values.empty else float('nan')
+                for q in quantiles}
+
+
+class Copilot:
+    def __init__(self, backend, cache: ResponseCache, metrics: Optional[CopilotMetrics] = None,
+                 model: str = DEFAULT_MODEL):
+        self.backend = backend
+        self.cache = cache
+        self.metrics = metrics
+        self.model = model
+
+    def lookup(self, question: str, context: FlightContext) -> Optional[Completion]:
+        """Return a cached answer for this question and context, if one exists."""
+        start = time.perf_counter()
+        cached = self.cache.get(ResponseCache.key(self.model, question, context))
+        if cached is None:
+            return None
+        elapsed = (time.perf_counter() - start) * 1000
+        completion = Completion(cached.text, cached.prompt_tokens, 0, elapsed, cached=True, first_token_ms=elapsed)
+        self._record(completion)
+        return completion
+
+    def stream(self, question: str, context: FlightContext, references: str = "",
+               started: Optional[float] = None) -> Iterator[str]:
+        """Yield answer chunks as they arrive, then cache and record the full completion.
+
+        `started` lets callers include their context-fetch time in the latency figures.
+        """
+        start = started if started is not None else time.perf_counter()
+        prompt = PROMPT_TEMPLATE.format(context=context.text, references=references, question=question)
+        chunks = []
+        first_token_ms = None
+        for chunk in self.backend.stream(self.model, prompt):
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - start) * 1000
+            chunks.append(chunk)
+            yield chunk
+        text = "".join(chunks)
+        latency_ms = (time.perf_counter() - start) * 1000
+        # Backends report real usage once the stream ends; estimate only when they cannot.
+        usage = getattr(self.backend, 'usage', None) or (estimate_tokens(prompt), estimate_tokens(text))
+        completion = Completion(text, usage[0], usage[1], latency_ms,
+                                first_token_ms=first_token_ms if first_token_ms is not None else latency_ms)
+        self.cache.put(ResponseCache.key(self.model, question, context), completion)
+        self._record(completion)
+        self.last = completion
+
+    def ask(self, question: str, context: FlightContext, references: str = "") -> Completion:
+        completion = self.lookup(question, context)
+        if completion is None:
+            for _ in self.stream(question, context, references):
+                pass
+            completion = self.last
+        return completion
+
+    def _record(self, completion: Completion):
+        if self.metrics is not None:
+            self.metrics.record(completion, self.backend.name)
+
+
+def make_backend(session, stats: Optional[QueryStats] = None):
+    """Use the offline stub when IROP_COPILOT_BACKEND=stub, Cortex otherwise."""
+    if os.environ.get('IROP_COPILOT_BACKEND', 'cortex').lower() == 'stub':
+        return StubBackend()
+    return CortexBackend(session, stats)
+
+
+def benchmark(runs: int = 50, first_token_ms: float = 400.0, per_token_ms: float = 15.0,
+              context_fetch_ms: Sequence[float] = (120.0, 180.0), policy_search_ms: float = 250.0) -> pd.DataFrame:
+    """p50/p95 end-to-end and time-to-first-output latency of a sleep-based model of a chat turn.
+
+    Compares the old flow (detail, downstream and policy search serially, then
+    a blocking answer) with the page's flow: detail and downstream fetched
+    concurrently, the policy search on the turn itself, then a streamed
+    answer. Fetches and the model are `time.sleep` stand-ins, so this shows
+    the shape of the saving, not a measurement of the page against a live
+    warehouse and Cortex.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch(ms):
+        time.sleep(ms / 1000)
+
+    backend = StubBackend(first_token_ms, per_token_ms)
+    context = FlightContext('BENCH', 'bench', "Context: benchmark flight.")
+    rows = []
+    for mode in ('serial_blocking', 'concurrent_streaming'):
+        totals, firsts = [], []
+        for i in range(runs):
+            copilot = Copilot(backend, ResponseCache())
+            started = time.perf_counter()
+            if mode == 'serial_blocking':
+                for ms in context_fetch_ms:
+                    fetch(ms)
+            else:
+                with ThreadPoolExecutor(max_workers=len(context_fetch_ms)) as pool:
+                    list(pool.map(fetch, context_fetch_ms))
+            fetch(policy_search_ms)
+            "".join(copilot.stream(f"question {i}", context, started=started))
+            totals.append(copilot.last.latency_ms)
+            # A blocking call shows nothing until the whole answer is back.
+            firsts.append(copilot.last.latency_ms if mode == 'serial_blocking' else copilot.last.first_token_ms)
+        totals, firsts = pd.Series(totals), pd.Series(firsts)
+        rows.append({'MODE': mode,
+                     'P50_MS': totals.quantile(0.5), 'P95_MS': totals.quantile(0.95),
+                     'FIRST_OUTPUT_P50_MS': firsts.quantile(0.5), 'FIRST_OUTPUT_P95_MS': firsts.quantile(0.95)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    print(benchmark().to_string(index=False))
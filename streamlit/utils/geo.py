@@ -0,0 +1,147 @@
+"""
+Route geometry cache and compact columnar layer data for the pydeck network map.
+
+Arc endpoints and great-circle distances are resolved once per station pair and
+kept for the life of the process. Layer frames carry flat float32/uint8 columns
+(positions are assembled client-side by deck.gl accessors), which keeps the
+serialized payload small; above `max_routes` arcs are merged into grid-cell
+pairs so the map stays interactive at full network scale.
+"""
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+AIRPORT_COORDS = {
+    'ATL': [33.6407, -84.4277], 'JFK': [40.6413, -73.7781],
+    'DTW': [42.2124, -83.3534], 'LAX': [33.9416, -118.4085],
+    'MCO': [28.4312, -81.3081], 'DFW': [32.8998, -97.0403],
+    'SEA': [47.4502, -122.3088], 'SLC': [40.7899, -111.9791],
+    'MSP': [44.8848, -93.2223], 'BOS': [42.3656, -71.0096],
+    'MIA': [25.7959, -80.2870], 'SFO': [37.6213, -122.3790],
+    'ORD': [41.9742, -87.9073], 'DEN': [39.8561, -104.6737],
+    'LHR': [51.4700, -0.4543], 'CDG': [49.0097, 2.5479],
+    'FRA': [50.0379, 8.5622], 'AMS': [52.3105, 4.7683],
+    'NRT': [35.7720, 140.3929], 'ICN': [37.4602, 126.4407]
+}
+
+ARC_COLUMNS = ['SRC_LON', 'SRC_LAT', 'DST_LON', 'DST_LAT', 'FLIGHT_COUNT', 'AVG_RISK', 'R', 'G', 'B', 'WIDTH']
+
+# deck.gl accessor expressions over the columnar frame built by build_arc_frame.
+ARC_LAYER_ACCESSORS = dict(
+    get_source_position='[SRC_LON, SRC_LAT]',
+    get_target_position='[DST_LON, DST_LAT]',
+    get_source_color='[R, G, B, 200]',
+    get_target_color='[R, G, B, 200]',
+    get_width='WIDTH',
+)
+SCATTER_LAYER_ACCESSORS = dict(
+    get_position='[LON, LAT]',
+)
+
+Geometry = Tuple[float, float, float, float, float]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+class RouteGeometryCache:
+    """(dep, arr) -> (src_lon, src_lat, dst_lon, dst_lat, distance_km), resolved once per pair."""
+
+    def __init__(self, coords: Optional[Dict[str, list]] = None):
+        self.coords = coords or AIRPORT_COORDS
+        self._routes: Dict[Tuple[str, str], Optional[Geometry]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, dep: str, arr: str) -> Optional[Geometry]:
+        key = (dep, arr)
+        if key not in self._routes:
+            src, dst = self.coords.get(dep), self.coords.get(arr)
+            geometry = None
+            if src is not None and dst is not None:
+                geometry = (src[1], src[0], dst[1], dst[0], haversine_km(src[0], src[1], dst[0], dst[1]))
+            with self._lock:
+                self._routes[key] = geometry
+        return self._routes[key]
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+
+def risk_rgb(risk: np.ndarray) -> np.ndarray:
+    """Red / orange / green by the 70 / 40 risk thresholds, as an (n, 3) uint8 array."""
+    risk = np.asarray(risk, dtype=float)
+    return np.select(
+        [(risk >= 70)[:, None], (risk >= 40)[:, None]],
+        [np.array([[255, 0, 0]]), np.array([[255, 165, 0]])],
+        default=np.array([[0, 255, 0]]),
+    ).astype(np.uint8)
+
+
+def lod_aggregate(arcs: pd.DataFrame, cell_deg: float) -> pd.DataFrame:
+    """Merge arcs whose endpoints share a `cell_deg` grid cell pair; risk is flight-weighted."""
+    cells = (arcs[['SRC_LON', 'SRC_LAT', 'DST_LON', 'DST_LAT']] // cell_deg).astype(np.int32)
+    weighted = arcs.assign(
+        _RISK_X_COUNT=arcs['AVG_RISK'] * arcs['FLIGHT_COUNT'],
+        _C0=cells['SRC_LON'], _C1=cells['SRC_LAT'], _C2=cells['DST_LON'], _C3=cells['DST_LAT'],
+    )
+    grouped = weighted.groupby(['_C0', '_C1', '_C2', '_C3'], sort=False)
+    # Anchor merged arcs at the busiest member route so endpoints stay on real airports.
+    anchors = weighted.loc[grouped['FLIGHT_COUNT'].idxmax(), ['_C0', '_C1', '_C2', '_C3',
+                                                             'SRC_LON', 'SRC_LAT', 'DST_LON', 'DST_LAT']]
+    totals = grouped.agg(FLIGHT_COUNT=('FLIGHT_COUNT', 'sum'), _RISK_X_COUNT=('_RISK_X_COUNT', 'sum')).reset_index()
+    merged = anchors.merge(totals, on=['_C0', '_C1', '_C2', '_C3'])
+    merged['AVG_RISK'] = merged['_RISK_X_COUNT'] / merged['FLIGHT_COUNT']
+    return merged[['SRC_LON', 'SRC_LAT', 'DST_LON', 'DST_LAT', 'FLIGHT_COUNT', 'AVG_RISK']]
+
+
+def build_arc_frame(route_data: pd.DataFrame, cache: RouteGeometryCache, max_routes: int = 1500,
+                    cell_deg: float = 2.0) -> pd.DataFrame:
+    """Columnar ArcLayer data from a DEPARTURE_STATION/ARRIVAL_STATION/FLIGHT_COUNT/AVG_RISK frame.
+
+    Routes with unknown stations are dropped. When more than `max_routes` arcs
+    remain, they are aggregated on a grid that doubles until it fits.
+    """
+    if route_data.empty:
+        return pd.DataFrame(columns=ARC_COLUMNS)
+    geometry = [cache.get(dep, arr) for dep, arr in
+                zip(route_data['DEPARTURE_STATION'], route_data['ARRIVAL_STATION'])]
+    known = np.array([g is not None for g in geometry])
+    if not known.any():
+        return pd.DataFrame(columns=ARC_COLUMNS)
+    coords = np.array([g[:4] for g in geometry if g is not None], dtype=np.float32)
+    arcs = pd.DataFrame({
+        'SRC_LON': coords[:, 0], 'SRC_LAT': coords[:, 1], 'DST_LON': coords[:, 2], 'DST_LAT': coords[:, 3],
+        'FLIGHT_COUNT': route_data['FLIGHT_COUNT'].to_numpy()[known].astype(np.int32),
+        'AVG_RISK': route_data['AVG_RISK'].to_numpy()[known].astype(np.float32),
+    })
+
+    while len(arcs) > max_routes:
+        arcs = lod_aggregate(arcs, cell_deg)
+        cell_deg *= 2
+
+    rgb = risk_rgb(arcs['AVG_RISK'].to_numpy())
+    counts = arcs['FLIGHT_COUNT'].to_numpy()
+    return pd.DataFrame({
+        'SRC_LON': arcs['SRC_LON'].to_numpy(np.float32),
+        'SRC_LAT': arcs['SRC_LAT'].to_numpy(np.float32),
+        'DST_LON': arcs['DST_LON'].to_numpy(np.float32),
+        'DST_LAT': arcs['DST_LAT'].to_numpy(np.float32),
+        'FLIGHT_COUNT': counts.astype(np.int32),
+        'AVG_RISK': arcs['AVG_RISK'].to_numpy(np.float32).round(1),
+        'R': rgb[:, 0], 'G': rgb[:, 1], 'B': rgb[:, 2],
+        'WIDTH': np.clip(1 + np.log2(np.maximum(counts, 1)), 1, 8).astype(np.float32),
+    })
+
+
+def build_airport_frame(stations) -> pd.DataFrame:
+    rows = [(code, AIRPORT_COORDS[code][1], AIRPORT_COORDS[code][0]) for code in stations if code in AIRPORT_COORDS]
+    frame = pd.DataFrame(rows, columns=['NAME', 'LON', 'LAT'])
+    frame[['LON', 'LAT']] = frame[['LON', 'LAT']].astype(np.float32)
+    return frame
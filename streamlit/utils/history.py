@@ -0,0 +1,135 @@
+"""
+Readers for the delta-encoded FLIGHT_RISK_HISTORY.
+
+pipeline/history.py appends a row only when a flight first appears or its
+scores move, plus a periodic KEYFRAME row per active flight. Every read here
+starts at the last keyframe at or before the window it asks for, so its cost
+follows the number of changes in the window, not the number of snapshots:
+
+- snapshot_query: the scores of every flight as they stood at a past time.
+- timeline_query: one flight's score changes, with its state at the start.
+- trend_query: network average / high-risk count after each snapshot,
+  rolled forward from per-snapshot deltas (restarting at each keyframe)
+  instead of regrouping full copies.
+"""
+import pandas as pd
+
+from utils.query_builder import Query
+
+HISTORY_TABLE = "IROP_GNN_RISK.IROP_MART.FLIGHT_RISK_HISTORY"
+HISTORY_COLUMNS = ['FLIGHT_KEY', 'FLIGHT_DATE', 'SNAPSHOT_TS', 'FLIGHT_RISK_SCORE_0_100',
+                   'NETWORK_IMPACT_SCORE_0_100', 'CHANGE_REASON']
+HIGH_RISK_THRESHOLD = 70
+
+
+def _keyframe_sql() -> str:
+    """Last keyframe at or before the bound timestamp (one `?`)."""
+    return f"""(
+        SELECT COALESCE(MAX(SNAPSHOT_TS), '1970-01-01'::TIMESTAMP_NTZ)
+        FROM {HISTORY_TABLE}
+        WHERE CHANGE_REASON = 'KEYFRAME' AND SNAPSHOT_TS <= ?
+    )"""
+
+
+def snapshot_query(as_of, flight_date=None) -> Query:
+    """Every flight's scores as of `as_of`, optionally for one FLIGHT_DATE."""
+    date_sql, params = "", [as_of, as_of]
+    if flight_date is not None:
+        date_sql = "AND FLIGHT_DATE = ?"
+        params.append(flight_date)
+    return Query(f"""
+        SELECT {', '.join(HISTORY_COLUMNS)}
+        FROM {HISTORY_TABLE}
+        WHERE SNAPSHOT_TS >= {_keyframe_sql()} AND SNAPSHOT_TS <= ? {date_sql}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY FLIGHT_KEY ORDER BY SNAPSHOT_TS DESC) = 1
+    """, params)
+
+
+def timeline_query(flight_key: str, start, end) -> Query:
+    """A flight's rows in [start, end] plus the one in force at `start`."""
+    return Query(f"""
+        SELECT {', '.join(HISTORY_COLUMNS)}
+        FROM {HISTORY_TABLE}
+        WHERE FLIGHT_KEY = ? AND SNAPSHOT_TS <= ?
+        QUALIFY SNAPSHOT_TS >= ?
+             OR SNAPSHOT_TS = MAX(IFF(SNAPSHOT_TS < ?, SNAPSHOT_TS, NULL)) OVER ()
+        ORDER BY SNAPSHOT_TS
+    """, [flight_key, end, start, start])
+
+
+def trend_query(start, end, flight_date=None) -> Query:
+    """Network AVG_RISK, FLIGHT_COUNT and HIGH_RISK after each snapshot in [start, end].
+
+    The running sums restart at every keyframe, so flights a keyframe drops
+    leave the counts instead of being carried forward.
+    """
+    date_sql, params = "", [start, end, start, end]
+    if flight_date is not None:
+        date_sql = "AND FLIGHT_DATE = ?"
+        params.append(flight_date)
+    params.append(start)
+    return Query(f"""
+        WITH keyframes AS (
+            SELECT DISTINCT SNAPSHOT_TS
+            FROM {HISTORY_TABLE}
+            WHERE CHANGE_REASON = 'KEYFRAME' AND SNAPSHOT_TS >= {_keyframe_sql()} AND SNAPSHOT_TS <= ?
+        ),
+        marked AS (
+            SELECT FLIGHT_KEY, SNAPSHOT_TS, FLIGHT_RISK_SCORE_0_100 AS SCORE
+            FROM {HISTORY_TABLE}
+            WHERE SNAPSHOT_TS >= {_keyframe_sql()} AND SNAPSHOT_TS <= ? {date_sql}
+            UNION ALL
+            SELECT NULL, SNAPSHOT_TS, NULL FROM keyframes
+        ),
+        epochs AS (
+            SELECT FLIGHT_KEY, SNAPSHOT_TS, SCORE,
+                   MAX(IFF(FLIGHT_KEY IS NULL, SNAPSHOT_TS, NULL)) OVER (ORDER BY SNAPSHOT_TS) AS EPOCH
+            FROM marked
+        ),
+        changes AS (
+            SELECT FLIGHT_KEY, SNAPSHOT_TS, EPOCH, SCORE,
+                   LAG(SCORE) OVER (PARTITION BY FLIGHT_KEY, EPOCH ORDER BY SNAPSHOT_TS) AS PREV
+            FROM epochs
+        ),
+        steps AS (
+            SELECT SNAPSHOT_TS, EPOCH,
+                   SUM(SCORE - COALESCE(PREV, 0)) AS D_TOTAL,
+                   COUNT_IF(FLIGHT_KEY IS NOT NULL AND PREV IS NULL) AS D_FLIGHTS,
+                   SUM(IFF(SCORE >= {HIGH_RISK_THRESHOLD}, 1, 0) - IFF(PREV >= {HIGH_RISK_THRESHOLD}, 1, 0)) AS D_HIGH
+            FROM changes
+            GROUP BY SNAPSHOT_TS, EPOCH
+        ),
+        running AS (
+            SELECT SNAPSHOT_TS,
+                   SUM(D_TOTAL) OVER (PARTITION BY EPOCH ORDER BY SNAPSHOT_TS) AS TOTAL,
+                   SUM(D_FLIGHTS) OVER (PARTITION BY EPOCH ORDER BY SNAPSHOT_TS) AS FLIGHT_COUNT,
+                   SUM(D_HIGH) OVER (PARTITION BY EPOCH ORDER BY SNAPSHOT_TS) AS HIGH_RISK
+            FROM steps
+        )
+        SELECT SNAPSHOT_TS, ROUND(TOTAL / NULLIF(FLIGHT_COUNT, 0), 1) AS AVG_RISK, FLIGHT_COUNT, HIGH_RISK
+        FROM running
+        WHERE SNAPSHOT_TS >= ?
+        ORDER BY SNAPSHOT_TS
+    """, params)
+
+
+def _fetch(session, query: Query) -> pd.DataFrame:
+    return session.sql(query.sql, params=query.params).to_pandas()
+
+
+def snapshot_at(session, as_of, flight_date=None) -> pd.DataFrame:
+    return _fetch(session, snapshot_query(as_of, flight_date))
+
+
+def flight_timeline(session, flight_key: str, start, end) -> pd.DataFrame:
+    """Score changes for one flight, with keyframe rows that repeat the previous scores dropped."""
+    rows = _fetch(session, timeline_query(flight_key, start, end))
+    if rows.empty:
+        return rows
+    scores = rows[['FLIGHT_RISK_SCORE_0_100', 'NETWORK_IMPACT_SCORE_0_100']]
+    moved = scores.ne(scores.shift()).any(axis=1)
+    return rows[moved].reset_index(drop=True)
+
+
+def risk_trend(session, start, end, flight_date=None) -> pd.DataFrame:
+    return _fetch(session, trend_query(start, end, flight_date))
@@ -0,0 +1,195 @@
+"""
+Snapshot watcher that keeps today's FLIGHT_RISK rows cached and patches them incrementally.
+
+Each poll runs a one-row MAX(SNAPSHOT_TS)/COUNT(*) probe. Only when the
+snapshot advances does it fetch the rows scored after the previous watermark,
+upserting them by FLIGHT_KEY, so warehouse work per refresh scales with the
+number of changed flights. The page views (hub KPIs, routes, distribution,
+trend, top flights, heatmap) are aggregated locally from the cached frame.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+from utils.query_builder import FLIGHT_RISK_TABLE, Query
+
+LIVE_COLUMNS = [
+    'FLIGHT_KEY', 'FLIGHT_NUMBER', 'DEPARTURE_STATION', 'ARRIVAL_STATION', 'SNAPSHOT_TS', 'HUB_FLAG',
+    'FLIGHT_RISK_SCORE_0_100', 'RISK_BAND', 'MISCONNECT_PAX_AT_RISK', 'REVENUE_AT_RISK_USD',
+    'GNN_NETWORK_CRITICALITY', 'DOWNLINE_LEGS_AFFECTED_COUNT',
+]
+
+
+def snapshot_probe_query() -> Query:
+    return Query(f"""
+        SELECT MAX(SNAPSHOT_TS) as TS, COUNT(*) as CNT
+        FROM {FLIGHT_RISK_TABLE}
+        WHERE FLIGHT_DATE = CURRENT_DATE
+    """)
+
+
+def flight_rows_query(after_ts=None) -> Query:
+    """Today's FLIGHT_RISK rows, optionally only those scored after `after_ts`."""
+    seek_sql, params = "", []
+    if after_ts is not None:
+        seek_sql = "AND SNAPSHOT_TS > ?"
+        params = [after_ts]
+    return Query(f"""
+        SELECT {', '.join(LIVE_COLUMNS)}
+        FROM {FLIGHT_RISK_TABLE}
+        WHERE FLIGHT_DATE = CURRENT_DATE {seek_sql}
+    """, params)
+
+
+@dataclass
+class RefreshResult:
+    version: int
+    changed_rows: int
+    full_reload: bool
+    elapsed_ms: float
+
+
+class SnapshotWatcher:
+    """Process-wide cache of today's FLIGHT_RISK rows, patched as new snapshots land.
+
+    Shared across viewers via st.cache_resource; `min_interval_s` bounds how
+    often the probe actually runs no matter how many fragments call poll().
+    """
+
+    def __init__(self, session, min_interval_s: float = 15.0):
+        self.session = session
+        self.min_interval_s = min_interval_s
+        self.frame = pd.DataFrame(columns=LIVE_COLUMNS)
+        self.watermark = None
+        self.version = 0
+        self.last_refresh: Optional[RefreshResult] = None
+        self.rows_fetched = 0
+        self.polls = 0
+        self._polled_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self, query: Query) -> pd.DataFrame:
+        return self.session.sql(query.sql, params=query.params).to_pandas()
+
+    def poll(self, force: bool = False) -> Optional[RefreshResult]:
+        """Probe for a new snapshot and apply it; returns None when nothing changed."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.version and now - self._polled_at < self.min_interval_s:
+                return None
+            self._polled_at = now
+            self.polls += 1
+            start = time.perf_counter()
+            probe = self.session.sql(snapshot_probe_query().sql).collect()[0]
+            latest, count = probe['TS'], probe['CNT']
+            if self.version and latest == self.watermark and count == len(self.frame):
+                return None
+
+            full_reload = self.watermark is None or latest is None or latest < self.watermark
+            if not full_reload:
+                delta = self._fetch(flight_rows_query(self.watermark))
+                patched = pd.concat(
+                    [self.frame[~self.frame['FLIGHT_KEY'].isin(delta['FLIGHT_KEY'])], delta],
+                    ignore_index=True,
+                ) if not delta.empty else self.frame
+                # Deleted or re-keyed flights cannot be seen through the watermark.
+                full_reload = len(patched) != count
+            if full_reload:
+                delta = self._fetch(flight_rows_query())
+                patched = delta
+
+            self.frame = patched
+            self.watermark = latest
+            self.version += 1
+            self.rows_fetched += len(delta)
+            self.last_refresh = RefreshResult(
+                self.version, len(delta), full_reload, (time.perf_counter() - start) * 1000
+            )
+            return self.last_refresh
+
+    def snapshot(self) -> pd.DataFrame:
+        with self._lock:
+            return self.frame
+
+
+def _risk_bucket(score: pd.Series) -> pd.Series:
+    return pd.cut(score, bins=[-float('inf'), 40, 70, float('inf')], right=False,
+                  labels=['Low (0-39)', 'Medium (40-69)', 'High (70-100)']).astype(str)
+
+
+def hub_metrics(frame: pd.DataFrame) -> pd.DataFrame:
+    hubs = frame[frame['HUB_FLAG'] == True]
+    if hubs.empty:
+        return pd.DataFrame()
+    score = hubs['FLIGHT_RISK_SCORE_0_100']
+    out = hubs.assign(
+        HIGH=score >= 70, MEDIUM=(score >= 40) & (score < 70), LOW=score < 40
+    ).groupby('DEPARTURE_STATION').agg(
+        TOTAL_FLIGHTS=('FLIGHT_KEY', 'size'),
+        HIGH_RISK=('HIGH', 'sum'),
+        MEDIUM_RISK=('MEDIUM', 'sum'),
+        LOW_RISK=('LOW', 'sum'),
+        AVG_RISK=('FLIGHT_RISK_SCORE_0_100', 'mean'),
+        TOTAL_PAX_AT_RISK=('MISCONNECT_PAX_AT_RISK', 'sum'),
+        TOTAL_REVENUE_AT_RISK=('REVENUE_AT_RISK_USD', 'sum'),
+    ).reset_index().rename(columns={'DEPARTURE_STATION': 'HUB'})
+    out['AVG_RISK'] = out['AVG_RISK'].round(1)
+    out['TOTAL_REVENUE_AT_RISK'] = out['TOTAL_REVENUE_AT_RISK'].round(0)
+    return out.sort_values('HIGH_RISK', ascending=False, ignore_index=True)
+
+
+def route_summary(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.groupby(['DEPARTURE_STATION', 'ARRIVAL_STATION']).agg(
+        FLIGHT_COUNT=('FLIGHT_KEY', 'size'),
+        AVG_RISK=('FLIGHT_RISK_SCORE_0_100', 'mean'),
+    ).reset_index()
+
+
+def risk_distribution(frame: pd.DataFrame) -> pd.DataFrame:
+    if frame.empty:
+        return pd.DataFrame()
+    return (frame.assign(RISK_CATEGORY=_risk_bucket(frame['FLIGHT_RISK_SCORE_0_100']))
+            .groupby('RISK_CATEGORY').size().rename('FLIGHT_COUNT').reset_index()
+            .sort_values('RISK_CATEGORY', ignore_index=True))
+
+
+def risk_trend(frame: pd.DataFrame) -> pd.DataFrame:
+    if frame.empty:
+        return pd.DataFrame()
+    out = frame.assign(HOUR=pd.to_datetime(frame['SNAPSHOT_TS']).dt.floor('h')).groupby('HOUR').agg(
+        AVG_RISK=('FLIGHT_RISK_SCORE_0_100', 'mean'),
+        FLIGHT_COUNT=('FLIGHT_KEY', 'size'),
+        TOTAL_PAX_AT_RISK=('MISCONNECT_PAX_AT_RISK', 'sum'),
+    ).reset_index()
+    out['AVG_RISK'] = out['AVG_RISK'].round(1)
+    return out
+
+
+def top_critical_flights(frame: pd.DataFrame, hub: Optional[str] = None, limit: int = 10) -> pd.DataFrame:
+    if hub:
+        frame = frame[frame['DEPARTURE_STATION'] == hub]
+    top = frame.sort_values('GNN_NETWORK_CRITICALITY', ascending=False, na_position='last').head(limit)
+    return pd.DataFrame({
+        'FLIGHT_NUMBER': top['FLIGHT_NUMBER'],
+        'DEPARTURE_STATION': top['DEPARTURE_STATION'],
+        'ARRIVAL_STATION': top['ARRIVAL_STATION'],
+        'RISK_SCORE': top['FLIGHT_RISK_SCORE_0_100'].round(1),
+        'RISK_BAND': top['RISK_BAND'],
+        'PAX_AT_RISK': top['MISCONNECT_PAX_AT_RISK'],
+        'REVENUE_AT_RISK': top['REVENUE_AT_RISK_USD'].round(0),
+        'NETWORK_CRITICALITY': top['GNN_NETWORK_CRITICALITY'].round(1),
+        'DOWNLINE_AFFECTED': top['DOWNLINE_LEGS_AFFECTED_COUNT'],
+    }).reset_index(drop=True)
+
+
+def hub_risk_matrix(frame: pd.DataFrame, hub: Optional[str] = None) -> pd.DataFrame:
+    hubs = frame[frame['HUB_FLAG'] == True]
+    if hub:
+        hubs = hubs[hubs['DEPARTURE_STATION'] == hub]
+    out = hubs.groupby(['DEPARTURE_STATION', 'ARRIVAL_STATION'])['FLIGHT_RISK_SCORE_0_100'].mean().round(1)
+    return out.rename('AVG_RISK').reset_index().rename(
+        columns={'DEPARTURE_STATION': 'ORIGIN', 'ARRIVAL_STATION': 'DESTINATION'}
+    )
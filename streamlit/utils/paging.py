@@ -0,0 +1,155 @@
+"""
+Keyset pagination with a cached page store for large FLIGHT_RISK listings.
+
+Pages are fetched with a seek predicate on the sort key instead of OFFSET, so
+page N costs the same as page 1. Fetched pages are kept in Streamlit session
+state, and the next page is submitted asynchronously as soon as the current
+one is rendered, so widget interactions (row selection, tab switches) replay
+from the store instead of re-querying the warehouse.
+"""
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from utils.query_builder import FLIGHT_RISK_TABLE, Query, QueryStats, build_flight_filter
+
+Cursor = Optional[Tuple]
+# Unscored flights sort after every score so the `<` seek never skips or repeats them.
+SORT_SCORE_SQL = "COALESCE(FLIGHT_RISK_SCORE_0_100, -1)"
+
+
+def flight_page_query(station: str = 'All', risk_band: str = 'All', flags: Sequence[str] = (),
+                      after: Cursor = None, page_size: int = 200) -> Query:
+    """Flights ordered by risk (desc, unscored last) then FLIGHT_KEY, seeking past `after`."""
+    where_sql, params = build_flight_filter(station, risk_band, flags)
+    if after is not None:
+        where_sql += (f" AND ({SORT_SCORE_SQL} < ?"
+                      f" OR ({SORT_SCORE_SQL} = ? AND FLIGHT_KEY > ?))")
+        params = params + [after[0], after[0], after[1]]
+    return Query(f"""
+        SELECT
+            FLIGHT_KEY,
+            FLIGHT_NUMBER,
+            DEPARTURE_STATION || '-' || ARRIVAL_STATION as ROUTE,
+            ROUND(FLIGHT_RISK_SCORE_0_100, 0) as RISK,
+            RISK_BAND,
+            MISCONNECT_PAX_AT_RISK as PAX,
+            {SORT_SCORE_SQL} as SORT_SCORE
+        FROM {FLIGHT_RISK_TABLE}
+        WHERE {where_sql}
+        ORDER BY SORT_SCORE DESC, FLIGHT_KEY
+        LIMIT {int(page_size)}
+    """, params)
+
+
+def flight_count_query(station: str = 'All', risk_band: str = 'All', flags: Sequence[str] = ()) -> Query:
+    where_sql, params = build_flight_filter(station, risk_band, flags)
+    return Query(f"""
+        SELECT COUNT(*) as CNT
+        FROM {FLIGHT_RISK_TABLE}
+        WHERE {where_sql}
+    """, params)
+
+
+def swap_candidate_page_query(flight_key: str, after: Cursor = None, page_size: int = 100) -> Query:
+    """Tail-swap candidates ordered by FLIGHT_NUMBER then FLIGHT_KEY, seeking past `after`."""
+    seek_sql = ""
+    params = [flight_key]
+    if after is not None:
+        seek_sql = "AND (FLIGHT_NUMBER > ? OR (FLIGHT_NUMBER = ? AND FLIGHT_KEY > ?))"
+        params += [after[0], after[0], after[1]]
+    return Query(f"""
+        SELECT FLIGHT_KEY, FLIGHT_NUMBER, TAIL_NUMBER
+        FROM {FLIGHT_RISK_TABLE}
+        WHERE FLIGHT_DATE = CURRENT_DATE
+          AND FLIGHT_KEY != ?
+          AND TAIL_NUMBER IS NOT NULL
+          {seek_sql}
+        ORDER BY FLIGHT_NUMBER, FLIGHT_KEY
+        LIMIT {int(page_size)}
+    """, params)
+
+
+class KeysetPager:
+    """Sequential keyset pager that keeps every fetched page and prefetches the next."""
+
+    def __init__(self, session, build_query: Callable[[Cursor, int], Query], key_columns: Sequence[str],
+                 page_size: int = 200, stats: Optional[QueryStats] = None, label: str = "page"):
+        self.session = session
+        self.build_query = build_query
+        self.key_columns = list(key_columns)
+        self.page_size = page_size
+        self.stats = stats
+        self.label = label
+        self.pages: List[pd.DataFrame] = []
+        self.total: Optional[int] = None
+        self.exhausted = False
+        self._cursor: Cursor = None
+        self._prefetch = None
+
+    def _next_query(self) -> Query:
+        return self.build_query(self._cursor, self.page_size)
+
+    def _submit(self):
+        query = self._next_query()
+        job = self.session.sql(query.sql, params=query.params).to_pandas(block=False)
+        return query, job, time.perf_counter()
+
+    def _append(self, query: Query, frame: pd.DataFrame, query_id: Optional[str], started: float):
+        if self.stats is not None:
+            self.stats.record(query, self.label, query_id, (time.perf_counter() - started) * 1000)
+        self.pages.append(frame)
+        if len(frame) < self.page_size:
+            self.exhausted = True
+        else:
+            last = frame.iloc[-1]
+            self._cursor = tuple(
+                last[c].item() if hasattr(last[c], 'item') else last[c] for c in self.key_columns
+            )
+
+    def load_next(self) -> bool:
+        """Fetch one more page, consuming a pending prefetch if there is one."""
+        if self.exhausted:
+            return False
+        if self._prefetch is not None:
+            query, job, started = self._prefetch
+            self._prefetch = None
+        else:
+            query, job, started = self._submit()
+        self._append(query, job.result(), job.query_id, started)
+        return True
+
+    def prefetch(self):
+        """Submit the next page asynchronously without waiting for it."""
+        if not self.exhausted and self._prefetch is None:
+            self._prefetch = self._submit()
+
+    def ensure(self, num_pages: int):
+        while len(self.pages) < num_pages and self.load_next():
+            pass
+
+    def rows(self) -> pd.DataFrame:
+        if not self.pages:
+            return pd.DataFrame()
+        return pd.concat(self.pages, ignore_index=True)
+
+
+class PageStore:
+    """Session-scoped cache of pagers keyed by query shape and bound values."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._pagers: Dict[Tuple, KeysetPager] = {}
+
+    def get(self, key: Tuple, factory: Callable[[], KeysetPager]) -> KeysetPager:
+        pager = self._pagers.pop(key, None)
+        if pager is None:
+            pager = factory()
+        self._pagers[key] = pager
+        while len(self._pagers) > self.max_entries:
+            self._pagers.pop(next(iter(self._pagers)))
+        return pager
+
+    def clear(self):
+        self._pagers.clear()
@@ -0,0 +1,243 @@
+"""
+In-process hybrid policy index: BM25 over section passages plus optional embeddings.
+
+Serves as a fast path in front of IROP_GNN_RISK_SEARCH_SVC (whose TARGET_LAG
+is one hour) and as its offline test double. Documents are split into
+heading-delimited passages, scored with BM25 and, when an embedder is
+supplied, blended with cosine similarity. Results carry the same columns as
+the Cortex Search request in query_builder.policy_search_query.
+"""
+import csv
+import hashlib
+import json
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+FILTER_ATTRIBUTES = ('doc_type', 'station_code', 'fleet_type')
+RESULT_COLUMNS = ['DOC_ID', 'DOC_TYPE', 'TITLE', 'CONTENT', 'STATION_CODE', 'FLEET_TYPE', 'PASSAGE', 'SCORE']
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'if', 'in', 'is', 'it', 'may', 'must',
+    'of', 'on', 'or', 'the', 'to', 'with', 'what', 'when', 'which', 'who', 'how', 'do', 'does', 'can',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def split_passages(content: str) -> List[str]:
+    """Split a policy document on its upper-case section headings."""
+    passages, current = [], []
+    for line in (content or "").splitlines():
+        stripped = line.strip()
+        if stripped.endswith(":") and stripped[:-1].isupper() and current:
+            passages.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        passages.append("\n".join(current).strip())
+    return [p for p in passages if p]
+
+
+def _blank_to_none(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+class PolicyIndex:
+    """BM25 (k1, b) index over document passages with attribute filters."""
+
+    def __init__(self, documents: Sequence[Dict], snapshot: Optional[str] = None,
+                 embedder: Optional[Callable[[List[str]], "object"]] = None,
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = [{k.lower(): _blank_to_none(v) if k.lower() in FILTER_ATTRIBUTES else v
+                           for k, v in d.items()} for d in documents]
+        self.snapshot = snapshot or self.fingerprint(self.documents)
+        self.embedder = embedder
+
+        self.passage_doc: List[int] = []
+        self.passage_text: List[str] = []
+        self.passage_tf: List[Counter] = []
+        self.passage_len: List[int] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.attribute_index: Dict[str, Dict[Optional[str], set]] = {a: defaultdict(set) for a in FILTER_ATTRIBUTES}
+
+        for doc_idx, doc in enumerate(self.documents):
+            for attr in FILTER_ATTRIBUTES:
+                self.attribute_index[attr][doc.get(attr)].add(doc_idx)
+            title = doc.get('title') or ""
+            for passage in split_passages(doc.get('content') or "") or [""]:
+                tokens = tokenize(title) + tokenize(passage)
+                pid = len(self.passage_text)
+                self.passage_doc.append(doc_idx)
+                self.passage_text.append(passage)
+                tf = Counter(tokens)
+                self.passage_tf.append(tf)
+                self.passage_len.append(len(tokens))
+                for term in tf:
+                    self.postings[term].append(pid)
+
+        n = len(self.passage_text)
+        self.avg_len = (sum(self.passage_len) / n) if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+        self.passage_vectors = None
+        if embedder is not None and n:
+            import numpy as np
+            vectors = np.asarray(embedder(self.passage_text), dtype=float)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.passage_vectors = vectors / np.where(norms == 0, 1, norms)
+
+    @staticmethod
+    def fingerprint(documents: Sequence[Dict]) -> str:
+        digest = hashlib.sha1()
+        for doc in sorted(documents, key=lambda d: str(d.get('doc_id'))):
+            digest.update(f"{doc.get('doc_id')}|{doc.get('last_updated')}|{doc.get('content')}".encode('utf-8'))
+        return digest.hexdigest()
+
+    @classmethod
+    def from_csv(cls, path, **kwargs) -> "PolicyIndex":
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls(list(csv.DictReader(f)), **kwargs)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, snapshot: Optional[str] = None, **kwargs) -> "PolicyIndex":
+        return cls(frame.to_dict('records'), snapshot=snapshot, **kwargs)
+
+    def _candidate_docs(self, filters: Optional[Dict[str, str]]) -> Optional[set]:
+        if not filters:
+            return None
+        allowed = None
+        for attr, value in filters.items():
+            attr = attr.lower()
+            if attr not in FILTER_ATTRIBUTES:
+                raise ValueError(f"Unsupported filter attribute: {attr}")
+            docs = self.attribute_index[attr].get(_blank_to_none(value), set())
+            allowed = docs if allowed is None else allowed & docs
+        return allowed
+
+    def _bm25(self, terms: List[str], allowed: Optional[set]) -> Dict[int, float]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for pid in self.postings[term]:
+                if allowed is not None and self.passage_doc[pid] not in allowed:
+                    continue
+                tf = self.passage_tf[pid][term]
+                norm = self.k1 * (1 - self.b + self.b * self.passage_len[pid] / self.avg_len)
+                scores[pid] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, str]] = None,
+               alpha: float = 0.5) -> pd.DataFrame:
+        """Top documents for `query`, each represented by its best-matching passage.
+
+        `filters` are exact matches on doc_type / station_code / fleet_type, as
+        with Cortex Search @eq filters. `alpha` weights BM25 against embedding
+        similarity when the index was built with an embedder.
+        """
+        allowed = self._candidate_docs(filters)
+        scores = self._bm25(tokenize(query), allowed)
+
+        if self.passage_vectors is not None and query.strip():
+            import numpy as np
+            q = np.asarray(self.embedder([query])[0], dtype=float)
+            q = q / (np.linalg.norm(q) or 1)
+            similarity = self.passage_vectors @ q
+            top_bm25 = max(scores.values()) if scores else 0.0
+            blended = {}
+            for pid, sim in enumerate(similarity):
+                if allowed is not None and self.passage_doc[pid] not in allowed:
+                    continue
+                lexical = scores.get(pid, 0.0) / top_bm25 if top_bm25 else 0.0
+                blended[pid] = alpha * lexical + (1 - alpha) * float(sim)
+            scores = blended
+
+        best: Dict[int, tuple] = {}
+        for pid, score in scores.items():
+            if score <= 0:
+                continue
+            doc_idx = self.passage_doc[pid]
+            if doc_idx not in best or score > best[doc_idx][0]:
+                best[doc_idx] = (score, pid)
+
+        rows = []
+        for doc_idx, (score, pid) in sorted(best.items(), key=lambda kv: -kv[1][0])[:limit]:
+            doc = self.documents[doc_idx]
+            rows.append({
+                'DOC_ID': doc.get('doc_id'),
+                'DOC_TYPE': doc.get('doc_type'),
+                'TITLE': doc.get('title'),
+                'CONTENT': doc.get('content'),
+                'STATION_CODE': doc.get('station_code'),
+                'FLEET_TYPE': doc.get('fleet_type'),
+                'PASSAGE': self.passage_text[pid],
+                'SCORE': round(score, 4),
+            })
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def cortex_embedder(session, model: str = 'snowflake-arctic-embed-m') -> Callable[[List[str]], List[List[float]]]:
+    """Embed texts with SNOWFLAKE.CORTEX.EMBED_TEXT_768 in one round trip."""
+    def embed(texts: List[str]) -> List[List[float]]:
+        frame = session.create_dataframe([[i, t] for i, t in enumerate(texts)], schema=['IDX', 'TEXT'])
+        frame.create_or_replace_temp_view('POLICY_EMBED_INPUT')
+        rows = session.sql("""
+            SELECT IDX, SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, TEXT)::ARRAY as VEC
+            FROM POLICY_EMBED_INPUT
+            ORDER BY IDX
+        """, params=[model]).collect()
+        return [[float(v) for v in (r['VEC'] if isinstance(r['VEC'], list) else json.loads(r['VEC']))]
+                for r in rows]
+    return embed
+
+
+class PolicyIndexManager:
+    """Keeps one PolicyIndex per POLICY_DOCUMENTS snapshot, rebuilding only when it changes."""
+
+    SNAPSHOT_SQL = """
+        SELECT COUNT(*) as CNT, MAX(LAST_UPDATED) as LAST_UPDATED
+        FROM IROP_GNN_RISK.IROP_MART.POLICY_DOCUMENTS
+    """
+    DOCUMENTS_SQL = """
+        SELECT DOC_ID, DOC_TYPE, STATION_CODE, FLEET_TYPE, TITLE, CONTENT, EFFECTIVE_DATE, LAST_UPDATED
+        FROM IROP_GNN_RISK.IROP_MART.POLICY_DOCUMENTS
+    """
+
+    def __init__(self, session, embedder=None, check_interval_s: float = 60.0):
+        self.session = session
+        self.embedder = embedder
+        self.check_interval_s = check_interval_s
+        self.index: Optional[PolicyIndex] = None
+        self.build_ms: Optional[float] = None
+        self._checked_at = 0.0
+
+    def get(self) -> PolicyIndex:
+        now = time.monotonic()
+        if self.index is not None and now - self._checked_at < self.check_interval_s:
+            return self.index
+        self._checked_at = now
+        row = self.session.sql(self.SNAPSHOT_SQL).collect()[0]
+        snapshot = f"{row['CNT']}|{row['LAST_UPDATED']}"
+        if self.index is None or self.index.snapshot != snapshot:
+            start = time.perf_counter()
+            documents = self.session.sql(self.DOCUMENTS_SQL).to_pandas()
+            documents.columns = [c.lower() for c in documents.columns]
+            self.index = PolicyIndex.from_frame(documents, snapshot=snapshot, embedder=self.embedder)
+            self.build_ms = (time.perf_counter() - start) * 1000
+        return self.index
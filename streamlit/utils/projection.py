@@ -0,0 +1,178 @@
+"""
+2-D projection service for GNN flight embeddings on the Model Diagnostics page.
+
+Embeddings for the latest snapshot of a model version are projected with PCA
+(randomized SVD once the matrix is large) and optionally refined with UMAP when
+umap-learn is installed. Projections are cached per (model_version,
+snapshot_ts, method); the browser only receives a density-preserving sample of
+the 2-D coordinates, never the raw embedding arrays.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.query_builder import FLIGHT_RISK_TABLE, Query
+
+EMBEDDINGS_TABLE = "IROP_GNN_RISK.ML_PROCESSING.GNN_FLIGHT_EMBEDDINGS"
+RANDOMIZED_SVD_MIN_ROWS = 2000
+
+
+def latest_embedding_snapshot_query() -> Query:
+    return Query(f"""
+        SELECT MODEL_VERSION, MAX(SNAPSHOT_TS) as SNAPSHOT_TS, COUNT(*) as CNT
+        FROM {EMBEDDINGS_TABLE}
+        WHERE GNN_EMBEDDING IS NOT NULL
+        GROUP BY MODEL_VERSION
+        ORDER BY SNAPSHOT_TS DESC
+        LIMIT 1
+    """)
+
+
+def embeddings_query(model_version: str, snapshot_ts) -> Query:
+    return Query(f"""
+        SELECT
+            e.FLIGHT_KEY,
+            e.GNN_EMBEDDING,
+            COALESCE(fr.RISK_BAND, 'Unscored') as RISK_BAND,
+            ROUND(fr.FLIGHT_RISK_SCORE_0_100, 1) as RISK_SCORE,
+            fr.MISCONNECT_PAX_AT_RISK as PAX_AT_RISK
+        FROM {EMBEDDINGS_TABLE} e
+        LEFT JOIN {FLIGHT_RISK_TABLE} fr ON fr.FLIGHT_KEY = e.FLIGHT_KEY
+        WHERE e.MODEL_VERSION = ? AND e.SNAPSHOT_TS = ? AND e.GNN_EMBEDDING IS NOT NULL
+    """, [model_version, snapshot_ts])
+
+
+def parse_embeddings(values: pd.Series) -> np.ndarray:
+    """Stack ARRAY values (JSON text from to_pandas) into an (n, d) float32 matrix."""
+    rows = [json.loads(v) if isinstance(v, str) else v for v in values]
+    return np.asarray(rows, dtype=np.float32)
+
+
+def randomized_svd(X: np.ndarray, k: int, oversample: int = 10, n_iter: int = 4,
+                   seed: int = 42) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Halko-Martinsson-Tropp range finder with power iterations; returns U, S, Vt truncated to k."""
+    rng = np.random.default_rng(seed)
+    sketch = min(X.shape[1], k + oversample)
+    Q, _ = np.linalg.qr(X @ rng.standard_normal((X.shape[1], sketch)))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(X.T @ Q)
+        Q, _ = np.linalg.qr(X @ Q)
+    Ub, S, Vt = np.linalg.svd(Q.T @ X, full_matrices=False)
+    return (Q @ Ub)[:, :k], S[:k], Vt[:k]
+
+
+def pca(X: np.ndarray, k: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """Project onto the top-k principal components; returns coordinates and explained variance ratios."""
+    centered = X - X.mean(axis=0)
+    total = float((centered ** 2).sum()) or 1.0
+    if len(X) >= RANDOMIZED_SVD_MIN_ROWS:
+        U, S, _ = randomized_svd(centered, k)
+    else:
+        U, S, _ = np.linalg.svd(centered, full_matrices=False)
+        U, S = U[:, :k], S[:k]
+    return U * S, (S ** 2) / total
+
+
+def density_preserving_sample(coords: np.ndarray, max_points: int, bins: int = 64,
+                              seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Stratified sample over a bins x bins grid.
+
+    Every non-empty cell keeps at least one point and otherwise its share of
+    `max_points`, so sparse outliers survive while dense clusters keep their
+    relative mass. Returns the kept row indices and a weight per kept point
+    (cell count / points kept in the cell).
+    """
+    n = len(coords)
+    if n <= max_points:
+        return np.arange(n), np.ones(n)
+    rng = np.random.default_rng(seed)
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    cell_xy = np.minimum(((coords - lo) / span * bins).astype(np.int64), bins - 1)
+    cell = cell_xy[:, 0] * bins + cell_xy[:, 1]
+    order = np.argsort(cell, kind='stable')
+    cells, starts, counts = np.unique(cell[order], return_index=True, return_counts=True)
+    quota = np.maximum(1, np.floor(counts * max_points / n).astype(np.int64))
+    keep, weights = [], []
+    for start, count, q in zip(starts, counts, quota):
+        members = order[start:start + count]
+        chosen = members if q >= count else rng.choice(members, size=q, replace=False)
+        keep.append(chosen)
+        weights.append(np.full(len(chosen), count / len(chosen)))
+    return np.concatenate(keep), np.concatenate(weights)
+
+
+def umap_available() -> bool:
+    try:
+        import umap  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass
+class Projection:
+    model_version: str
+    snapshot_ts: object
+    method: str
+    points: pd.DataFrame
+    explained_variance: np.ndarray = field(default_factory=lambda: np.array([]))
+    build_ms: float = 0.0
+
+    def sample(self, max_points: int = 5000) -> pd.DataFrame:
+        idx, weight = density_preserving_sample(self.points[['X', 'Y']].to_numpy(), max_points)
+        return self.points.iloc[idx].assign(WEIGHT=weight).reset_index(drop=True)
+
+
+class ProjectionService:
+    """Process-wide LRU of projections keyed by model version, snapshot and method."""
+
+    def __init__(self, session, max_entries: int = 8):
+        self.session = session
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, Projection]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def latest(self) -> Optional[Tuple[str, object]]:
+        rows = self.session.sql(latest_embedding_snapshot_query().sql).collect()
+        return (rows[0]['MODEL_VERSION'], rows[0]['SNAPSHOT_TS']) if rows else None
+
+    def get(self, method: str = 'pca') -> Optional[Projection]:
+        latest = self.latest()
+        if latest is None:
+            return None
+        if method == 'umap' and not umap_available():
+            method = 'pca'
+        key = (latest[0], latest[1], method)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        projection = self._build(latest[0], latest[1], method)
+        with self._lock:
+            self._cache[key] = projection
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return projection
+
+    def _build(self, model_version: str, snapshot_ts, method: str) -> Projection:
+        start = time.perf_counter()
+        query = embeddings_query(model_version, snapshot_ts)
+        frame = self.session.sql(query.sql, params=query.params).to_pandas()
+        X = parse_embeddings(frame['GNN_EMBEDDING'])
+        coords, explained = pca(X, k=2)
+        if method == 'umap':
+            import umap
+            reduced, _ = pca(X, k=min(32, X.shape[1]))
+            coords = umap.UMAP(n_components=2, n_neighbors=15, min_dist=0.1, random_state=42).fit_transform(reduced)
+        points = frame.drop(columns=['GNN_EMBEDDING']).assign(
+            X=coords[:, 0].astype(np.float32), Y=coords[:, 1].astype(np.float32)
+        )
+        return Projection(model_version, snapshot_ts, method, points, explained,
+                          (time.perf_counter() - start) * 1000)
@@ -0,0 +1,247 @@
+"""
+Bind-parameterized query builder for the IROP Streamlit pages.
+
+Every statement is emitted with `?` placeholders so the SQL text only depends on
+the *shape* of a filter (which predicates are active), never on the values.
+Identical shapes produce identical text, which lets Snowflake reuse persisted
+query results and compiled plans across controllers and reruns.
+"""
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+FLIGHT_RISK_TABLE = "IROP_GNN_RISK.IROP_MART.FLIGHT_RISK"
+
+RISK_FLAG_COLUMNS = {
+    'FDP Timeout': 'FDP_TIMEOUT_RISK_FLAG',
+    'Curfew': 'CURFEW_RISK_FLAG',
+    'MEL': 'MEL_RISK_FLAG',
+    'Turn': 'TURN_RISK_FLAG',
+}
+
+
+@dataclass
+class Query:
+    sql: str
+    params: List = field(default_factory=list)
+
+    @property
+    def shape_id(self) -> str:
+        return hashlib.sha1(self.sql.encode('utf-8')).hexdigest()[:12]
+
+
+def build_flight_filter(station: str = 'All', risk_band: str = 'All',
+                        flags: Sequence[str] = ()) -> Tuple[str, List]:
+    """Build the FLIGHT_RISK WHERE clause and bind values for the Copilot filters."""
+    clauses = ["FLIGHT_DATE = CURRENT_DATE"]
+    params = []
+    if station and station != 'All':
+        clauses.append("DEPARTURE_STATION = ?")
+        params.append(station)
+    if risk_band and risk_band != 'All':
+        clauses.append("RISK_BAND = ?")
+        params.append(risk_band)
+    for label, column in RISK_FLAG_COLUMNS.items():
+        if label in flags:
+            clauses.append(f"{column} = TRUE")
+    return " AND ".join(clauses), params
+
+
+def flight_detail_query(flight_key: str) -> Query:
+    return Query(f"""
+        SELECT *
+        FROM {FLIGHT_RISK_TABLE}
+        WHERE FLIGHT_KEY = ?
+    """, [flight_key])
+
+
+def simulate_delay_query(flight_key: str, delay_minutes: int) -> Query:
+    return Query("""
+        SELECT * FROM TABLE(
+            IROP_GNN_RISK.IROP_MART.SIMULATE_DELAY(?, ?::INT)
+        )
+    """, [flight_key, int(delay_minutes)])
+
+
+def simulate_reserve_crew_query(duty_id: str) -> Query:
+    return Query("""
+        SELECT * FROM TABLE(
+            IROP_GNN_RISK.IROP_MART.SIMULATE_RESERVE_CREW(?)
+        )
+    """, [duty_id])
+
+
+def simulate_tail_swap_query(flight_key_a: str, flight_key_b: str) -> Query:
+    return Query("""
+        SELECT * FROM TABLE(
+            IROP_GNN_RISK.IROP_MART.SIMULATE_TAIL_SWAP(?, ?)
+        )
+    """, [flight_key_a, flight_key_b])
+
+
+def downstream_flights_query(flight_key: str, max_depth: int = 3) -> Query:
+    return Query("""
+        WITH RECURSIVE downstream AS (
+            SELECT
+                ar.FLIGHT_KEY,
+                ar.NEXT_FLIGHT_KEY,
+                ar.TAIL_NUMBER,
+                1 as depth
+            FROM IROP_GNN_RISK.ATOMIC.AIRCRAFT_ROTATION ar
+            WHERE ar.FLIGHT_KEY = ?
+
+            UNION ALL
+
+            SELECT
+                ar.FLIGHT_KEY,
+                ar.NEXT_FLIGHT_KEY,
+                ar.TAIL_NUMBER,
+                d.depth + 1
+            FROM IROP_GNN_RISK.ATOMIC.AIRCRAFT_ROTATION ar
+            JOIN downstream d ON ar.FLIGHT_KEY = d.NEXT_FLIGHT_KEY
+            WHERE d.depth < ? AND d.NEXT_FLIGHT_KEY IS NOT NULL
+        )
+        SELECT
+            d.FLIGHT_KEY,
+            d.depth,
+            fr.FLIGHT_NUMBER,
+            fr.DEPARTURE_STATION,
+            fr.ARRIVAL_STATION,
+            ROUND(fr.FLIGHT_RISK_SCORE_0_100, 0) as RISK_SCORE,
+            fr.MISCONNECT_PAX_AT_RISK as PAX_AT_RISK
+        FROM downstream d
+        JOIN IROP_GNN_RISK.IROP_MART.FLIGHT_RISK fr ON d.FLIGHT_KEY = fr.FLIGHT_KEY
+        ORDER BY d.depth
+    """, [flight_key, int(max_depth)])
+
+
+def policy_search_query(query_text: str, limit: int = 5, filters: Optional[Dict[str, str]] = None) -> Query:
+    """Cortex Search request for policy documents.
+
+    SEARCH_PREVIEW only accepts constant arguments, so the request JSON is
+    inlined as an escaped literal rather than bound. `filters` become @eq
+    conditions on the service ATTRIBUTES (doc_type, station_code, fleet_type).
+    """
+    request = {
+        'query': query_text,
+        'columns': ['DOC_TYPE', 'TITLE', 'CONTENT', 'STATION_CODE'],
+        'limit': int(limit),
+    }
+    conditions = [{'@eq': {attr.lower(): value}} for attr, value in (filters or {}).items() if value]
+    if conditions:
+        request['filter'] = conditions[0] if len(conditions) == 1 else {'@and': conditions}
+    request = json.dumps(request).replace("'", "''")
+    return Query(f"""
+        SELECT
+            r.value:DOC_TYPE::VARCHAR as DOC_TYPE,
+            r.value:TITLE::VARCHAR as TITLE,
+            r.value:CONTENT::VARCHAR as CONTENT,
+            r.value:STATION_CODE::VARCHAR as STATION_CODE
+        FROM TABLE(FLATTEN(PARSE_JSON(SNOWFLAKE.CORTEX.SEARCH_PREVIEW(
+            'IROP_GNN_RISK.IROP_MART.IROP_GNN_RISK_SEARCH_SVC',
+            '{request}'
+        ))['results'])) r
+    """)
+
+
+@dataclass
+class ShapeStats:
+    executions: int = 0
+    result_cache_hits: int = 0
+    total_ms: float = 0.0
+
+
+class QueryStats:
+    """Per-shape execution counters with result-cache hit attribution."""
+
+    def __init__(self):
+        self.shapes: Dict[str, ShapeStats] = {}
+        self.labels: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+
+    def record(self, query: Query, label: str, query_id: Optional[str], elapsed_ms: float):
+        stats = self.shapes.setdefault(query.shape_id, ShapeStats())
+        self.labels.setdefault(query.shape_id, label)
+        stats.executions += 1
+        stats.total_ms += elapsed_ms
+        if query_id:
+            self._pending[query_id] = query.shape_id
+
+    def refresh(self, session):
+        """Attribute result-cache reuse to shapes from this session's query history.
+
+        Snowflake reports a reused persisted result as a query that scanned no
+        bytes and spent no time executing, so those are counted as cache hits.
+        """
+        if not self._pending:
+            return
+        ids = list(self._pending)
+        placeholders = ", ".join("?" for _ in ids)
+        history = session.sql(f"""
+            SELECT QUERY_ID, BYTES_SCANNED, EXECUTION_TIME
+            FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 1000))
+            WHERE QUERY_ID IN ({placeholders})
+        """, params=ids).collect()
+        for row in history:
+            shape_id = self._pending.pop(row['QUERY_ID'], None)
+            if shape_id and row['BYTES_SCANNED'] == 0 and row['EXECUTION_TIME'] == 0:
+                self.shapes[shape_id].result_cache_hits += 1
+
+    @property
+    def hit_rate(self) -> float:
+        executions = sum(s.executions for s in self.shapes.values())
+        hits = sum(s.result_cache_hits for s in self.shapes.values())
+        return hits / executions if executions else 0.0
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = []
+        for shape_id, s in self.shapes.items():
+            rows.append({
+                'QUERY': self.labels.get(shape_id, shape_id),
+                'SHAPE_ID': shape_id,
+                'EXECUTIONS': s.executions,
+                'RESULT_CACHE_HITS': s.result_cache_hits,
+                'HIT_RATE': round(s.result_cache_hits / s.executions, 2) if s.executions else 0.0,
+                'AVG_MS': round(s.total_ms / s.executions, 1) if s.executions else 0.0,
+            })
+        return pd.DataFrame(rows)
+
+
+def run_query(session, query: Query, stats: Optional[QueryStats] = None,
+              label: str = "query") -> pd.DataFrame:
+    """Execute a bound query, recording its query id against the shape stats."""
+    start = time.perf_counter()
+    with session.query_history() as history:
+        result = session.sql(query.sql, params=query.params).to_pandas()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if stats is not None:
+        query_id = history.queries[-1].query_id if history.queries else None
+        stats.record(query, label, query_id, elapsed_ms)
+    return result
+
+
+def run_queries_concurrently(session, queries: Dict[str, Query], stats: Optional[QueryStats] = None,
+                             raise_errors: bool = True) -> Dict[str, pd.DataFrame]:
+    """Submit every query asynchronously, then collect results keyed by label.
+
+    With raise_errors=False a failed query yields its exception in place of a
+    frame, so one unavailable source does not discard the others.
+    """
+    start = time.perf_counter()
+    jobs = {label: session.sql(q.sql, params=q.params).to_pandas(block=False) for label, q in queries.items()}
+    results = {}
+    for label, job in jobs.items():
+        try:
+            results[label] = job.result()
+        except Exception as e:
+            if raise_errors:
+                raise
+            results[label] = e
+            continue
+        if stats is not None:
+            stats.record(queries[label], label, job.query_id, (time.perf_counter() - start) * 1000)
+    return results
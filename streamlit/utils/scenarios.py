@@ -0,0 +1,245 @@
+"""
+Memoized what-if scenarios backed by IROP_MART.SIMULATION_RESULTS.
+
+A scenario is a simulation type plus its canonical parameters. Its result
+stays valid while the FLIGHT_RISK rows it depends on are unchanged, so every
+stored result records INPUT_VERSION, the MAX(SNAPSHOT_TS) over its source,
+target and affected flights at the time it ran.
+
+Lookups go through three tiers:
+
+1. An in-process LRU shared by every viewer through st.cache_resource. A hit
+   costs no warehouse work while the network watermark has not moved. The
+   watermark is probed at most every `probe_interval_s`.
+2. SIMULATION_RESULTS, the newest row for the scenario key, if its
+   INPUT_VERSION still matches. Results are shared across app processes.
+3. The simulation UDF itself. Its rows are then stored for everyone else.
+
+When the watermark does move, an entry is revalidated with one lookup on its
+own flights rather than dropped, so re-scoring elsewhere in the network does
+not evict it.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from utils.query_builder import (
+    FLIGHT_RISK_TABLE, Query, QueryStats, run_query, simulate_delay_query, simulate_reserve_crew_query,
+    simulate_tail_swap_query
+)
+
+SIMULATION_RESULTS_TABLE = "IROP_GNN_RISK.IROP_MART.SIMULATION_RESULTS"
+SUMMARY_COLUMNS = ['IMPACT_REASON', 'SWAP_BENEFIT', 'CREW_ACTION_RESULT']
+
+
+@dataclass(frozen=True)
+class ScenarioSpec:
+    simulation_type: str
+    build: Callable[..., Query]
+    source_param: Optional[str] = None
+    target_param: Optional[str] = None
+
+
+SCENARIOS: Dict[str, ScenarioSpec] = {
+    'simulate_delay': ScenarioSpec('DELAY', simulate_delay_query, 'flight_key'),
+    'simulate_reserve_crew': ScenarioSpec('RESERVE_CREW', simulate_reserve_crew_query),
+    'simulate_tail_swap': ScenarioSpec('TAIL_SWAP', simulate_tail_swap_query, 'flight_key_a', 'flight_key_b'),
+}
+
+
+@dataclass
+class ScenarioResult:
+    rows: pd.DataFrame
+    flights: List[str]
+    input_version: Optional[pd.Timestamp]
+    watermark: Optional[pd.Timestamp]
+    source: str = 'computed'
+    elapsed_ms: float = 0.0
+
+
+def scenario_key(name: str, params: Dict) -> str:
+    raw = f"{SCENARIOS[name].simulation_type}|{json.dumps(params, sort_keys=True, default=str)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _same(a, b) -> bool:
+    if a is None or b is None or pd.isna(a) or pd.isna(b):
+        return (a is None or pd.isna(a)) and (b is None or pd.isna(b))
+    return pd.Timestamp(a) == pd.Timestamp(b)
+
+
+def _encode_rows(rows: pd.DataFrame) -> str:
+    return rows.to_json(orient='split', index=False, date_format='iso')
+
+
+def _decode_rows(payload) -> pd.DataFrame:
+    split = json.loads(payload) if isinstance(payload, str) else payload
+    return pd.DataFrame(split['data'], columns=split['columns'])
+
+
+class ScenarioCache:
+    """Process-wide memo of simulation results, persisted to SIMULATION_RESULTS."""
+
+    def __init__(self, session, max_entries: int = 256, probe_interval_s: float = 15.0):
+        self.session = session
+        self.max_entries = max_entries
+        self.probe_interval_s = probe_interval_s
+        self._entries: "OrderedDict[str, ScenarioResult]" = OrderedDict()
+        self._watermark = None
+        self._probed_at = 0.0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.hits = 0
+        self.table_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def watermark(self):
+        """Latest FLIGHT_RISK snapshot, re-probed at most every `probe_interval_s`."""
+        now = time.monotonic()
+        if self._probed_at == 0.0 or now - self._probed_at >= self.probe_interval_s:
+            row = self.session.sql(f"SELECT MAX(SNAPSHOT_TS) AS TS FROM {FLIGHT_RISK_TABLE}").collect()
+            self._watermark = row[0]['TS'] if row else None
+            self._probed_at = now
+        return self._watermark
+
+    def _version(self, flights: List[str]):
+        """MAX(SNAPSHOT_TS) over a scenario's flights; the network watermark when it has none."""
+        if not flights:
+            return self.watermark()
+        placeholders = ", ".join("?" for _ in flights)
+        row = self.session.sql(f"""
+            SELECT MAX(SNAPSHOT_TS) AS TS FROM {FLIGHT_RISK_TABLE} WHERE FLIGHT_KEY IN ({placeholders})
+        """, params=list(flights)).collect()
+        return row[0]['TS'] if row else None
+
+    def _valid(self, entry: ScenarioResult, watermark) -> bool:
+        if _same(entry.watermark, watermark):
+            return True
+        if not _same(self._version(entry.flights), entry.input_version):
+            return False
+        entry.watermark = watermark
+        with self._lock:
+            self.revalidated += 1
+        return True
+
+    def _load(self, key: str) -> Optional[ScenarioResult]:
+        rows = self.session.sql(f"""
+            SELECT SOURCE_FLIGHT_KEY, TARGET_FLIGHT_KEY, AFFECTED_FLIGHTS, INPUT_VERSION, RESULT_ROWS
+            FROM {SIMULATION_RESULTS_TABLE}
+            WHERE SCENARIO_KEY = ?
+            ORDER BY CREATED_AT DESC
+            LIMIT 1
+        """, params=[key]).collect()
+        if not rows:
+            return None
+        row = rows[0]
+        affected = json.loads(row['AFFECTED_FLIGHTS']) if row['AFFECTED_FLIGHTS'] else []
+        flights = sorted({f for f in [row['SOURCE_FLIGHT_KEY'], row['TARGET_FLIGHT_KEY'], *affected] if f})
+        return ScenarioResult(_decode_rows(row['RESULT_ROWS']), flights, row['INPUT_VERSION'], None)
+
+    def _store(self, key: str, name: str, params: Dict, result: ScenarioResult):
+        spec, rows = SCENARIOS[name], result.rows
+        affected = sorted(rows['AFFECTED_FLIGHT_KEY'].dropna().unique().tolist()) \
+            if 'AFFECTED_FLIGHT_KEY' in rows.columns else []
+        summary = next((str(rows[c].iloc[0]) for c in SUMMARY_COLUMNS if c in rows.columns and not rows.empty), None)
+        version = pd.Timestamp(result.input_version).isoformat() if result.input_version is not None else None
+        self.session.sql(f"""
+            INSERT INTO {SIMULATION_RESULTS_TABLE} (
+                SIMULATION_ID, SIMULATION_TYPE, SOURCE_FLIGHT_KEY, TARGET_FLIGHT_KEY, SIMULATION_PARAMS,
+                AFFECTED_FLIGHTS, TOTAL_DELTA_MISCONNECT_PAX, TOTAL_DELTA_REVENUE_USD, RECOMMENDATION_TEXT,
+                SCENARIO_KEY, INPUT_VERSION, RESULT_ROWS
+            )
+            SELECT ?, ?, ?, ?, PARSE_JSON(?), PARSE_JSON(?), ?, ?, ?, ?, ?::TIMESTAMP_NTZ, PARSE_JSON(?)
+        """, params=[
+            str(uuid.uuid4()), spec.simulation_type,
+            params.get(spec.source_param) if spec.source_param else None,
+            params.get(spec.target_param) if spec.target_param else None,
+            json.dumps(params, default=str), json.dumps(affected),
+            int(rows['DELTA_MISCONNECT_PAX'].sum()) if 'DELTA_MISCONNECT_PAX' in rows.columns else None,
+            float(rows['DELTA_REVENUE_USD'].sum()) if 'DELTA_REVENUE_USD' in rows.columns else None,
+            summary[:1000] if summary else None, key, version, _encode_rows(rows),
+        ]).collect()
+
+    def _put(self, key: str, entry: ScenarioResult):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _resolve(self, name: str, key: str, params: Dict, stats: Optional[QueryStats], watermark):
+        """A miss: the stored result if still valid, otherwise a fresh UDF run that is then stored."""
+        spec = SCENARIOS[name]
+        entry = self._load(key)
+        if entry is not None and self._valid(entry, watermark):
+            with self._lock:
+                self.table_hits += 1
+            self._put(key, entry)
+            return entry, 'table'
+        with self._lock:
+            self.misses += 1
+        rows = run_query(self.session, spec.build(**params), stats, name)
+        flights = set(rows['AFFECTED_FLIGHT_KEY'].dropna()) if 'AFFECTED_FLIGHT_KEY' in rows.columns else set()
+        flights.update(params[p] for p in (spec.source_param, spec.target_param) if p)
+        flights = sorted(flights)
+        entry = ScenarioResult(rows, flights, self._version(flights), watermark)
+        self._store(key, name, params, entry)
+        self._put(key, entry)
+        return entry, 'computed'
+
+    def run(self, name: str, stats: Optional[QueryStats] = None, **params) -> ScenarioResult:
+        """Scenario rows from the LRU, SIMULATION_RESULTS or a fresh UDF run, in that order.
+
+        The lock only guards the LRU and counters; warehouse work runs outside it,
+        and concurrent misses on one scenario wait for a single in-flight run.
+        """
+        start = time.perf_counter()
+        key = scenario_key(name, params)
+        watermark = self.watermark()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._valid(entry, watermark):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+            return replace(entry, source='memory', elapsed_ms=(time.perf_counter() - start) * 1000)
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            try:
+                pending.set_result(self._resolve(name, key, params, stats, watermark))
+            except BaseException as exc:
+                pending.set_exception(exc)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+            entry, source = pending.result()
+        else:
+            entry, _ = pending.result()
+            source = 'memory'
+            with self._lock:
+                self.hits += 1
+        return replace(entry, source=source, elapsed_ms=(time.perf_counter() - start) * 1000)
+
+    def invalidate(self):
+        """Drop the in-process entries; stored results still revalidate by INPUT_VERSION."""
+        with self._lock:
+            self._entries.clear()
+            self._probed_at = 0.0